@@ -0,0 +1,268 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from detector.video_stream import QUEUE_POLICIES
+from detector.inference_backends import (STUB_BACKEND, ONNX_RUNTIME_BACKEND, OPENVINO_BACKEND, ULTRALYTICS_BACKEND,
+                                         DEFAULT_MODEL_PATH, DEFAULT_STUB_INFERENCE_TIME)
+from detector.metrics import PROCESSED, DISPLAYED, STAGES
+
+try:
+    import resource
+except ImportError:
+    resource = None # Windows, peak RSS is not reported
+
+BENCHMARK_BACKENDS = (STUB_BACKEND, ULTRALYTICS_BACKEND, ONNX_RUNTIME_BACKEND, OPENVINO_BACKEND)
+DEFAULT_RESOLUTIONS = '640x480,1280x720,1920x1080'
+DEFAULT_STREAM_COUNTS = '1,4'
+DEFAULT_DURATION = 10.0 # seconds measured per run
+DEFAULT_WARMUP = 3.0 # seconds before the measurement, covers model warm-up and filling the pools
+DEFAULT_SOURCE_FPS = 30.0
+DISPLAY_SIZE = (1920, 1080) # Screen the processed frames are fitted into
+DISPLAY_POLL_INTERVAL = 0.005 # seconds, like the control panel's look at the frame-ready signal
+RUN_TIMEOUT = 600.0 # seconds, a run taking longer is reported as failed
+
+
+def parse_list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_resolution(resolution: str) -> tuple[int, int]:
+    width, height = (int(value) for value in resolution.lower().split('x'))
+    return width, height
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Benchmark capture -> detect -> render of VideoProcessingEngine on synthetic video. '
+                    'Every configuration runs in its own process')
+    parser.add_argument('--backends', type=parse_list, default=[STUB_BACKEND],
+                        help=f'Comma separated, of {", ".join(BENCHMARK_BACKENDS)}. stub skips the model and PyTorch')
+    parser.add_argument('--resolutions', type=parse_list, default=parse_list(DEFAULT_RESOLUTIONS))
+    parser.add_argument('--streams', type=parse_list, default=parse_list(DEFAULT_STREAM_COUNTS),
+                        help='Comma separated stream counts')
+    parser.add_argument('--queue-policies', type=parse_list, default=list(QUEUE_POLICIES))
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION)
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP)
+    parser.add_argument('--source-fps', type=float, default=DEFAULT_SOURCE_FPS,
+                        help='Frame rate of every synthetic camera, 0 delivers frames as fast as they are read')
+    parser.add_argument('--no-decode', action='store_true',
+                        help='Draw synthetic frames instead of decoding them from JPEG')
+    parser.add_argument('--stub-inference-time', type=float, default=DEFAULT_STUB_INFERENCE_TIME,
+                        help='Seconds per image the stub detector takes')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--input-size', type=int, default=640)
+    parser.add_argument('--num-threads', type=int, help='Intra-op threads of the inference runtime')
+    parser.add_argument('--max-batch-size', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--run', help=argparse.SUPPRESS) # One configuration as JSON, used by the sweep
+
+    return parser.parse_args()
+
+
+def sample_resources() -> tuple[float, float]:
+    times = os.times()
+    return time.monotonic(), times.user + times.system
+
+
+def peak_rss_mb() -> float|None:
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024 # bytes on macOS, KiB elsewhere
+
+
+def sum_stream_stats(engine, name: str) -> int:
+    return sum(stats[name] for stats in engine.get_stats().values())
+
+
+# Takes processed frames like the control panel does, so hand-off and display latency are measured too
+def consume_processed_frames(engine, stream_ids: list[int], stop_event: threading.Event) -> None:
+    while not stop_event.is_set():
+        for stream_id in stream_ids:
+            if not engine.has_display_update(stream_id):
+                continue
+            _, frame = engine.get_processed_frame(stream_id)
+            if frame is not None:
+                engine.record_frame_displayed(frame, 0.0)
+                frame.release()
+        time.sleep(DISPLAY_POLL_INTERVAL)
+
+
+def run_configuration(config: dict) -> dict:
+    # Imported here, so the sweep process never loads a model
+    from detector.image_processor import ImageProcessor
+    from detector.inference_backends import StubBackend
+    from detector.video_processing_engine import VideoProcessingEngine, DEFAULT_MAX_BATCH_SIZE
+
+    StubBackend.inference_time = config['stub_inference_time']
+    image_processor = ImageProcessor(config['backend'], config['model'], config['num_threads'], load=False)
+    image_processor.set_input_size(config['input_size'])
+    image_processor.load_model()
+    classes = image_processor.get_available_classes()
+    for class_index in range(1, len(classes)):
+        image_processor.add_detected_class(class_index) # Every class, so annotation has something to draw
+
+    engine = VideoProcessingEngine(image_processor, max_batch_size=config['max_batch_size'] or DEFAULT_MAX_BATCH_SIZE,
+                                   display=True)
+    engine.set_max_frame_dimension(*DISPLAY_SIZE)
+    engine.run()
+
+    width, height = config['resolution']
+    stream_ids = []
+    for stream_index in range(config['streams']):
+        source = (f'synthetic://{width}x{height}?fps={config["source_fps"]}&seed={config["seed"] + stream_index}'
+                  f'&decode={int(config["decode"])}')
+        stream_ids.append(engine.add_video_source(source, config['queue_policy']))
+
+    stop_event = threading.Event()
+    display_thread = threading.Thread(target=consume_processed_frames, args=(engine, stream_ids, stop_event),
+                                      daemon=True)
+    display_thread.start()
+
+    time.sleep(config['warmup'])
+    engine.reset_metrics()
+    frames_processed = sum_stream_stats(engine, 'frames_processed')
+    frames_captured = sum_stream_stats(engine, 'frames_captured')
+    frames_dropped = sum_stream_stats(engine, 'frames_dropped')
+    start_time, start_cpu_time = sample_resources()
+
+    time.sleep(config['duration'])
+
+    end_time, end_cpu_time = sample_resources()
+    frames_processed = sum_stream_stats(engine, 'frames_processed') - frames_processed
+    frames_captured = sum_stream_stats(engine, 'frames_captured') - frames_captured
+    frames_dropped = sum_stream_stats(engine, 'frames_dropped') - frames_dropped
+    stage_stats = engine.get_metrics()['stages']
+
+    stop_event.set()
+    display_thread.join()
+    engine.shutdown()
+
+    elapsed = end_time - start_time
+    return {
+        'backend': image_processor.get_backend_name(),
+        'device': image_processor.get_device(),
+        'frames_captured': frames_captured,
+        'frames_processed': frames_processed,
+        'frames_dropped': frames_dropped,
+        'throughput_fps': frames_processed / elapsed,
+        'latency': stage_stats[PROCESSED],
+        'display_latency': stage_stats[DISPLAYED],
+        'stages': {stage: stage_stats[stage] for stage in STAGES},
+        'cpu_percent': 100 * (end_cpu_time - start_cpu_time) / elapsed, # 100 per fully used core
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_in_subprocess(config: dict) -> dict:
+    # A fresh process per configuration, so peak RSS, caches and threads of one run do not leak into the next
+    try:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', json.dumps(config)],
+                                   capture_output=True, text=True, timeout=RUN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return {'error': f'timed out after {RUN_TIMEOUT:.0f} s'}
+
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'failed'}
+
+    # The engine prints its shutdown, the result is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit() -> str|None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_milliseconds(seconds: float|None) -> str:
+    return f'{seconds * 1000:.1f}' if seconds is not None else '-'
+
+
+def print_run(config: dict, result: dict) -> None:
+    width, height = config['resolution']
+    name = f'{config["backend"]:<12} {width}x{height:<5} streams {config["streams"]:<3} {config["queue_policy"]:<13}'
+    if 'error' in result:
+        print(f'{name} failed: {result["error"]}')
+        return
+
+    latency = result['latency']
+    print(f'{name} {result["throughput_fps"]:7.1f} FPS, latency p50 {format_milliseconds(latency["p50"])} '
+          f'p95 {format_milliseconds(latency["p95"])} p99 {format_milliseconds(latency["p99"])} ms, '
+          f'dropped {result["frames_dropped"]}, CPU {result["cpu_percent"]:.0f}%, '
+          f'peak RSS {result["peak_rss_mb"] or 0:.0f} MB')
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.run:
+        print(json.dumps(run_configuration(json.loads(args.run))))
+        return
+
+    for backend in args.backends:
+        if backend not in BENCHMARK_BACKENDS:
+            sys.exit(f'Unknown backend {backend}, expected one of {", ".join(BENCHMARK_BACKENDS)}')
+    for queue_policy in args.queue_policies:
+        if queue_policy not in QUEUE_POLICIES:
+            sys.exit(f'Unknown queue policy {queue_policy}, expected one of {", ".join(QUEUE_POLICIES)}')
+
+    settings = {
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'source_fps': args.source_fps,
+        'decode': not args.no_decode,
+        'stub_inference_time': args.stub_inference_time,
+        'model': args.model,
+        'input_size': args.input_size,
+        'num_threads': args.num_threads,
+        'max_batch_size': args.max_batch_size,
+        'seed': args.seed,
+    }
+
+    runs = []
+    sweep = itertools.product(args.backends, args.resolutions, args.streams, args.queue_policies)
+    for backend, resolution, streams, queue_policy in sweep:
+        config = dict(settings, backend=backend, resolution=parse_resolution(resolution), streams=int(streams),
+                      queue_policy=queue_policy)
+        result = run_in_subprocess(config)
+        print_run(config, result)
+        runs.append({
+            'backend': backend,
+            'resolution': resolution,
+            'streams': int(streams),
+            'queue_policy': queue_policy,
+            **result,
+        })
+
+    report = {
+        'commit': git_commit(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'settings': settings,
+        'runs': runs,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'Report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
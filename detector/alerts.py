@@ -0,0 +1,276 @@
+import json
+import queue
+import threading
+import urllib.request
+import numpy as np
+from typing import Optional
+
+from detector.detections import Detections
+from detector.inference_regions import Region
+
+ALERT_SOUND = 'assets/alert.wav'
+DEFAULT_COOLDOWN = 10.0 # seconds between two alerts of one rule on one stream
+DEFAULT_MAX_QUEUED_ALERTS = 100 # per sink, further alerts are dropped while the sink is busy
+DEFAULT_WEBHOOK_TIMEOUT = 2.0 # seconds
+
+
+class AlertRule:
+    # Fires when boxes of the given classes (any class if None) with at least min_confidence have their center
+    # inside one of the zones (the whole frame if None) for min_dwell_frames consecutive processed frames
+    def __init__(self, name: str, class_ids: Optional[list[int]] = None, min_confidence: float = 0.0,
+                 min_dwell_frames: int = 1, zones: Optional[list[Region]] = None,
+                 cooldown: float = DEFAULT_COOLDOWN, stream_ids: Optional[list[int]] = None) -> None:
+        self.name = name
+        self.class_ids = np.array(class_ids, dtype=np.int16) if class_ids is not None else None
+        self.min_confidence = min_confidence
+        self.min_dwell_frames = max(1, min_dwell_frames)
+        self.zones = np.array(zones, dtype=np.float32).reshape(-1, 4) if zones else None # Frame fractions
+        self.cooldown = cooldown
+        self.stream_ids = set(stream_ids) if stream_ids is not None else None
+
+
+    def applies_to(self, stream_id: int) -> bool:
+        return self.stream_ids is None or stream_id in self.stream_ids
+
+
+    # Boolean mask of the matching boxes, evaluated on the whole detection columns at once
+    def match(self, detections: Detections) -> np.ndarray:
+        mask = detections.confidence >= self.min_confidence
+        if self.class_ids is not None:
+            mask &= np.isin(detections.class_id, self.class_ids)
+
+        if self.zones is not None and detections.frame_width > 0:
+            xyxy = detections.xyxy
+            centers = (xyxy[:, :2] + xyxy[:, 2:]) / 2 / (detections.frame_width, detections.frame_height)
+            inside = ((centers[:, None, :] >= self.zones[None, :, :2])
+                      & (centers[:, None, :] <= self.zones[None, :, 2:])).all(axis=2)
+            mask &= inside.any(axis=1)
+
+        return mask
+
+
+class Alert:
+    __slots__ = ('rule', 'stream_id', 'sequence', 'timestamp', 'class_ids', 'count', 'max_confidence')
+
+    def __init__(self, rule: str, stream_id: int, sequence: int, timestamp: float, class_ids: list[int],
+                 count: int, max_confidence: float) -> None:
+        self.rule = rule
+        self.stream_id = stream_id
+        self.sequence = sequence
+        self.timestamp = timestamp # Wall clock of the frame that raised the alert
+        self.class_ids = class_ids
+        self.count = count
+        self.max_confidence = max_confidence
+
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class AlertSink:
+    max_queued_alerts = DEFAULT_MAX_QUEUED_ALERTS
+
+    # Runs on the sink's own delivery thread, may block
+    def deliver(self, alert: Alert) -> None:
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        pass
+
+
+class SoundAlertSink(AlertSink):
+    max_queued_alerts = 1 # One alert raised while the sound plays is replayed afterwards, further ones are dropped
+
+    def __init__(self, sound_path: str = ALERT_SOUND) -> None:
+        from playsound import playsound
+
+        self._playsound = playsound
+        self._sound_path = sound_path
+
+
+    def deliver(self, alert: Alert) -> None:
+        self._playsound(self._sound_path)
+
+
+class WebhookAlertSink(AlertSink):
+    # POSTs every alert as JSON
+    def __init__(self, url: str, timeout: float = DEFAULT_WEBHOOK_TIMEOUT) -> None:
+        self._url = url
+        self._timeout = timeout
+
+
+    def deliver(self, alert: Alert) -> None:
+        request = urllib.request.Request(
+            self._url,
+            data=json.dumps(alert.to_dict()).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self._timeout) as response:
+            response.read()
+
+
+class LogAlertSink(AlertSink):
+    # One JSON line per alert, appended to path or printed without one
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._file = open(path, 'a', encoding='utf-8') if path is not None else None
+
+
+    def deliver(self, alert: Alert) -> None:
+        line = json.dumps(alert.to_dict())
+        if self._file is None:
+            print(f'Alert: {line}')
+        else:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class SinkDelivery:
+    # Bounded queue and thread per sink, so a slow webhook neither stalls processing nor the other sinks
+    def __init__(self, sink: AlertSink) -> None:
+        self.sink = sink
+        self.alerts_delivered = 0
+        self.alerts_failed = 0
+        self.alerts_dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=sink.max_queued_alerts)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._deliver_alerts, daemon=True)
+        self._thread.start()
+
+
+    def offer(self, alert: Alert) -> None:
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self.alerts_dropped += 1
+
+
+    # Waits for the alert being delivered only, alerts still queued are dropped
+    def close(self) -> None:
+        self._stopped.set()
+        try:
+            self._queue.put_nowait(None) # Wakes the thread up when the queue is empty
+        except queue.Full:
+            pass
+
+        self._thread.join()
+        while True:
+            try:
+                if self._queue.get_nowait() is not None:
+                    self.alerts_dropped += 1
+            except queue.Empty:
+                break
+
+        self.sink.close()
+
+
+    def _deliver_alerts(self) -> None:
+        while not self._stopped.is_set():
+            alert = self._queue.get()
+            if alert is None:
+                return
+
+            try:
+                self.sink.deliver(alert)
+                self.alerts_delivered += 1
+            except Exception as e:
+                self.alerts_failed += 1
+                print(f'Alert delivery by {type(self.sink).__name__} failed: {e}')
+
+
+class AlertEngine:
+    # evaluate is called by the processing thread for every processed frame, it never waits for a sink
+    def __init__(self, rules: Optional[list[AlertRule]] = None, sinks: Optional[list[AlertSink]] = None) -> None:
+        self._rules = list(rules or [])
+        self._deliveries = [SinkDelivery(sink) for sink in sinks or []]
+        self._lock = threading.Lock()
+
+        # (rule name, stream id) -> consecutive matching frames / monotonic time of the last alert
+        self._dwell_frames: dict[tuple[str, int], int] = {}
+        self._last_alert_times: dict[tuple[str, int], float] = {}
+
+        self._alerts_raised = 0
+
+
+    def add_rule(self, rule: AlertRule) -> None:
+        with self._lock:
+            self._rules.append(rule)
+
+
+    def add_sink(self, sink: AlertSink) -> None:
+        with self._lock:
+            self._deliveries.append(SinkDelivery(sink))
+
+
+    def evaluate(self, detections: Detections) -> list[Alert]:
+        with self._lock:
+            rules = list(self._rules)
+            deliveries = list(self._deliveries)
+
+        alerts = []
+        for rule in rules:
+            if not rule.applies_to(detections.stream_id):
+                continue
+
+            key = (rule.name, detections.stream_id)
+            mask = rule.match(detections) if len(detections) > 0 else None
+            if mask is None or not mask.any():
+                self._dwell_frames[key] = 0
+                continue
+
+            dwell_frames = self._dwell_frames.get(key, 0) + 1
+            self._dwell_frames[key] = dwell_frames
+            last_alert_time = self._last_alert_times.get(key)
+            if dwell_frames < rule.min_dwell_frames or (
+                    last_alert_time is not None and detections.capture_time - last_alert_time < rule.cooldown):
+                continue
+
+            self._last_alert_times[key] = detections.capture_time
+            alerts.append(Alert(
+                rule.name,
+                detections.stream_id,
+                detections.sequence,
+                detections.timestamp,
+                sorted(set(detections.class_id[mask].tolist())),
+                int(mask.sum()),
+                float(detections.confidence[mask].max())
+            ))
+
+        for alert in alerts:
+            self._alerts_raised += 1
+            for delivery in deliveries:
+                delivery.offer(alert)
+
+        return alerts
+
+
+    def close(self) -> None:
+        with self._lock:
+            deliveries = list(self._deliveries)
+
+        for delivery in deliveries:
+            delivery.close()
+
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            deliveries = list(self._deliveries)
+
+        return {
+            'alerts_raised': self._alerts_raised,
+            'sinks': {
+                type(delivery.sink).__name__: {
+                    'delivered': delivery.alerts_delivered,
+                    'failed': delivery.alerts_failed,
+                    'dropped': delivery.alerts_dropped,
+                }
+                for delivery in deliveries
+            },
+        }
@@ -0,0 +1,136 @@
+import cv2 as cv
+import numpy as np
+from cv2.typing import MatLike
+
+from detector.detections import Detections
+
+DEFAULT_BOX_COLOR = (0, 255, 0)
+BOX_THICKNESS = 2
+FONT = cv.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+FONT_THICKNESS = 2
+LABEL_OFFSET = 10 # Label baseline above the top edge of its box
+MAX_CACHED_SUFFIXES = 1024 # Confidence and track id labels, cleared when exceeded
+GOLDEN_RATIO_CONJUGATE = 0.618033988749895
+
+
+# One BGR color per class with hues spread evenly, so neighbouring class ids do not look alike
+def class_palette(class_count: int) -> np.ndarray:
+    if class_count == 0:
+        return np.empty((0, 3), dtype=np.uint8)
+    hues = (np.arange(class_count) * GOLDEN_RATIO_CONJUGATE % 1.0 * 180).astype(np.uint8)
+    saturation = np.full(class_count, 220, dtype=np.uint8)
+    value = np.full(class_count, 255, dtype=np.uint8)
+    hsv = np.stack((hues, saturation, value), axis=1)[None]
+    return cv.cvtColor(hsv, cv.COLOR_HSV2BGR)[0]
+
+
+# Text rasterized once into a mask, row `baseline_row` is where putText would have put the baseline.
+# Anti-aliased edges are cut at half coverage, a masked copy is several times cheaper than blending them
+def render_text_sprite(text: str) -> tuple[np.ndarray, int]:
+    (width, height), baseline = cv.getTextSize(text, FONT, FONT_SCALE, FONT_THICKNESS)
+    sprite = np.zeros((height + baseline + FONT_THICKNESS, width + FONT_THICKNESS), dtype=np.uint8)
+    cv.putText(sprite, text, (0, height), FONT, FONT_SCALE, 255, FONT_THICKNESS, cv.LINE_AA)
+    cv.threshold(sprite, 127, 1, cv.THRESH_BINARY, dst=sprite)
+    return sprite, height
+
+
+class AnnotationRenderer:
+    # Draws boxes straight from the detection columns, labels are blitted from cached sprites instead of rasterized
+    # with putText for every box of every frame
+    def __init__(self, class_names: list[str], show_confidence: bool = False, class_colors: bool = False) -> None:
+        self._show_confidence = show_confidence
+        self._class_colors = class_colors
+
+        self.set_class_names(class_names)
+        self._suffix_sprites: dict[str, tuple[np.ndarray, int]] = {}
+        self._color_fills: dict[tuple, np.ndarray] = {} # Solid patch per color, sliced to the sprite size
+
+
+    # Class names are known once the model is loaded
+    def set_class_names(self, class_names: list[str]) -> None:
+        self._palette = [tuple(color) for color in class_palette(len(class_names)).tolist()]
+        self._class_sprites = [render_text_sprite(name) for name in class_names]
+
+
+    def get_show_confidence(self) -> bool:
+        return self._show_confidence
+
+
+    def set_show_confidence(self, show_confidence: bool) -> None:
+        self._show_confidence = show_confidence
+
+
+    def get_class_colors(self) -> bool:
+        return self._class_colors
+
+
+    def set_class_colors(self, class_colors: bool) -> None:
+        self._class_colors = class_colors
+
+
+    # Boxes are in source frame coordinates, scale maps them onto frame
+    def render(self, frame: MatLike, detections: Detections, scale: float = 1.0) -> MatLike:
+        if len(detections) == 0:
+            return frame
+
+        corners = (detections.xyxy * scale).astype(np.int32).tolist()
+        class_ids = detections.class_id.tolist()
+        suffixes = self._label_suffixes(detections)
+
+        for (x_min, y_min, x_max, y_max), class_id, suffix in zip(corners, class_ids, suffixes):
+            color = self._palette[class_id] if self._class_colors else DEFAULT_BOX_COLOR
+            cv.rectangle(frame, (x_min, y_min), (x_max, y_max), color, BOX_THICKNESS)
+
+            label_x = self._blit(frame, self._class_sprites[class_id], x_min, y_min - LABEL_OFFSET, color)
+            if suffix:
+                self._blit(frame, self._suffix_sprite(suffix), label_x, y_min - LABEL_OFFSET, color)
+
+        return frame
+
+
+    def _label_suffixes(self, detections: Detections) -> list[str]:
+        suffixes = [''] * len(detections)
+        if detections.is_tracked:
+            suffixes = [f' #{track_id}' for track_id in detections.track_id.tolist()]
+        if self._show_confidence:
+            suffixes = [f'{suffix} {confidence:.2f}'
+                        for suffix, confidence in zip(suffixes, detections.confidence.tolist())]
+        return suffixes
+
+
+    def _suffix_sprite(self, text: str) -> tuple[np.ndarray, int]:
+        sprite = self._suffix_sprites.get(text)
+        if sprite is None:
+            if len(self._suffix_sprites) >= MAX_CACHED_SUFFIXES:
+                self._suffix_sprites.clear()
+            sprite = self._suffix_sprites[text] = render_text_sprite(text)
+        return sprite
+
+
+    def _color_fill(self, color: tuple, height: int, width: int) -> np.ndarray:
+        fill = self._color_fills.get(color)
+        if fill is None or fill.shape[0] < height or fill.shape[1] < width:
+            fill_height, fill_width = max(height, 32), max(width, 256)
+            if fill is not None:
+                fill_height, fill_width = max(fill_height, fill.shape[0]), max(fill_width, fill.shape[1])
+            fill = self._color_fills[color] = np.full((fill_height, fill_width, 3), color, dtype=np.uint8)
+        return fill[:height, :width]
+
+
+    # Copies the sprite in color with its baseline at (x, baseline_y), clipped to the frame.
+    # Returns the x where the next part of the label starts
+    def _blit(self, frame: MatLike, text_sprite: tuple[np.ndarray, int], x: int, baseline_y: int,
+              color: tuple) -> int:
+        sprite, baseline_row = text_sprite
+        sprite_height, sprite_width = sprite.shape
+        y = baseline_y - baseline_row
+        frame_height, frame_width = frame.shape[:2]
+
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + sprite_width, frame_width), min(y + sprite_height, frame_height)
+        if left < right and top < bottom:
+            mask = sprite[top - y:bottom - y, left - x:right - x]
+            cv.copyTo(self._color_fill(color, bottom - top, right - left), mask, frame[top:bottom, left:right])
+
+        return x + sprite_width - FONT_THICKNESS
@@ -1,29 +1,33 @@
-from playsound import playsound
-import threading
-from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional
-from cv2.typing import MatLike
 
 import os
 
-from detector.video_capture import VideoCapture, NO_VIDEO, VIDEO_FILE
+from detector.video_capture import NO_VIDEO, VIDEO_FILE, get_available_sources
+from detector.camera_discovery import CameraDiscovery
 from detector.image_processor import ImageProcessor
+from detector.frame import Frame
+from detector.clip_recorder import ClipRecorderSink
+from detector.alerts import AlertEngine, AlertRule, SoundAlertSink
 
-ALERT_SOUND = 'assets/alert.wav'
+CLIPS_DIRECTORY = 'clips' # Pre/post-event recordings of every alert
 
 class App:
     def __init__(self) -> None:
         from detector.interface import GUI
         from detector.video_processing_engine import VideoProcessingEngine
 
-        self._play_alert_executor = ThreadPoolExecutor(max_workers=1)
+        # Sound on every frame with detected objects, alerts raised while it plays are not replayed
+        self._alert_engine = AlertEngine([AlertRule('detected objects', cooldown=0.0)], [SoundAlertSink()])
 
-        self._alert_event = threading.Event()
-        self._alert_event.clear()
+        # The model loads and warms up in the background while the control panel is already shown
+        self._image_processor = ImageProcessor(load=False)
+        self._image_processor.load_model_in_background()
+        self._video_processing_engine = VideoProcessingEngine(self._image_processor, self._alert_engine)
+        self._video_processing_engine.add_result_sink(ClipRecorderSink(
+            CLIPS_DIRECTORY, get_source_fps=self._video_processing_engine.get_source_fps))
 
-        self._video_capture = VideoCapture()
-        self._image_processor = ImageProcessor()
-        self._video_processing_engine = VideoProcessingEngine(self._video_capture, self._image_processor, self)
+        self._camera_discovery = CameraDiscovery()
+        self._camera_discovery.start()
         
         self._gui = GUI(self)
 
@@ -31,6 +35,7 @@ class App:
     def run(self) -> None:
         self._video_processing_engine.run()
         self._gui.show()
+        self._camera_discovery.stop()
         self._video_processing_engine.shutdown()
 
 
@@ -53,14 +58,43 @@ class App:
             return True
 
     
-    def get_processed_frame(self) -> Tuple[bool, Optional[MatLike]]:
+    def get_processed_frame(self) -> Tuple[bool, Optional[Frame]]:
         return self._video_processing_engine.get_processed_frame()
 
 
+    def record_frame_displayed(self, frame: Frame, display_time: float) -> None:
+        self._video_processing_engine.record_frame_displayed(frame, display_time)
+
+
+    # Cheap check the display makes before taking a frame, True also when the stream has ended
+    def has_display_update(self) -> bool:
+        return self._video_processing_engine.has_display_update()
+
+
+    def get_source_fps(self) -> float:
+        return self._video_processing_engine.get_source_fps()
+
+
+    # (displayed FPS, mean capture-to-screen latency in seconds) of the current stream
+    def get_display_stats(self) -> Tuple[float, Optional[float]]:
+        stats = self._video_processing_engine.get_stream_stats()
+        if stats is None:
+            return 0.0, None
+        return stats['displayed_fps'], stats['mean_display_latency']
+
+
     def set_max_display_dimention(self, max_width: int, max_height: int) -> None:
         self._video_processing_engine.set_max_frame_dimension(max_width, max_height)
 
 
+    def get_model_state(self) -> str:
+        return self._image_processor.get_model_state()
+
+
+    def get_model_error(self) -> Optional[str]:
+        return self._image_processor.get_model_error()
+
+
     def get_available_classes(self) -> list[str]:
         return self._image_processor.get_available_classes()
 
@@ -85,16 +119,26 @@ class App:
         return self._image_processor.get_confidence_threshold()
 
 
-    def get_available_sources(self) -> dict[str, int]:
-        return VideoCapture.get_available_sources()
-    
+    def get_show_confidence(self) -> bool:
+        return self._image_processor.get_annotation_renderer().get_show_confidence()
+
+
+    def set_show_confidence(self, show_confidence: bool) -> None:
+        self._image_processor.get_annotation_renderer().set_show_confidence(show_confidence)
+
 
-    def _play_alert(self) -> None:
-        self._alert_event.set()
-        playsound(ALERT_SOUND)
-        self._alert_event.clear()
+    def get_class_colors(self) -> bool:
+        return self._image_processor.get_annotation_renderer().get_class_colors()
+
+
+    def set_class_colors(self, class_colors: bool) -> None:
+        self._image_processor.get_annotation_renderer().set_class_colors(class_colors)
+
+
+    def get_available_sources(self) -> dict[str, int]:
+        return get_available_sources(self._camera_discovery.get_cameras())
 
 
-    def play_audio_alert(self) -> None:
-        if not self._alert_event.is_set():
-            self._play_alert_executor.submit(self._play_alert)
\ No newline at end of file
+    # Changes whenever a camera is found, plugged in or removed
+    def get_sources_version(self) -> int:
+        return self._camera_discovery.get_version()
\ No newline at end of file
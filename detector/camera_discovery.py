@@ -0,0 +1,249 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import cv2 as cv
+from typing import Optional
+
+MAX_CAMERA_INDEX = 10 # Indices probed where devices cannot be listed, all of them, gaps included
+PROBE_TIMEOUT = 3.0 # seconds, a device not answering by then is left out until the next change
+HOTPLUG_POLL_INTERVAL = 2.0 # seconds between two looks at the device list
+COMMON_RESOLUTIONS = ((640, 480), (1280, 720), (1920, 1080), (3840, 2160)) # Tried on every new device
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'object-detection', 'cameras.json')
+VIDEO_DEVICE_PREFIX = '/dev/video'
+VIDEO_DEVICE_NAME_PATH = '/sys/class/video4linux/video{index}/name'
+
+
+class CameraInfo:
+    __slots__ = ('index', 'name', 'width', 'height', 'fps', 'resolutions')
+
+    def __init__(self, index: int, name: str, width: int, height: int, fps: float,
+                 resolutions: list[tuple[int, int]]) -> None:
+        self.index = index
+        self.name = name
+        self.width = width # Default mode, what the camera delivers without settings
+        self.height = height
+        self.fps = fps
+        self.resolutions = resolutions # Supported out of COMMON_RESOLUTIONS and the default one
+
+
+    def label(self) -> str:
+        fps = f' @ {self.fps:.0f} FPS' if self.fps > 0 else ''
+        return f'Camera {self.index}: {self.name} ({self.width}x{self.height}{fps})'
+
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+    @classmethod
+    def from_dict(cls, index: int, data: dict) -> 'CameraInfo':
+        return cls(index, data['name'], data['width'], data['height'], data['fps'],
+                   [tuple(resolution) for resolution in data['resolutions']])
+
+
+# Index -> device identity (node and driver name), None where the platform has no device list
+def list_video_devices() -> Optional[dict[int, str]]:
+    if not sys.platform.startswith('linux'):
+        return None
+
+    devices = {}
+    for path in glob.glob(f'{VIDEO_DEVICE_PREFIX}*'):
+        suffix = path[len(VIDEO_DEVICE_PREFIX):]
+        if suffix.isdigit():
+            devices[int(suffix)] = f'{path}:{read_device_name(int(suffix))}'
+    return devices
+
+
+def read_device_name(index: int) -> str:
+    try:
+        with open(VIDEO_DEVICE_NAME_PATH.format(index=index)) as file:
+            return file.read().strip()
+    except OSError:
+        return f'Camera {index}'
+
+
+# Opens the camera, None if it is no capture device
+def probe_camera(index: int) -> Optional[CameraInfo]:
+    capture = cv.VideoCapture(index)
+    try:
+        if not capture.isOpened():
+            return None
+
+        width = int(capture.get(cv.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+        fps = capture.get(cv.CAP_PROP_FPS)
+
+        # A mode is supported when the driver keeps it instead of falling back to another one
+        resolutions = {(width, height)}
+        for requested_width, requested_height in COMMON_RESOLUTIONS:
+            capture.set(cv.CAP_PROP_FRAME_WIDTH, requested_width)
+            capture.set(cv.CAP_PROP_FRAME_HEIGHT, requested_height)
+            resolution = (int(capture.get(cv.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv.CAP_PROP_FRAME_HEIGHT)))
+            if resolution == (requested_width, requested_height):
+                resolutions.add(resolution)
+
+        return CameraInfo(index, read_device_name(index), width, height, fps, sorted(resolutions))
+    finally:
+        capture.release()
+
+
+class CameraDiscovery:
+    # Known cameras are available right away from the cache, probing happens on a background thread. All devices
+    # are probed at once, each within PROBE_TIMEOUT. On Linux /dev/video* is watched and only devices that
+    # appeared are probed, so a camera in use is never opened a second time
+    def __init__(self, cache_path: Optional[str] = DEFAULT_CACHE_PATH, probe_timeout: float = PROBE_TIMEOUT,
+                 max_index: int = MAX_CAMERA_INDEX) -> None:
+        self._cache_path = cache_path
+        self._probe_timeout = probe_timeout
+        self._max_index = max_index
+
+        # Device identity -> camera info as dict. Devices that failed to open (metadata nodes, cameras in use) are
+        # neither saved nor probed again until the device list changes
+        self._cache: dict[str, dict] = self._load_cache()
+        self._failed_keys: set[str] = set()
+        self._device_keys: Optional[dict[int, str]] = None # Device list the cameras were built from
+        self._probe_threads: dict[str, threading.Thread] = {}
+        self._probe_results: dict[str, Optional[dict]] = {} # Finished probes not merged into the cache yet
+
+        self._cameras: dict[int, CameraInfo] = {}
+        self._version = 0 # Incremented on every change of the camera list
+        self._lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+        self._watch_thread = threading.Thread(target=self._watch_devices, daemon=True)
+
+
+    # Returns at once with the cached cameras, probes and watches in the background
+    def start(self) -> None:
+        devices = list_video_devices()
+        if devices is None:
+            devices = {index: self._index_key(index) for index in range(self._max_index)}
+        self._set_cameras({index: CameraInfo.from_dict(index, self._cache[key])
+                           for index, key in devices.items() if self._cache.get(key)})
+        self._watch_thread.start()
+
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+    # Blocking full scan, for tools without a UI
+    def scan(self) -> list[CameraInfo]:
+        self._refresh(full_scan=True)
+        return self.get_cameras()
+
+
+    def get_cameras(self) -> list[CameraInfo]:
+        with self._lock:
+            return [self._cameras[index] for index in sorted(self._cameras)]
+
+
+    def get_version(self) -> int:
+        with self._lock:
+            return self._version
+
+
+    def _watch_devices(self) -> None:
+        self._refresh(full_scan=True)
+        while not self._stop_event.wait(HOTPLUG_POLL_INTERVAL):
+            self._refresh(full_scan=False)
+
+
+    def _refresh(self, full_scan: bool) -> None:
+        devices = list_video_devices()
+        if devices is None:
+            # Without a device list there are no hotplug events, only the initial scan and probes answering late
+            if not full_scan and not self._has_probe_results():
+                return
+            devices = {index: self._index_key(index) for index in range(self._max_index)}
+            to_probe = list(devices) if full_scan else []
+        else:
+            if devices == self._device_keys and not self._has_probe_results():
+                return
+            if devices != self._device_keys:
+                self._failed_keys.clear()
+            to_probe = [index for index, key in devices.items()
+                        if key not in self._cache and key not in self._failed_keys]
+
+        self._probe({index: devices[index] for index in to_probe})
+        with self._lock:
+            for key, camera in self._probe_results.items():
+                if camera is not None:
+                    self._cache[key] = camera
+                    self._failed_keys.discard(key)
+                else:
+                    self._failed_keys.add(key)
+            self._probe_results = {}
+
+        self._device_keys = devices
+        self._set_cameras({index: CameraInfo.from_dict(index, self._cache[key])
+                           for index, key in devices.items() if self._cache.get(key)})
+        self._save_cache()
+
+
+    # Probes in parallel on daemon threads, a device hanging in its driver is given up on without blocking exit.
+    # It is not probed again while its probe is running, a late answer is picked up by the next refresh
+    def _probe(self, device_keys: dict[int, str]) -> None:
+        threads = []
+        for index, key in device_keys.items():
+            if key in self._probe_threads and self._probe_threads[key].is_alive():
+                continue
+            thread = threading.Thread(target=self._probe_device, args=(index, key), daemon=True)
+            thread.start()
+            self._probe_threads[key] = thread
+            threads.append((index, thread))
+
+        deadline = time.monotonic() + self._probe_timeout
+        for index, thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                print(f'Camera {index} did not answer within {self._probe_timeout:.1f} s, skipped for now')
+
+
+    def _probe_device(self, index: int, key: str) -> None:
+        camera = probe_camera(index)
+        with self._lock:
+            self._probe_results[key] = camera.to_dict() if camera is not None else None
+
+
+    def _has_probe_results(self) -> bool:
+        with self._lock:
+            return len(self._probe_results) > 0
+
+
+    def _set_cameras(self, cameras: dict[int, CameraInfo]) -> None:
+        with self._lock:
+            if {index: camera.to_dict() for index, camera in cameras.items()} != \
+                    {index: camera.to_dict() for index, camera in self._cameras.items()}:
+                self._cameras = cameras
+                self._version += 1
+
+
+    def _index_key(self, index: int) -> str:
+        return f'index:{index}'
+
+
+    def _load_cache(self) -> dict[str, dict]:
+        if self._cache_path is None or not os.path.exists(self._cache_path):
+            return {}
+        try:
+            with open(self._cache_path) as file:
+                cache = json.load(file)
+            return {key: camera for key, camera in cache.items() if camera is not None} # Failures of older versions
+        except (OSError, ValueError) as e:
+            print(f'Ignoring camera cache {self._cache_path}: {e}')
+            return {}
+
+
+    def _save_cache(self) -> None:
+        if self._cache_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._cache_path), exist_ok=True)
+            with open(self._cache_path, 'w') as file:
+                json.dump(self._cache, file, indent=2)
+        except OSError as e:
+            print(f'Could not write camera cache {self._cache_path}: {e}')
@@ -0,0 +1,205 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2 as cv
+import numpy as np
+from typing import Callable, Optional
+
+from detector.result_sinks import ResultSink
+from detector.detections import Detections
+from detector.frame import Frame, BGR
+
+DEFAULT_PRE_ROLL = 5.0 # seconds kept before an event
+DEFAULT_POST_ROLL = 5.0 # seconds recorded after the last event of a clip
+DEFAULT_MAX_CLIP_LENGTH = 300.0 # seconds, a continuous event is split into clips of this length
+DEFAULT_JPEG_QUALITY = 80
+DEFAULT_MAX_PENDING_FRAMES = 64 # Frames waiting for the encoder, newer ones are dropped beyond it
+CLIP_CODEC = 'mp4v'
+MIN_CLIP_FPS = 1.0
+MAX_CLIP_FPS = 60.0 # mp4v time bases allow at most 65.535 fractional frames per second
+
+
+class EncodedFrame:
+    __slots__ = ('capture_time', 'timestamp', 'jpeg')
+
+    def __init__(self, capture_time: float, timestamp: float, jpeg: np.ndarray) -> None:
+        self.capture_time = capture_time
+        self.timestamp = timestamp
+        self.jpeg = jpeg
+
+
+class StreamRecording:
+    # Encoder thread only
+    def __init__(self) -> None:
+        self.pre_roll: deque = deque() # Encoded frames of the last pre_roll seconds
+        self.clip: Optional[list[EncodedFrame]] = None # Frames of the clip being recorded
+        self.clip_end_time = 0.0 # Monotonic, extended by every event inside the clip
+
+
+class ClipRecorderSink(ResultSink):
+    # Every stream keeps its last seconds as JPEG in memory. A frame with detections (or a trigger) starts a clip
+    # with that pre-roll, events inside the post-roll extend it, so overlapping events end up in one file.
+    # consume only retains the pooled frame, encoding and writing run on their own threads.
+    # Clips play at the source FPS from get_source_fps(stream_id) when it is known, e.g. engine.get_source_fps.
+    # Arrival spacing is only the fallback, files are decoded faster than real time
+    def __init__(self, directory: str, pre_roll: float = DEFAULT_PRE_ROLL, post_roll: float = DEFAULT_POST_ROLL,
+                 annotated: bool = True, jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+                 max_clip_length: float = DEFAULT_MAX_CLIP_LENGTH,
+                 max_pending_frames: int = DEFAULT_MAX_PENDING_FRAMES,
+                 get_source_fps: Optional[Callable[[int], float]] = None) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._get_source_fps = get_source_fps
+        self._pre_roll = pre_roll
+        self._post_roll = post_roll
+        self._max_clip_length = max_clip_length
+        self._encode_parameters = [cv.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.needs_annotated_frame = annotated
+
+        self._pending_frames: queue.Queue = queue.Queue(maxsize=max_pending_frames)
+        self._recordings: dict[int, StreamRecording] = {}
+        self._triggered_streams: set[int] = set()
+        self._trigger_lock = threading.Lock()
+
+        self._frames_dropped = 0
+        self._frames_undecodable = 0
+        self._clips_written = 0
+        self._clips_failed = 0
+
+        self._write_executor = ThreadPoolExecutor(max_workers=1)
+        self._encoder_thread = threading.Thread(target=self._encode_frames, daemon=True)
+        self._encoder_thread.start()
+
+
+    def consume(self, frame: Frame, detections: Detections) -> None:
+        is_event = len(detections) > 0 or self._take_trigger(frame.stream_id)
+
+        frame.retain() # Released by the encoder, so the pixels are never copied here
+        try:
+            self._pending_frames.put_nowait((frame, is_event))
+        except queue.Full:
+            frame.release()
+            self._frames_dropped += 1
+
+
+    # Marks the next frame of the stream as an event, e.g. for alerts decided outside this sink
+    def trigger(self, stream_id: int) -> None:
+        with self._trigger_lock:
+            self._triggered_streams.add(stream_id)
+
+
+    def close(self) -> None:
+        self._pending_frames.put((None, False))
+        self._encoder_thread.join()
+
+        for stream_id, recording in self._recordings.items():
+            if recording.clip is not None:
+                self._finish_clip(stream_id, recording)
+
+        self._write_executor.shutdown(wait=True)
+
+
+    def get_stats(self) -> dict:
+        return {
+            'clips_written': self._clips_written,
+            'clips_failed': self._clips_failed,
+            'pending_frames': self._pending_frames.qsize(),
+            'frames_dropped': self._frames_dropped,
+            'frames_undecodable': self._frames_undecodable,
+        }
+
+
+    def _take_trigger(self, stream_id: int) -> bool:
+        with self._trigger_lock:
+            if stream_id not in self._triggered_streams:
+                return False
+            self._triggered_streams.discard(stream_id)
+            return True
+
+
+    def _encode_frames(self) -> None:
+        while True:
+            frame, is_event = self._pending_frames.get()
+            if frame is None:
+                return
+
+            is_encoded, jpeg = cv.imencode('.jpg', frame.as_colorspace(BGR), self._encode_parameters)
+            stream_id = frame.stream_id
+            encoded_frame = EncodedFrame(frame.capture_time, frame.timestamp, jpeg)
+            frame.release()
+
+            if is_encoded:
+                self._record(stream_id, encoded_frame, is_event)
+
+
+    def _record(self, stream_id: int, encoded_frame: EncodedFrame, is_event: bool) -> None:
+        recording = self._recordings.setdefault(stream_id, StreamRecording())
+        capture_time = encoded_frame.capture_time
+
+        if recording.clip is None and not is_event:
+            recording.pre_roll.append(encoded_frame)
+            while recording.pre_roll and capture_time - recording.pre_roll[0].capture_time > self._pre_roll:
+                recording.pre_roll.popleft()
+            return
+
+        if recording.clip is None:
+            recording.clip = list(recording.pre_roll)
+            recording.pre_roll.clear()
+
+        recording.clip.append(encoded_frame)
+        if is_event:
+            recording.clip_end_time = capture_time + self._post_roll
+
+        if (capture_time >= recording.clip_end_time
+                or capture_time - recording.clip[0].capture_time >= self._max_clip_length):
+            self._finish_clip(stream_id, recording)
+
+
+    def _finish_clip(self, stream_id: int, recording: StreamRecording) -> None:
+        source_fps = self._get_source_fps(stream_id) if self._get_source_fps is not None else 0.0
+        self._write_executor.submit(self._write_clip, stream_id, recording.clip, source_fps)
+        recording.clip = None
+
+
+    def _write_clip(self, stream_id: int, clip: list[EncodedFrame], source_fps: float) -> None:
+        duration = clip[-1].capture_time - clip[0].capture_time
+        if source_fps <= 0:
+            source_fps = (len(clip) - 1) / duration if duration > 0 else MIN_CLIP_FPS
+        fps = round(min(max(source_fps, MIN_CLIP_FPS), MAX_CLIP_FPS), 2)
+
+        start_time = time.strftime('%Y%m%d-%H%M%S', time.localtime(clip[0].timestamp))
+        start_time += f'-{int(clip[0].timestamp * 1000) % 1000:03d}'
+        path = os.path.join(self._directory, f'stream{stream_id}_{start_time}.mp4')
+
+        writer = None
+        clip_size = None
+        frames_written = 0
+        for encoded_frame in clip:
+            image = cv.imdecode(encoded_frame.jpeg, cv.IMREAD_COLOR)
+            if image is None:
+                self._frames_undecodable += 1 # Left out, the clip skips ahead
+                continue
+
+            if writer is None:
+                clip_size = (image.shape[1], image.shape[0])
+                writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*CLIP_CODEC), fps, clip_size)
+                if not writer.isOpened():
+                    break
+            elif (image.shape[1], image.shape[0]) != clip_size:
+                image = cv.resize(image, clip_size) # Source or display size changed during the clip
+            writer.write(image)
+            frames_written += 1
+
+        is_opened = writer is not None and writer.isOpened()
+        if writer is not None:
+            writer.release()
+        if not is_opened or not os.path.exists(path):
+            self._clips_failed += 1
+            print(f'Failed to write event clip {path} at {fps} FPS')
+            return
+
+        self._clips_written += 1
+        print(f'Saved event clip {path} ({frames_written / fps:.1f} s at {fps} FPS)')
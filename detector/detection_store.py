@@ -0,0 +1,205 @@
+import queue
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from detector.result_sinks import ResultSink
+from detector.detections import Detections
+from detector.frame import Frame
+
+DEFAULT_BATCH_SIZE = 2000 # rows per insert transaction
+DEFAULT_FLUSH_INTERVAL = 1.0 # seconds, pending rows are written at least this often
+DEFAULT_MAX_QUEUED_FRAMES = 10000 # Frames waiting for the writer, newer ones are dropped beyond it
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    stream_id INTEGER NOT NULL,
+    sequence INTEGER NOT NULL,
+    class_id INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    x1 REAL NOT NULL,
+    y1 REAL NOT NULL,
+    x2 REAL NOT NULL,
+    y2 REAL NOT NULL,
+    track_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS detections_by_stream ON detections (stream_id, class_id, timestamp);
+CREATE INDEX IF NOT EXISTS detections_by_class ON detections (class_id, timestamp);
+CREATE INDEX IF NOT EXISTS detections_by_time ON detections (timestamp);
+CREATE TABLE IF NOT EXISTS classes (
+    class_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+'''
+
+_INSERT = '''
+INSERT INTO detections (timestamp, stream_id, sequence, class_id, confidence, x1, y1, x2, y2, track_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+_COLUMNS = ('timestamp', 'stream_id', 'sequence', 'class_id', 'class_name', 'confidence', 'x1', 'y1', 'x2', 'y2',
+            'track_id')
+
+
+def open_store(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, timeout=30.0)
+    # Readers never wait for the writer, a commit only waits for the log, not for the database file
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+class DetectionStoreSink(ResultSink):
+    # consume only queues the detections, a writer thread inserts them in batched transactions.
+    # When the writer falls behind the queue fills up and further frames are counted as dropped instead of waiting
+    def __init__(self, path: str, class_names: list[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_queued_frames: int = DEFAULT_MAX_QUEUED_FRAMES) -> None:
+        self._path = path
+        self._class_names = class_names
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued_frames)
+        self._frames_dropped = 0
+        self._rows_written = 0
+
+        # Schema exists before the first query, even if nothing was written yet
+        open_store(path).close()
+
+        self._writer_thread = threading.Thread(target=self._write_detections, daemon=True)
+        self._writer_thread.start()
+
+
+    def consume(self, frame: Frame, detections: Detections) -> None:
+        if len(detections) == 0:
+            return
+
+        try:
+            self._queue.put_nowait(detections)
+        except queue.Full:
+            self._frames_dropped += 1
+
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer_thread.join()
+
+
+    def get_stats(self) -> dict:
+        return {
+            'rows_written': self._rows_written,
+            'queued_frames': self._queue.qsize(),
+            'frames_dropped': self._frames_dropped,
+        }
+
+
+    def _write_detections(self) -> None:
+        connection = open_store(self._path)
+        with connection:
+            connection.executemany('INSERT OR REPLACE INTO classes (class_id, name) VALUES (?, ?)',
+                                   enumerate(self._class_names))
+
+        rows = []
+        flush_deadline = time.monotonic() + self._flush_interval
+        is_closing = False
+        while not is_closing:
+            try:
+                detections = self._queue.get(timeout=max(0.0, flush_deadline - time.monotonic()))
+                is_closing = detections is None
+                if not is_closing:
+                    rows += self._to_rows(detections)
+            except queue.Empty:
+                pass
+
+            if is_closing or len(rows) >= self._batch_size or time.monotonic() >= flush_deadline:
+                if rows:
+                    with connection:
+                        connection.executemany(_INSERT, rows)
+                    self._rows_written += len(rows)
+                    rows = []
+                flush_deadline = time.monotonic() + self._flush_interval
+
+        connection.close()
+
+
+    def _to_rows(self, detections: Detections) -> list[tuple]:
+        count = len(detections)
+        track_ids = detections.track_id.tolist() if detections.is_tracked else [None] * count
+        return list(zip(
+            [detections.timestamp] * count,
+            [detections.stream_id] * count,
+            [detections.sequence] * count,
+            detections.class_id.tolist(),
+            detections.confidence.tolist(),
+            *detections.xyxy.T.tolist(),
+            track_ids
+        ))
+
+
+class DetectionStore:
+    # Read side, safe to use while a DetectionStoreSink of another thread or process writes
+    def __init__(self, path: str) -> None:
+        self._connection = open_store(path)
+
+
+    def get_class_names(self) -> dict[int, str]:
+        return dict(self._connection.execute('SELECT class_id, name FROM classes'))
+
+
+    def get_class_id(self, class_name: str) -> Optional[int]:
+        row = self._connection.execute('SELECT class_id FROM classes WHERE name = ?', (class_name,)).fetchone()
+        return row[0] if row is not None else None
+
+
+    # Times are unix timestamps, start inclusive and end exclusive. Rows come back oldest first as dicts
+    def query(self, stream_ids: Optional[list[int]] = None, class_ids: Optional[list[int]] = None,
+              start_time: Optional[float] = None, end_time: Optional[float] = None,
+              min_confidence: Optional[float] = None, limit: Optional[int] = None) -> list[dict]:
+        where, parameters = self._filters(stream_ids, class_ids, start_time, end_time, min_confidence)
+        sql = (f'SELECT d.timestamp, d.stream_id, d.sequence, d.class_id, c.name, d.confidence, '
+               f'd.x1, d.y1, d.x2, d.y2, d.track_id '
+               f'FROM detections d LEFT JOIN classes c ON c.class_id = d.class_id{where} ORDER BY d.timestamp')
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+
+        return [dict(zip(_COLUMNS, row)) for row in self._connection.execute(sql, parameters)]
+
+
+    def count(self, stream_ids: Optional[list[int]] = None, class_ids: Optional[list[int]] = None,
+              start_time: Optional[float] = None, end_time: Optional[float] = None,
+              min_confidence: Optional[float] = None) -> int:
+        where, parameters = self._filters(stream_ids, class_ids, start_time, end_time, min_confidence)
+        return self._connection.execute(f'SELECT COUNT(*) FROM detections d{where}', parameters).fetchone()[0]
+
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+    def _filters(self, stream_ids: Optional[list[int]], class_ids: Optional[list[int]], start_time: Optional[float],
+                 end_time: Optional[float], min_confidence: Optional[float]) -> tuple[str, list]:
+        conditions, parameters = [], []
+        if stream_ids:
+            conditions.append(f'd.stream_id IN ({", ".join("?" * len(stream_ids))})')
+            parameters += stream_ids
+        if class_ids:
+            conditions.append(f'd.class_id IN ({", ".join("?" * len(class_ids))})')
+            parameters += class_ids
+        if start_time is not None:
+            conditions.append('d.timestamp >= ?')
+            parameters.append(start_time)
+        if end_time is not None:
+            conditions.append('d.timestamp < ?')
+            parameters.append(end_time)
+        if min_confidence is not None:
+            conditions.append('d.confidence >= ?')
+            parameters.append(min_confidence)
+
+        where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        return where, parameters
@@ -0,0 +1,107 @@
+import struct
+import numpy as np
+
+from detector.frame import Frame
+
+NO_TRACK_ID = -1
+
+# One record per box, 26 bytes packed
+DETECTION_DTYPE = np.dtype([
+    ('xyxy', np.float32, (4,)), # Source frame coordinates
+    ('confidence', np.float32),
+    ('class_id', np.int16),
+    ('track_id', np.int32), # NO_TRACK_ID without tracking
+])
+
+# stream_id, sequence, timestamp, capture_time, frame_width, frame_height, is_tracked, box count
+_HEADER = struct.Struct('<iqddii?I')
+
+
+class Detections:
+    # Boxes of one frame in a structured array plus the frame metadata, without pixels or torch tensors.
+    # Cheap to keep per stream, to hand between threads and processes, and to store
+    __slots__ = ('boxes', 'stream_id', 'sequence', 'timestamp', 'capture_time', 'frame_width', 'frame_height',
+                 'is_tracked')
+
+    def __init__(self, boxes: np.ndarray, stream_id: int = 0, sequence: int = 0, timestamp: float = 0.0,
+                 capture_time: float = 0.0, frame_width: int = 0, frame_height: int = 0,
+                 is_tracked: bool = False) -> None:
+        self.boxes = boxes
+        self.stream_id = stream_id
+        self.sequence = sequence
+        self.timestamp = timestamp # Wall clock of the frame capture
+        self.capture_time = capture_time # Monotonic, for latency
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.is_tracked = is_tracked
+
+
+    # (N, 6) x1, y1, x2, y2, confidence, class, or tracker output (N, 7) with track id before confidence
+    @classmethod
+    def from_array(cls, array: np.ndarray, frame_width: int = 0, frame_height: int = 0) -> 'Detections':
+        is_tracked = array.shape[1] == 7
+        boxes = np.empty(len(array), dtype=DETECTION_DTYPE)
+        boxes['xyxy'] = array[:, :4]
+        boxes['confidence'] = array[:, -2]
+        boxes['class_id'] = array[:, -1]
+        boxes['track_id'] = array[:, 4] if is_tracked else NO_TRACK_ID
+        return cls(boxes, frame_width=frame_width, frame_height=frame_height, is_tracked=is_tracked)
+
+
+    @classmethod
+    def empty(cls, frame_width: int = 0, frame_height: int = 0) -> 'Detections':
+        return cls(np.empty(0, dtype=DETECTION_DTYPE), frame_width=frame_width, frame_height=frame_height)
+
+
+    # Boxes decoded without copying, the returned array is read-only
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Detections':
+        (stream_id, sequence, timestamp, capture_time, frame_width, frame_height,
+         is_tracked, count) = _HEADER.unpack_from(data)
+        boxes = np.frombuffer(data, dtype=DETECTION_DTYPE, count=count, offset=_HEADER.size)
+        return cls(boxes, stream_id, sequence, timestamp, capture_time, frame_width, frame_height, is_tracked)
+
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(self.stream_id, self.sequence, self.timestamp, self.capture_time,
+                              self.frame_width, self.frame_height, self.is_tracked, len(self.boxes))
+        return header + self.boxes.tobytes()
+
+
+    # Layout from_array takes, for the tracker
+    def to_array(self) -> np.ndarray:
+        columns = [self.boxes['xyxy'], self.boxes['confidence'][:, None], self.boxes['class_id'][:, None]]
+        if self.is_tracked:
+            columns.insert(1, self.boxes['track_id'][:, None])
+        return np.concatenate(columns, axis=1, dtype=np.float32)
+
+
+    # Same boxes attached to the metadata of the source frame, boxes are shared and must not be modified in place
+    def for_frame(self, frame: Frame) -> 'Detections':
+        frame_height, frame_width = frame.data.shape[:2]
+        return Detections(self.boxes, frame.stream_id, frame.sequence, frame.timestamp, frame.capture_time,
+                          frame_width, frame_height, self.is_tracked)
+
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+
+    @property
+    def xyxy(self) -> np.ndarray:
+        return self.boxes['xyxy']
+
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self.boxes['confidence']
+
+
+    @property
+    def class_id(self) -> np.ndarray:
+        return self.boxes['class_id']
+
+
+    @property
+    def track_id(self) -> np.ndarray:
+        return self.boxes['track_id']
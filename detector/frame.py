@@ -0,0 +1,68 @@
+import time
+import cv2 as cv
+from cv2.typing import MatLike
+
+from detector.frame_pool import FrameBuffer
+
+BGR = 'BGR' # OpenCV decode, YOLO input, imshow and VideoWriter layout
+RGB = 'RGB'
+GRAY = 'GRAY'
+
+_CONVERSION_CODES = {
+    (BGR, RGB): cv.COLOR_BGR2RGB,
+    (RGB, BGR): cv.COLOR_RGB2BGR,
+    (BGR, GRAY): cv.COLOR_BGR2GRAY,
+    (RGB, GRAY): cv.COLOR_RGB2GRAY,
+    (GRAY, BGR): cv.COLOR_GRAY2BGR,
+    (GRAY, RGB): cv.COLOR_GRAY2RGB,
+}
+
+
+def conversion_code(source_colorspace: str, target_colorspace: str) -> int:
+    return _CONVERSION_CODES[(source_colorspace, target_colorspace)]
+
+
+class Frame:
+    # Descriptor passed between pipeline stages, pixels stay in the pooled buffer
+    __slots__ = ('buffer', 'colorspace', 'stream_id', 'sequence', 'timestamp', 'capture_time')
+
+    def __init__(self, buffer: FrameBuffer, colorspace: str, stream_id: int, sequence: int,
+                 timestamp: float, capture_time: float) -> None:
+        self.buffer = buffer
+        self.colorspace = colorspace
+        self.stream_id = stream_id
+        self.sequence = sequence
+        self.timestamp = timestamp # Wall clock, for logs and storage
+        self.capture_time = capture_time # Monotonic, for latency
+
+
+    @property
+    def data(self) -> MatLike:
+        return self.buffer.data
+
+
+    def retain(self) -> 'Frame':
+        self.buffer.retain()
+        return self
+
+
+    def release(self) -> None:
+        self.buffer.release()
+
+
+    def latency(self) -> float:
+        return time.monotonic() - self.capture_time
+
+
+    # Same frame metadata, different pixels. Takes ownership of buffer
+    def with_buffer(self, buffer: FrameBuffer, colorspace: str = None) -> 'Frame':
+        return Frame(buffer, colorspace or self.colorspace, self.stream_id, self.sequence,
+                     self.timestamp, self.capture_time)
+
+
+    # Pixels in the requested layout, converted into dst only if the colorspace differs
+    def as_colorspace(self, colorspace: str, dst: MatLike = None) -> MatLike:
+        if colorspace == self.colorspace:
+            return self.data
+
+        return cv.cvtColor(self.data, conversion_code(self.colorspace, colorspace), dst=dst)
@@ -0,0 +1,157 @@
+import threading
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+DEFAULT_MAX_FREE_BUFFERS = 64
+
+
+class FrameBuffer:
+    def __init__(self, pool: Optional['FramePool'], data: np.ndarray,
+                 shared_memory: Optional[SharedMemory] = None) -> None:
+        self._pool = pool
+        self.data = data
+        self._shared_memory = shared_memory # Set when data lives in memory other processes can map by name
+        self._ref_count = 1
+        self._ref_lock = threading.Lock()
+
+
+    def retain(self) -> 'FrameBuffer':
+        with self._ref_lock:
+            if self._ref_count <= 0:
+                raise RuntimeError('Frame buffer retained after it was recycled')
+            self._ref_count += 1
+        return self
+
+
+    def release(self) -> None:
+        with self._ref_lock:
+            if self._ref_count <= 0:
+                raise RuntimeError('Frame buffer released more times than retained')
+            self._ref_count -= 1
+            is_free = self._ref_count == 0
+
+        if is_free and self._pool is not None:
+            self._pool._recycle(self)
+
+
+    def get_shared_memory_name(self) -> Optional[str]:
+        return self._shared_memory.name if self._shared_memory is not None else None
+
+
+    def _reset(self) -> None:
+        self._ref_count = 1
+
+
+    # Called once the pool drops the buffer for good
+    def _dispose(self) -> None:
+        if self._shared_memory is None:
+            return
+
+        self.data = None
+        try:
+            self._shared_memory.close()
+        except BufferError:
+            pass # A view outlived the buffer, the mapping goes away together with it
+        self._shared_memory.unlink()
+        self._shared_memory = None
+
+
+class FramePool:
+    # Buffers are grouped by (shape, dtype), so a resolution change only grows the pool once.
+    # With shared_memory the buffers can be handed to worker processes by name, without copying the pixels
+    def __init__(self, max_free_buffers: int = DEFAULT_MAX_FREE_BUFFERS, shared_memory: bool = False) -> None:
+        self._max_free_buffers = max_free_buffers
+        self._shared_memory = shared_memory
+        self._free_buffers: dict[tuple, list[FrameBuffer]] = {}
+        self._free_count = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+        self._allocations = 0
+        self._reuses = 0
+
+
+    def acquire(self, shape: tuple, dtype=np.uint8) -> FrameBuffer:
+        key = (tuple(shape), np.dtype(dtype))
+
+        with self._lock:
+            free_buffers = self._free_buffers.get(key)
+            if free_buffers:
+                buffer = free_buffers.pop()
+                self._free_count -= 1
+                self._reuses += 1
+                buffer._reset()
+                return buffer
+
+            self._allocations += 1
+
+        return self._allocate(*key)
+
+
+    def is_shared(self) -> bool:
+        return self._shared_memory
+
+
+    def _allocate(self, shape: tuple, dtype: np.dtype) -> FrameBuffer:
+        if not self._shared_memory:
+            return FrameBuffer(self, np.empty(shape, dtype=dtype))
+
+        shared_memory = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        return FrameBuffer(self, np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf), shared_memory)
+
+
+    # Takes over an array allocated elsewhere (e.g. by OpenCV on resolution change)
+    def adopt(self, data: np.ndarray) -> FrameBuffer:
+        with self._lock:
+            self._allocations += 1
+
+        return FrameBuffer(self, data)
+
+
+    def _recycle(self, buffer: FrameBuffer) -> None:
+        key = (buffer.data.shape, buffer.data.dtype)
+
+        with self._lock:
+            if self._closed:
+                buffer._dispose()
+                return
+
+            if self._free_count >= self._max_free_buffers:
+                # Drop buffers of shapes nobody asked for recently before dropping this one
+                if not self._evict_other_shape(key):
+                    buffer._dispose()
+                    return
+
+            self._free_buffers.setdefault(key, []).append(buffer)
+            self._free_count += 1
+
+
+    def _evict_other_shape(self, key: tuple) -> bool:
+        for other_key, free_buffers in self._free_buffers.items():
+            if other_key != key and free_buffers:
+                free_buffers.pop()._dispose()
+                self._free_count -= 1
+                return True
+        return False
+
+
+    # Frees the idle buffers, buffers still in use are freed when they come back instead of being pooled.
+    # Buffers acquired afterwards still work, they are freed on release too
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            for free_buffers in self._free_buffers.values():
+                for buffer in free_buffers:
+                    buffer._dispose()
+            self._free_buffers.clear()
+            self._free_count = 0
+
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'allocations': self._allocations,
+                'reuses': self._reuses,
+                'free_buffers': self._free_count,
+            }
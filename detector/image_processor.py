@@ -1,69 +1,299 @@
+import threading
+import time
 import cv2 as cv
+import numpy as np
 from cv2.typing import MatLike
-from ultralytics import YOLO
-from ultralytics.engine.results import Results
-from typing import Tuple
+from typing import Callable, Tuple, Optional
 
 from detector.yolo_settings import YoloInferenceConfig
+from detector.inference_backends import create_backend, detect_device, AUTO_BACKEND, STUB_BACKEND, DEFAULT_MODEL_PATH
+from detector.frame_pool import FramePool
+from detector.frame import Frame
+from detector.detections import Detections
+from detector.annotation_renderer import AnnotationRenderer
+from detector.inference_regions import InferenceRegions, merge_region_detections
+
+LETTERBOX_COLOR = 114 # Same padding value YOLO was trained with
+WARMUP_RUNS = 2 # Inferences on a blank image at load, so the first frame does not pay for lazy initialization
+
+MODEL_NOT_LOADED = 'not loaded'
+MODEL_LOADING = 'loading'
+MODEL_READY = 'ready'
+MODEL_FAILED = 'failed'
+
+
+# Single resize of frame into the square dst, returns (scale, pad_x, pad_y) to map boxes back
+def letterbox(frame: MatLike, dst: np.ndarray) -> Tuple[float, int, int]:
+    size = dst.shape[0]
+    height, width = frame.shape[:2]
+
+    scale = min(size / width, size / height)
+    new_width = min(size, round(width * scale))
+    new_height = min(size, round(height * scale))
+    pad_x = (size - new_width) // 2
+    pad_y = (size - new_height) // 2
+
+    # Only the borders are painted, the resize writes the rest in place
+    dst[:pad_y] = LETTERBOX_COLOR
+    dst[pad_y + new_height:] = LETTERBOX_COLOR
+    dst[:, :pad_x] = LETTERBOX_COLOR
+    dst[:, pad_x + new_width:] = LETTERBOX_COLOR
+    cv.resize(frame, (new_width, new_height),
+              dst=dst[pad_y:pad_y + new_height, pad_x:pad_x + new_width], interpolation=cv.INTER_LINEAR)
+
+    return scale, pad_x, pad_y
+
 
 class ImageProcessor(YoloInferenceConfig):
-    def __init__(self) -> None:
+    # Without load the model is loaded later by load_model or load_model_in_background. Settings can be changed
+    # meanwhile, detection must wait until the model is ready
+    def __init__(self, backend: str = AUTO_BACKEND, model_path: str = DEFAULT_MODEL_PATH,
+                 num_threads: Optional[int] = None, load: bool = True, model_cache: bool = True) -> None:
         super().__init__()
-        self._detector = YOLO('yolo_models/yolov8n.pt')
-        available_classes: dict = self._detector.names
-        self._all_classes = list(available_classes.values())
-
-
-    def detect_objects(self, frame: MatLike) -> Results:
-        results = self._detector.predict(
-            frame,
-            conf=self._confidence_threshold,
-            device=self._device,
-            classes=self._classes,
-            max_det=self._max_det,
-            verbose=self._verbose
-        ) # Returns list of output frames
-        first_frame_result = results[0] # Get first (and only) frame
-
-        return first_frame_result, len(first_frame_result.boxes) > 0 
-
-
-    def visualize_objects_presence(self, frame: MatLike, detections: Results) -> Tuple[MatLike, bool]:
-        for box in detections.boxes:
-            x_min, y_min, x_max, y_max = box.xyxy[0]
-            cv.rectangle(frame, (int(x_min), int(y_min)), (int(x_max), int(y_max)), (0, 255, 0), 2)
-
-            object_class_id = self._get_object_class_id(box) 
-            object_class_name = self._all_classes[object_class_id]
-
-            label_position = (int(x_min), int(y_min) - 10)
-            cv.putText(
-                frame,                     
-                object_class_name,         
-                label_position,            
-                cv.FONT_HERSHEY_SIMPLEX,   
-                0.5,                       
-                (0, 255, 0),               
-                2,                         
-                cv.LINE_AA                 
-            )
+        self._backend = backend
+        self._model_path = model_path
+        self._num_threads = num_threads
+        self._model_cache = model_cache # Reuse compiled or optimized models of exported backends across launches
 
-        return frame
-    
+        self._detector = None
+        self._all_classes = []
+        self._renderer = AnnotationRenderer(self._all_classes)
+
+        self._model_state = MODEL_NOT_LOADED
+        self._model_error = None
+        self._model_ready = threading.Event()
+
+        # One reusable model input per batch slot, only used by the processing thread
+        self._letterbox_buffers: list[np.ndarray] = []
+        self._last_batch_timings = (0.0, 0.0) # Seconds of preprocessing and inference of the last batch
+
+        if load:
+            self.load_model()
+
+
+    # Imports the runtime, loads the model and warms it up at the configured input size
+    def load_model(self) -> None:
+        self._model_state = MODEL_LOADING
+        try:
+            load_start_time = time.monotonic()
+            if self._device is None:
+                self._device = 'cpu' if self._backend == STUB_BACKEND else detect_device() # Imports PyTorch
+
+            detector = self._create_detector(self._model_path)
+            self._all_classes = list(detector.names.values())
+            self._renderer.set_class_names(self._all_classes)
+        except Exception as e:
+            self._model_error = str(e)
+            self._model_state = MODEL_FAILED
+            raise
+
+        self._detector = detector
+        self._model_state = MODEL_READY
+        self._model_ready.set()
+        print(f'Model {self._model_path} ready on {self._device} with {detector.name} backend '
+              f'in {time.monotonic() - load_start_time:.1f} s')
+
+
+    def _create_detector(self, model_path: str):
+        detector = create_backend(self._backend, model_path, self._device, self._num_threads,
+                                  self._verbose, self._model_cache)
+
+        blank_image = np.full((self._input_size, self._input_size, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        for _ in range(WARMUP_RUNS):
+            detector.predict([blank_image], self._input_size, self._confidence_threshold, self._classes,
+                             self._max_det)
+        return detector
+
+
+    def load_model_in_background(self) -> None:
+        self._model_state = MODEL_LOADING
+        threading.Thread(target=self._load_model_quietly, daemon=True).start()
+
+
+    def _load_model_quietly(self) -> None:
+        try:
+            self.load_model()
+        except Exception as e:
+            print(f'Failed to load model {self._model_path}: {e}')
+
+
+    # Loads and warms up model_path on a background thread while detection goes on with the current model, then
+    # swaps them between two batches. The new model must know the same classes, class filters stay valid.
+    # on_done(model_path, error) is called from that thread, error is None once the new model is in use
+    def switch_model(self, model_path: str,
+                     on_done: Optional[Callable[[str, Optional[str]], None]] = None) -> None:
+        threading.Thread(target=self._switch_model, args=(model_path, on_done), daemon=True).start()
+
+
+    def _switch_model(self, model_path: str, on_done: Optional[Callable[[str, Optional[str]], None]]) -> None:
+        error = None
+        try:
+            detector = self._create_detector(model_path)
+            if list(detector.names.values()) != self._all_classes:
+                error = f'{model_path} detects other classes than {self._model_path}'
+            else:
+                self._detector = detector
+                self._model_path = model_path
+        except Exception as e:
+            error = str(e)
+
+        if error is not None:
+            print(f'Keeping model {self._model_path}: {error}')
+        if on_done is not None:
+            on_done(model_path, error)
+
+
+    # One of MODEL_NOT_LOADED, MODEL_LOADING, MODEL_READY or MODEL_FAILED
+    def get_model_state(self) -> str:
+        return self._model_state
+
+
+    def get_model_error(self) -> Optional[str]:
+        return self._model_error
+
+
+    def is_ready(self) -> bool:
+        return self._model_ready.is_set()
+
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._model_ready.wait(timeout)
 
-    def _get_object_class_id(self, box) -> int:
-        return int(box.cls[0])
 
+    def get_backend_name(self) -> Optional[str]:
+        return self._detector.name if self._detector is not None else None
 
-    def fit_frame_into_screen(self, frame: MatLike, max_frame_width, max_frame_height) -> MatLike:
+
+    def get_device(self) -> str:
+        return self._device
+
+
+    def get_model_path(self) -> str:
+        return self._model_path
+
+
+    # (preprocess, inference) seconds of the last detect_objects_batch call, for the pipeline metrics
+    def get_last_batch_timings(self) -> Tuple[float, float]:
+        return self._last_batch_timings
+
+
+    def detect_objects(self, frame: MatLike) -> Tuple[Detections, bool]:
+        return self.detect_objects_batch([frame])[0] # Get first (and only) frame
+
+
+    # Boxes of the returned detections are in the coordinates of the given frames. A frame with inference regions is
+    # cropped to them, all crops of the batch go through one predict call and are merged back per frame
+    def detect_objects_batch(self, frames: list[MatLike],
+                             frame_regions: Optional[list[Optional[InferenceRegions]]] = None
+                             ) -> list[Tuple[Detections, bool]]:
+        if not frames:
+            return []
+        if frame_regions is None:
+            frame_regions = [None] * len(frames)
+
+        start_time = time.perf_counter()
+        input_size = self._input_size
+        letterboxed_crops = []
+        crop_placements = [] # (frame index, x offset, y offset, letterbox geometry) per crop
+        for frame_index, (frame, regions) in enumerate(zip(frames, frame_regions)):
+            height, width = frame.shape[:2]
+            rectangles = [(0, 0, width, height)] if regions is None else regions.regions_for(width, height).tolist()
+
+            for x1, y1, x2, y2 in rectangles:
+                letterboxed_crop = self._get_letterbox_buffer(len(letterboxed_crops), input_size)
+                geometry = letterbox(frame[y1:y2, x1:x2], letterboxed_crop) # Crop is a view, nothing is copied
+                letterboxed_crops.append(letterboxed_crop)
+                crop_placements.append((frame_index, x1, y1, geometry))
+
+        preprocess_end_time = time.perf_counter()
+        results = []
+        if letterboxed_crops:
+            results = self._detector.predict(
+                letterboxed_crops,
+                input_size,
+                self._confidence_threshold,
+                self._classes,
+                self._max_det
+            ) # Returns one result per input crop, in input order
+
+        frame_boxes = [[] for _ in frames]
+        for boxes, (frame_index, offset_x, offset_y, geometry) in zip(results, crop_placements):
+            frame_boxes[frame_index].append(self._map_to_frame(boxes, frames[frame_index], offset_x, offset_y,
+                                                               geometry))
+
+        batch_detections = []
+        for frame, boxes in zip(frames, frame_boxes):
+            height, width = frame.shape[:2]
+            if len(boxes) == 0:
+                # Every region rounded to nothing at this frame size, so nothing was inferred
+                batch_detections.append(Detections.empty(width, height))
+                continue
+            if len(boxes) == 1:
+                data = boxes[0]
+            else:
+                data = merge_region_detections(np.concatenate(boxes))[:self._max_det]
+            batch_detections.append(Detections.from_array(data, width, height))
+
+        self._last_batch_timings = (preprocess_end_time - start_time, time.perf_counter() - preprocess_end_time)
+
+        return [(detections, len(detections) > 0) for detections in batch_detections]
+
+
+    def _get_letterbox_buffer(self, index: int, input_size: int) -> np.ndarray:
+        if index < len(self._letterbox_buffers) and self._letterbox_buffers[index].shape[0] != input_size:
+            self._letterbox_buffers.clear()
+
+        while len(self._letterbox_buffers) <= index:
+            self._letterbox_buffers.append(np.empty((input_size, input_size, 3), dtype=np.uint8))
+
+        return self._letterbox_buffers[index]
+
+
+    # Boxes are modified in place, they belong to this batch
+    def _map_to_frame(self, boxes: np.ndarray, frame: MatLike, offset_x: int, offset_y: int,
+                      geometry: Tuple[float, int, int]) -> np.ndarray:
+        scale, pad_x, pad_y = geometry
+        height, width = frame.shape[:2]
+
+        boxes[:, 0:4:2] = np.clip((boxes[:, 0:4:2] - pad_x) / scale + offset_x, 0, width)
+        boxes[:, 1:4:2] = np.clip((boxes[:, 1:4:2] - pad_y) / scale + offset_y, 0, height)
+
+        return boxes
+
+
+    # Boxes are in source frame coordinates, scale maps them onto frame when it was resized for display
+    def visualize_objects_presence(self, frame: MatLike, detections: Detections, scale: float = 1.0) -> MatLike:
+        return self._renderer.render(frame, detections, scale)
+
+
+    def get_annotation_renderer(self) -> AnnotationRenderer:
+        return self._renderer
+
+
+    def fit_frame_into_screen(self, frame: MatLike, max_frame_width, max_frame_height, dst: MatLike = None) -> MatLike:
         if frame is None:
             return None
         
         output_width, output_height = self._fitting_dimensions(frame, max_frame_width, max_frame_height)
-        frame = cv.resize(frame, (output_width, output_height), interpolation=cv.INTER_LINEAR)
+        frame = cv.resize(frame, (output_width, output_height), dst=dst, interpolation=cv.INTER_LINEAR)
         return frame
 
 
+    # Takes ownership of frame, returns it untouched when it already fits
+    def fit_pooled_frame_into_screen(self, frame: Frame, max_frame_width: int, max_frame_height: int,
+                                     frame_pool: FramePool) -> Frame:
+        height, width = frame.data.shape[:2]
+        output_width, output_height = self._fitting_dimensions(frame.data, max_frame_width, max_frame_height)
+        if (output_width, output_height) == (width, height):
+            return frame
+
+        fitted_buffer = frame_pool.acquire((output_height, output_width) + frame.data.shape[2:], frame.data.dtype)
+        self.fit_frame_into_screen(frame.data, max_frame_width, max_frame_height, dst=fitted_buffer.data)
+        frame.release()
+
+        return frame.with_buffer(fitted_buffer)
+
+
     def _fitting_dimensions(self, frame: MatLike, max_width: int, max_height: int) -> Tuple[int, int]:
         height, width = frame.shape[:2]
 
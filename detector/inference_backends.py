@@ -0,0 +1,265 @@
+import ast
+import importlib.util
+import os
+import time
+import cv2 as cv
+import numpy as np
+from typing import Optional
+
+# PyTorch and ultralytics take seconds to import, they are imported by the functions using them, when the model is
+# loaded. The stub backend does not need them at all
+
+DEFAULT_MODEL_PATH = 'yolo_models/yolov8n.pt'
+
+AUTO_BACKEND = 'auto'
+ULTRALYTICS_BACKEND = 'ultralytics'
+ONNX_RUNTIME_BACKEND = 'onnxruntime'
+OPENVINO_BACKEND = 'openvino'
+BACKENDS = (AUTO_BACKEND, ULTRALYTICS_BACKEND, ONNX_RUNTIME_BACKEND, OPENVINO_BACKEND)
+STUB_BACKEND = 'stub' # Fixed boxes after a fixed delay, for benchmarks without a model, PyTorch or ultralytics
+
+DEFAULT_STUB_INFERENCE_TIME = 0.02 # seconds per image
+# Fractions of the model input, x1, y1, x2, y2, confidence, class
+STUB_BOXES = (
+    (0.10, 0.20, 0.30, 0.80, 0.90, 0),
+    (0.55, 0.40, 0.75, 0.95, 0.75, 0),
+    (0.40, 0.60, 0.90, 0.90, 0.60, 2),
+)
+
+NMS_IOU_THRESHOLD = 0.7 # Same as ultralytics predict default
+OPENVINO_CACHE_DIRECTORY = 'cache' # Inside the exported model directory, compiled models for faster loading
+
+
+def detect_device() -> str:
+    import torch
+
+    if torch.cuda.is_available():
+        return 'cuda'
+    if torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+def is_backend_available(backend: str) -> bool:
+    if backend == ULTRALYTICS_BACKEND:
+        return True
+    return importlib.util.find_spec(backend) is not None
+
+
+def resolve_backend(backend: str, device: str) -> str:
+    if backend != AUTO_BACKEND:
+        return backend
+
+    # Eager PyTorch is the fastest option on a GPU, exported graphs win on CPU
+    if device != 'cpu':
+        return ULTRALYTICS_BACKEND
+    for candidate in (OPENVINO_BACKEND, ONNX_RUNTIME_BACKEND):
+        if is_backend_available(candidate):
+            return candidate
+    return ULTRALYTICS_BACKEND
+
+
+def exported_model_path(model_path: str, export_format: str) -> str:
+    root, _ = os.path.splitext(model_path)
+    if export_format == 'openvino':
+        return f'{root}_openvino_model'
+    return f'{root}.{export_format}'
+
+
+# Graph optimized for this machine by ONNX Runtime, saved on the first load and loaded without optimizing later
+def optimized_model_path(model_path: str) -> str:
+    root, _ = os.path.splitext(model_path)
+    return f'{root}_optimized.onnx'
+
+
+def is_newer(path: str, source_path: str) -> bool:
+    return os.path.exists(path) and (not os.path.exists(source_path)
+                                     or os.path.getmtime(path) >= os.path.getmtime(source_path))
+
+
+# Exports next to the .pt file, re-exports only when the .pt file is newer than the cached export
+def export_model(model_path: str, export_format: str, **export_args) -> str:
+    exported_path = exported_model_path(model_path, export_format)
+    if is_newer(exported_path, model_path):
+        return exported_path
+
+    from ultralytics import YOLO
+
+    print(f'Exporting {model_path} to {export_format}, this happens only once')
+    return YOLO(model_path).export(format=export_format, dynamic=True, **export_args)
+
+
+class InferenceBackend:
+    name = None
+    names: dict[int, str] = {}
+
+    # Images are letterboxed BGR uint8 squares of input_size. Returns one float32 (N, 6) array per image, in input
+    # order: x1, y1, x2, y2 in image coordinates, confidence, class
+    def predict(self, images: list[np.ndarray], input_size: int, confidence_threshold: float,
+                classes: Optional[list[int]], max_det: int) -> list[np.ndarray]:
+        raise NotImplementedError
+
+
+    def _to_blob(self, images: list[np.ndarray]) -> np.ndarray:
+        # BGR HWC uint8 -> RGB NCHW float32 in [0, 1], in one pass over the batch
+        return cv.dnn.blobFromImages(images, scalefactor=1 / 255.0, swapRB=True)
+
+
+    def _to_boxes(self, output: np.ndarray, confidence_threshold: float, classes: Optional[list[int]],
+                  max_det: int) -> list[np.ndarray]:
+        import torch
+        from ultralytics.utils import ops
+
+        detections = ops.non_max_suppression(
+            torch.from_numpy(output),
+            conf_thres=confidence_threshold,
+            iou_thres=NMS_IOU_THRESHOLD,
+            classes=classes,
+            max_det=max_det
+        )
+
+        return [boxes.numpy() for boxes in detections]
+
+
+class UltralyticsBackend(InferenceBackend):
+    name = ULTRALYTICS_BACKEND
+
+    def __init__(self, model_path: str, device: str, num_threads: Optional[int] = None, verbose: bool = False) -> None:
+        import torch
+        from ultralytics import YOLO
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self._model = YOLO(model_path)
+        self._device = device
+        self._verbose = verbose
+        self.names = self._model.names
+
+
+    def predict(self, images: list[np.ndarray], input_size: int, confidence_threshold: float,
+                classes: Optional[list[int]], max_det: int) -> list[np.ndarray]:
+        results = self._model.predict(
+            images,
+            imgsz=input_size,
+            conf=confidence_threshold,
+            device=self._device,
+            classes=classes,
+            max_det=max_det,
+            verbose=self._verbose
+        ) # Returns one result per input image, in input order
+        return [result.boxes.data.cpu().numpy() for result in results]
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    name = ONNX_RUNTIME_BACKEND
+
+    def __init__(self, model_path: str, device: str, num_threads: Optional[int] = None,
+                 model_cache: bool = True) -> None:
+        import onnxruntime as ort
+
+        if not model_path.endswith('.onnx'):
+            model_path = export_model(model_path, 'onnx')
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+
+        providers = ['CPUExecutionProvider']
+        if device == 'cuda' and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+
+        # The optimized graph is specific to the CPU it was optimized on, so it is cached for the CPU provider only
+        if model_cache and providers == ['CPUExecutionProvider']:
+            cached_path = optimized_model_path(model_path)
+            if is_newer(cached_path, model_path):
+                model_path = cached_path
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            else:
+                options.optimized_model_filepath = cached_path
+
+        self._session = ort.InferenceSession(model_path, options, providers=providers)
+        self._input_name = self._session.get_inputs()[0].name
+
+        metadata = self._session.get_modelmeta().custom_metadata_map
+        self.names = {int(index): name for index, name in ast.literal_eval(metadata['names']).items()}
+
+
+    def predict(self, images: list[np.ndarray], input_size: int, confidence_threshold: float,
+                classes: Optional[list[int]], max_det: int) -> list[np.ndarray]:
+        output = self._session.run(None, {self._input_name: self._to_blob(images)})[0]
+        return self._to_boxes(output, confidence_threshold, classes, max_det)
+
+
+class OpenVinoBackend(InferenceBackend):
+    name = OPENVINO_BACKEND
+
+    def __init__(self, model_path: str, device: str, num_threads: Optional[int] = None,
+                 model_cache: bool = True) -> None:
+        import openvino as ov
+        from ultralytics.utils import yaml_load
+
+        model_dir = model_path if os.path.isdir(model_path) else export_model(model_path, 'openvino')
+        model_name = next(name for name in os.listdir(model_dir) if name.endswith('.xml'))
+
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if num_threads:
+            config['INFERENCE_NUM_THREADS'] = num_threads
+
+        core = ov.Core()
+        if model_cache:
+            # Compiling takes most of the load time, later launches read the compiled blob
+            core.set_property({'CACHE_DIR': os.path.join(model_dir, OPENVINO_CACHE_DIRECTORY)})
+        model = core.read_model(os.path.join(model_dir, model_name))
+        self._compiled_model = core.compile_model(model, 'CPU', config)
+        self._output = self._compiled_model.output(0)
+
+        metadata = yaml_load(os.path.join(model_dir, 'metadata.yaml'))
+        self.names = {int(index): name for index, name in metadata['names'].items()}
+
+
+    def predict(self, images: list[np.ndarray], input_size: int, confidence_threshold: float,
+                classes: Optional[list[int]], max_det: int) -> list[np.ndarray]:
+        output = self._compiled_model(self._to_blob(images))[self._output]
+        return self._to_boxes(output, confidence_threshold, classes, max_det)
+
+
+class StubBackend(InferenceBackend):
+    name = STUB_BACKEND
+    names = {index: name for index, name in enumerate(('person', 'bicycle', 'car'))}
+    inference_time = DEFAULT_STUB_INFERENCE_TIME # Set on the class before the backend is created
+
+    def __init__(self, model_path: str, device: str, num_threads: Optional[int] = None) -> None:
+        self._boxes = np.array(STUB_BOXES, dtype=np.float32)
+
+
+    def predict(self, images: list[np.ndarray], input_size: int, confidence_threshold: float,
+                classes: Optional[list[int]], max_det: int) -> list[np.ndarray]:
+        time.sleep(self.inference_time * len(images)) # Sleeps without holding the GIL, like a native runtime
+
+        boxes = self._boxes.copy()
+        boxes[:, :4] *= input_size
+        keep = boxes[:, 4] >= confidence_threshold
+        if classes is not None:
+            keep &= np.isin(boxes[:, 5], classes)
+        boxes = boxes[keep][:max_det]
+
+        return [boxes.copy() for _ in images]
+
+
+def create_backend(backend: str, model_path: str, device: str, num_threads: Optional[int] = None,
+                   verbose: bool = False, model_cache: bool = True) -> InferenceBackend:
+    backend = resolve_backend(backend, device)
+
+    if backend == ONNX_RUNTIME_BACKEND:
+        return OnnxRuntimeBackend(model_path, device, num_threads, model_cache)
+    if backend == OPENVINO_BACKEND:
+        return OpenVinoBackend(model_path, device, num_threads, model_cache)
+    if backend == ULTRALYTICS_BACKEND:
+        return UltralyticsBackend(model_path, device, num_threads, verbose)
+    if backend == STUB_BACKEND:
+        return StubBackend(model_path, device, num_threads)
+
+    raise ValueError(f'Unknown inference backend: {backend}')
@@ -0,0 +1,92 @@
+import numpy as np
+from typing import Optional
+
+DEFAULT_TILE_OVERLAP = 0.2 # Share of a tile repeated in its neighbour, so objects on a seam appear whole in one tile
+DEFAULT_MERGE_THRESHOLD = 0.7 # Intersection over the smaller box above which two same-class boxes are one object
+
+Region = tuple[float, float, float, float] # x1, y1, x2, y2 as fractions of the frame size
+
+
+class InferenceRegions:
+    # Parts of a frame that go through the detector. Everything outside the regions of interest is never
+    # inferred, each region can be split into overlapping tiles that keep small objects large in the model input
+    def __init__(self, regions_of_interest: Optional[list[Region]] = None, tile_columns: int = 1, tile_rows: int = 1,
+                 tile_overlap: float = DEFAULT_TILE_OVERLAP, include_full_view: bool = False) -> None:
+        self._regions_of_interest = regions_of_interest or [(0.0, 0.0, 1.0, 1.0)]
+        for x1, y1, x2, y2 in self._regions_of_interest:
+            if not (0.0 <= x1 < x2 <= 1.0 and 0.0 <= y1 < y2 <= 1.0):
+                raise ValueError(f'Region of interest must be given in frame fractions: {(x1, y1, x2, y2)}')
+
+        self._tile_columns = max(1, tile_columns)
+        self._tile_rows = max(1, tile_rows)
+        self._tile_overlap = min(max(0.0, tile_overlap), 0.9)
+        self._include_full_view = include_full_view # Untiled view of every region for objects larger than a tile
+
+        self._cached_size = None
+        self._cached_regions = None
+
+
+    # (K, 4) integer pixel rectangles, cached per frame size
+    def regions_for(self, width: int, height: int) -> np.ndarray:
+        if self._cached_size != (width, height):
+            self._cached_regions = self._compute_regions(width, height)
+            self._cached_size = (width, height)
+        return self._cached_regions
+
+
+    def _compute_regions(self, width: int, height: int) -> np.ndarray:
+        regions = []
+        for x1, y1, x2, y2 in self._regions_of_interest:
+            left, top, right, bottom = x1 * width, y1 * height, x2 * width, y2 * height
+            is_tiled = self._tile_columns > 1 or self._tile_rows > 1
+
+            if not is_tiled or self._include_full_view:
+                regions.append((left, top, right, bottom))
+            if is_tiled:
+                regions += self._tiles(left, top, right, bottom)
+
+        regions = np.round(np.array(regions)).astype(np.int64)
+        regions[:, 0::2] = np.clip(regions[:, 0::2], 0, width)
+        regions[:, 1::2] = np.clip(regions[:, 1::2], 0, height)
+
+        return regions[(regions[:, 2] > regions[:, 0]) & (regions[:, 3] > regions[:, 1])]
+
+
+    def _tiles(self, left: float, top: float, right: float, bottom: float) -> list[tuple]:
+        starts_x, tile_width = self._tile_starts(left, right, self._tile_columns)
+        starts_y, tile_height = self._tile_starts(top, bottom, self._tile_rows)
+        return [(x, y, x + tile_width, y + tile_height) for y in starts_y for x in starts_x]
+
+
+    def _tile_starts(self, start: float, end: float, count: int) -> tuple[np.ndarray, float]:
+        # count tiles sharing `overlap` of their size with each neighbour cover the span exactly
+        tile_size = (end - start) / (count - self._tile_overlap * (count - 1))
+        step = tile_size * (1 - self._tile_overlap)
+        return start + step * np.arange(count), tile_size
+
+
+# Greedy NMS over detections gathered from several regions of one frame, (N, 6) x1, y1, x2, y2, confidence, class.
+# Intersection over the smaller box also merges the clipped part of an object cut by a tile border
+def merge_region_detections(data: np.ndarray, threshold: float = DEFAULT_MERGE_THRESHOLD) -> np.ndarray:
+    if len(data) < 2:
+        return data
+
+    data = data[np.argsort(-data[:, 4], kind='stable')]
+    boxes = data[:, :4]
+
+    top_left = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    intersection = (bottom_right - top_left).clip(min=0).prod(axis=2)
+    areas = (boxes[:, 2:] - boxes[:, :2]).prod(axis=1)
+    overlap = intersection / np.maximum(np.minimum(areas[:, None], areas[None, :]), 1e-9)
+
+    suppresses = (overlap >= threshold) & (data[:, None, 5] == data[None, :, 5])
+
+    # Sequential, a suppressed box suppresses nothing: of a chain A > B > C where only neighbours overlap, A and C are
+    # kept. The loop runs over the boxes of one frame, which are few
+    keep = np.ones(len(data), dtype=bool)
+    for index in range(len(data)):
+        if keep[index]:
+            keep[index + 1:] &= ~suppresses[index, index + 1:]
+
+    return data[keep]
@@ -0,0 +1,107 @@
+import multiprocessing
+import sys
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from typing import Optional
+
+from detector.image_processor import ImageProcessor
+from detector.frame import Frame
+from detector.detections import Detections
+from detector.inference_regions import InferenceRegions
+
+MAX_MAPPED_BUFFERS = 128 # Shared frame buffers a worker keeps mapped between tasks
+
+# Worker process state, set up once by _initialize_worker
+_image_processor = None
+_mapped_buffers: OrderedDict = OrderedDict()
+
+
+def _initialize_worker(backend: str, model_path: str, num_threads: Optional[int]) -> None:
+    global _image_processor
+    _image_processor = ImageProcessor(backend, model_path, num_threads)
+
+
+# Only the engine's FramePool registers and unlinks the buffers. Spawned workers report to the engine's resource
+# tracker, where attaching before Python 3.13 registers the name again, a no-op as the tracker keeps a set.
+# Unregistering it here would drop the engine's own registration
+def _attach_buffer(name: str) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)
+    return SharedMemory(name=name)
+
+
+def _map_buffer(name: str) -> SharedMemory:
+    shared_memory = _mapped_buffers.get(name)
+    if shared_memory is not None:
+        _mapped_buffers.move_to_end(name)
+        return shared_memory
+
+    shared_memory = _attach_buffer(name)
+    _mapped_buffers[name] = shared_memory
+
+    if len(_mapped_buffers) > MAX_MAPPED_BUFFERS:
+        try:
+            _mapped_buffers.popitem(last=False)[1].close()
+        except BufferError:
+            pass # Still viewed by a result being collected, unmapped with it
+    return shared_memory
+
+
+# Runs in a worker. Frames are (shared memory name, shape, dtype), detections come back serialized together with
+# the preprocess and inference seconds of the batch
+def _detect_in_worker(frames: list[tuple[str, tuple, str]], frame_regions: list[Optional[InferenceRegions]],
+                      settings: dict) -> tuple[list[bytes], tuple[float, float]]:
+    _image_processor.apply_inference_settings(settings)
+
+    images = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=_map_buffer(name).buf) for name, shape, dtype in frames]
+    results = _image_processor.detect_objects_batch(images, frame_regions)
+
+    return [detections.to_bytes() for detections, _ in results], _image_processor.get_last_batch_timings()
+
+
+class InferenceWorkerPool:
+    # Detection in separate processes, each with its own model and its own GIL. Frames must live in shared memory
+    # (FramePool(shared_memory=True)) and stay retained until the returned future is done
+    def __init__(self, image_processor: ImageProcessor, num_workers: int, num_threads: Optional[int] = None) -> None:
+        self._image_processor = image_processor
+        self._num_workers = num_workers
+
+        # Spawned, so workers do not inherit CUDA state, Tk or the capture threads of this process
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_initialize_worker,
+            initargs=(image_processor.get_backend_name(), image_processor.get_model_path(), num_threads)
+        )
+
+
+    def get_num_workers(self) -> int:
+        return self._num_workers
+
+
+    # Future of one Detections per frame, in frame order, and the (preprocess, inference) seconds of the batch.
+    # Settings are read now, so GUI changes reach the workers
+    def submit(self, frames: list[Frame], frame_regions: list[Optional[InferenceRegions]]) -> Future:
+        shared_frames = [
+            (frame.buffer.get_shared_memory_name(), frame.data.shape, frame.data.dtype.str) for frame in frames
+        ]
+        future = self._executor.submit(_detect_in_worker, shared_frames, frame_regions,
+                                       self._image_processor.get_inference_settings())
+
+        detections_future = Future()
+        future.add_done_callback(lambda done: self._decode_detections(done, detections_future))
+        return detections_future
+
+
+    def _decode_detections(self, future: Future, detections_future: Future) -> None:
+        try:
+            serialized_detections, timings = future.result()
+            detections_future.set_result(([Detections.from_bytes(data) for data in serialized_detections], timings))
+        except BaseException as e:
+            detections_future.set_exception(e)
+
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
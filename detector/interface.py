@@ -1,24 +1,31 @@
+import time
 import tkinter as tk
 from tkinter import filedialog
-from PIL import ImageGrab
 import cv2 as cv
-from cv2.typing import MatLike
 
 from detector.app import App
 from detector.video_capture import NO_VIDEO
+from detector.frame import Frame, BGR
+from detector.image_processor import MODEL_READY, MODEL_FAILED
 
-AFTER_DELAY = 1
+DISPLAY_FPS_OPTIONS = (0, 15, 30, 60) # 0 follows the frame rate of the source
+FALLBACK_DISPLAY_FPS = 60.0 # Cap when the source does not report its frame rate
+PACING_SLACK = 0.8 # Share of a frame interval before the next frame may be shown, source jitter costs no interval
+FRAME_WAIT_INTERVAL = 5 # ms between looks at the frame-ready signal once the next frame is due
+DISPLAY_STATS_INTERVAL = 1000 # ms
+SOURCE_REFRESH_INTERVAL = 500 # ms between checks for cameras plugged in or out, a check only reads a counter
+MODEL_POLL_INTERVAL = 100 # ms between checks whether the model has loaded
 
 class GUI:
     def __init__(self, communication_interface: App) -> None:
         self._communication_interface = communication_interface
 
-        # Initializing screen resolution (for window size)
-        screen = ImageGrab.grab()
-        screen_width, screen_height = screen.size
-        self._communication_interface.set_max_display_dimention(screen_width, screen_height)
-
         self._selected_video_source_id = None
+        self._sources_version = None
+        self._display_frame = None # Reused if a conversion to BGR is needed, reallocated only on resolution change
+        self._is_displaying = False
+        self._update_job = None # Pending Tk callback of the display loop
+        self._last_displayed_sequence = None
         self._initialize_control_panel()
         
 
@@ -27,8 +34,10 @@ class GUI:
         self._root.title('Control panel')
         self._root.resizable(False, False)
 
-        screen = ImageGrab.grab()
-        screen_width, screen_height = screen.size
+        # Initializing screen resolution (for window size), Tk knows it without grabbing the screen
+        screen_width = self._root.winfo_screenwidth()
+        screen_height = self._root.winfo_screenheight()
+        self._communication_interface.set_max_display_dimention(screen_width, screen_height)
         scaling_factor = 0.3
 
         window_width = int(screen_width * scaling_factor)
@@ -39,6 +48,7 @@ class GUI:
         self._menubar = tk.Menu(master=self._root)
         self._root.config(menu=self._menubar)
         self._initialize_video_source_menu()
+        self._initialize_display_menu()
         self._initialize_detector_parameters_menu()
 
 
@@ -46,19 +56,31 @@ class GUI:
         self._source_menu = tk.Menu(master=self._menubar, tearoff=0)
         self._selected_video_source_id = tk.IntVar()
 
-        sources = self._communication_interface.get_available_sources()
-        for source_name in sources:
-            self._source_menu.add_radiobutton(
-                label=source_name,
-                variable=self._selected_video_source_id,
-                value=sources[source_name],
-                command=lambda source_index=sources[source_name]: self._on_video_source_select(source_index)
-            )
+        # Cameras are discovered in the background, the menu starts with the cached ones and is refreshed
+        self._refresh_video_source_menu()
 
         self._selected_video_source_id.set(NO_VIDEO)
         self._menubar.add_cascade(menu=self._source_menu, label='Video source')
 
 
+    def _refresh_video_source_menu(self) -> None:
+        sources_version = self._communication_interface.get_sources_version()
+        if sources_version != self._sources_version:
+            self._sources_version = sources_version
+            self._source_menu.delete(0, tk.END)
+
+            sources = self._communication_interface.get_available_sources()
+            for source_name in sources:
+                self._source_menu.add_radiobutton(
+                    label=source_name,
+                    variable=self._selected_video_source_id,
+                    value=sources[source_name],
+                    command=lambda source_index=sources[source_name]: self._on_video_source_select(source_index)
+                )
+
+        self._root.after(SOURCE_REFRESH_INTERVAL, self._refresh_video_source_menu)
+
+
     def _on_video_source_select(self, source_id: int) -> None:
         is_source_on = self._communication_interface.set_video_source(source_id)
         self._selected_video_source_id.set(source_id)
@@ -69,16 +91,53 @@ class GUI:
             self._stop_displaying()
 
 
+    def _initialize_display_menu(self) -> None:
+        self._display_menu = tk.Menu(master=self._menubar, tearoff=0)
+        self._display_fps = tk.IntVar(value=DISPLAY_FPS_OPTIONS[0])
+
+        for display_fps in DISPLAY_FPS_OPTIONS:
+            self._display_menu.add_radiobutton(
+                label=f'{display_fps} FPS' if display_fps > 0 else 'Source FPS',
+                variable=self._display_fps,
+                value=display_fps
+            )
+        self._menubar.add_cascade(menu=self._display_menu, label='Display')
+
+        # Displayed FPS and capture-to-screen latency, below the detector parameters
+        self._display_stats_label = tk.Label(self._root, text='')
+        self._display_stats_label.pack(side='bottom', pady=5)
+        self._update_display_stats()
+
+
+    def _update_display_stats(self) -> None:
+        displayed_fps, display_latency = self._communication_interface.get_display_stats()
+        if self._is_displaying and display_latency is not None:
+            self._display_stats_label.config(
+                text=f'Display: {displayed_fps:.1f} FPS, latency {display_latency * 1000:.0f} ms')
+        else:
+            self._display_stats_label.config(text='')
+        self._root.after(DISPLAY_STATS_INTERVAL, self._update_display_stats)
+
+
     def _start_displaying(self) -> None:
+        self._cancel_update()
         self._is_displaying = True
+        self._last_displayed_sequence = None
         cv.namedWindow('Display', cv.WINDOW_NORMAL)
         cv.moveWindow('Display', 0, 0)
         self._update_frame()
 
 
     def _stop_displaying(self) -> None:
+        self._cancel_update()
         self._is_displaying = False
         cv.destroyAllWindows()
+
+
+    def _cancel_update(self) -> None:
+        if self._update_job is not None:
+            self._root.after_cancel(self._update_job)
+            self._update_job = None
     
 
     def _initialize_detector_parameters_menu(self) -> None:
@@ -101,6 +160,26 @@ class GUI:
         confidence_threshold_slider.set(self._communication_interface.get_confidence_threshold())
         confidence_threshold_slider.pack(pady=10)
 
+        # Add annotation options
+        show_confidence_var = tk.BooleanVar(value=self._communication_interface.get_show_confidence())
+        show_confidence_checkbox = tk.Checkbutton(
+            self._detector_frame,
+            text='Show confidence',
+            variable=show_confidence_var,
+            command=lambda: self._communication_interface.set_show_confidence(show_confidence_var.get())
+        )
+        show_confidence_checkbox.pack(pady=1)
+
+        class_colors_var = tk.BooleanVar(value=self._communication_interface.get_class_colors())
+        class_colors_checkbox = tk.Checkbutton(
+            self._detector_frame,
+            text='Color per class',
+            variable=class_colors_var,
+            command=lambda: self._communication_interface.set_class_colors(class_colors_var.get())
+        )
+        class_colors_checkbox.pack(pady=1)
+        self._annotation_vars = (show_confidence_var, class_colors_var) # Tk variables must outlive this method
+
         # Add object class selection
         classes_label = tk.Label(self._detector_frame, text='Classes of objects:')
         classes_label.pack(pady=1)
@@ -116,6 +195,38 @@ class GUI:
         checkbox_frame = tk.Frame(checkbox_canvas)
         checkbox_canvas.create_window((0, 0), window=checkbox_frame, anchor='nw')
 
+        # Class names come with the model, which loads in the background
+        self._model_status_label = tk.Label(checkbox_frame, text='Loading model...')
+        self._model_status_label.grid(row=0, column=0, sticky='w', padx=5, pady=2)
+        self._checkbox_frame = checkbox_frame
+
+        # Bind the scroll events
+        checkbox_canvas.bind_all('<MouseWheel>', self._on_mouse_scroll)  # For Windows/macOS
+        checkbox_canvas.bind_all('<Button-4>', self._on_mouse_scroll)    # For Linux scroll up
+        checkbox_canvas.bind_all('<Button-5>', self._on_mouse_scroll)    # For Linux scroll down
+
+        # Save checkbox_canvas reference
+        self._checkbox_canvas = checkbox_canvas
+
+        self._wait_for_model()
+
+
+    def _wait_for_model(self) -> None:
+        model_state = self._communication_interface.get_model_state()
+        if model_state == MODEL_READY:
+            self._model_status_label.destroy()
+            self._initialize_class_checkboxes()
+        elif model_state == MODEL_FAILED:
+            model_error = self._communication_interface.get_model_error()
+            self._model_status_label.config(text=f'Model failed to load: {model_error}')
+        else:
+            self._root.after(MODEL_POLL_INTERVAL, self._wait_for_model)
+
+
+    def _initialize_class_checkboxes(self) -> None:
+        checkbox_frame = self._checkbox_frame
+        checkbox_canvas = self._checkbox_canvas
+
         checkbox_vars = []
         row = 0
         col = 0
@@ -142,17 +253,11 @@ class GUI:
                 col = 0
                 row += 1
 
+        self._checkbox_vars = checkbox_vars # Tk variables must outlive this method
+
         checkbox_frame.update_idletasks()
         checkbox_canvas.config(scrollregion=checkbox_canvas.bbox('all'))
 
-        # Bind the scroll events
-        checkbox_canvas.bind_all('<MouseWheel>', self._on_mouse_scroll)  # For Windows/macOS
-        checkbox_canvas.bind_all('<Button-4>', self._on_mouse_scroll)    # For Linux scroll up
-        checkbox_canvas.bind_all('<Button-5>', self._on_mouse_scroll)    # For Linux scroll down
-
-        # Save checkbox_canvas reference
-        self._checkbox_canvas = checkbox_canvas
-
     
     def _on_mouse_scroll(self, event) -> None:
         if event.num == 4 or event.delta > 0:
@@ -185,23 +290,45 @@ class GUI:
         self._root.mainloop()
 
 
-    def _show_frame(self, frame: MatLike) -> None:
-        frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
-        cv.imshow('Display', frame)
+    def _show_frame(self, frame: Frame) -> None:
+        display_frame = frame.as_colorspace(BGR, dst=self._display_frame)
+        if display_frame is not frame.data:
+            self._display_frame = display_frame
+        cv.imshow('Display', display_frame)
 
 
+    # Tk cannot be woken from the processing thread, so the loop looks at the stream's frame-ready signal, which is a
+    # flag read without a lock. After a frame is shown, the next look waits for the display interval
     def _update_frame(self) -> None:
+        self._update_job = None
         if not self._is_displaying:
             self._stop_displaying()
             return
 
+        if not self._communication_interface.has_display_update():
+            self._update_job = self._root.after(FRAME_WAIT_INTERVAL, self._update_frame)
+            return
+
         is_capture_on, frame = self._communication_interface.get_processed_frame()
 
         if is_capture_on:
             if frame is not None:
-                self._show_frame(frame)
-            self._root.after(AFTER_DELAY, self._update_frame)
+                # Unchanged frames are not redrawn
+                if frame.sequence != self._last_displayed_sequence:
+                    display_start_time = time.monotonic()
+                    self._show_frame(frame)
+                    self._communication_interface.record_frame_displayed(frame,
+                                                                         time.monotonic() - display_start_time)
+                    self._last_displayed_sequence = frame.sequence
+                frame.release()
+            self._update_job = self._root.after(self._get_display_delay(), self._update_frame)
         else:
             self._communication_interface.set_video_source(NO_VIDEO)
             self._selected_video_source_id.set(NO_VIDEO)
             self._stop_displaying()
+
+
+    # ms until the next frame may be shown, paced to the chosen FPS or the FPS of the source
+    def _get_display_delay(self) -> int:
+        display_fps = self._display_fps.get() or self._communication_interface.get_source_fps() or FALLBACK_DISPLAY_FPS
+        return max(1, int(1000 * PACING_SLACK / display_fps))
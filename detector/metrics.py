@@ -0,0 +1,208 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+# Pipeline stages, in the order a frame passes them
+DECODE = 'decode' # Decode of one grabbed frame by the capture thread
+QUEUE = 'queue' # Capture until the frame is taken into a batch
+PREPROCESS = 'preprocess' # Crop and letterbox of a whole batch
+INFERENCE = 'inference' # Model call of a whole batch, including the box mapping
+ANNOTATION = 'annotation' # Display scaling and drawing of one frame
+SINKS = 'sinks' # Alerts and result sinks of one frame
+PROCESSED = 'processed' # Capture until the frame is processed, end to end without display
+HANDOFF = 'handoff' # Processed frame waiting for get_processed_frame
+DISPLAY = 'display' # Showing one frame on screen
+DISPLAYED = 'displayed' # Capture until the frame is on screen
+STAGES = (DECODE, QUEUE, PREPROCESS, INFERENCE, ANNOTATION, SINKS, PROCESSED, HANDOFF, DISPLAY, DISPLAYED)
+
+# Upper bounds in seconds, ten per decade from 0.1 ms to 10 s, so interpolated quantiles are off by a few percent
+LATENCY_BUCKETS = tuple(round(10 ** (exponent / 10), 7) for exponent in range(-40, 11))
+QUANTILES = (0.5, 0.95, 0.99)
+DEFAULT_METRICS_PORT = 9108
+METRICS_PREFIX = 'detector'
+
+# Stream stats exported as counters (monotonic) and gauges
+STREAM_COUNTERS = ('frames_captured', 'frames_skipped', 'frames_processed', 'frames_dropped', 'frames_overwritten',
+                   'frames_gated', 'frames_tracked', 'frames_displayed')
+STREAM_GAUGES = ('queued_frames', 'processed_fps', 'displayed_fps')
+
+
+# Quantile q of the samples counted per bucket, interpolated inside its bucket. The +Inf bucket ends at maximum
+def interpolate_quantile(buckets: tuple[float, ...], counts: list[int], q: float,
+                         maximum: float) -> Optional[float]:
+    count = sum(counts)
+    if count == 0:
+        return None
+
+    rank = q * count
+    cumulative = 0
+    for index, bucket_count in enumerate(counts):
+        if cumulative + bucket_count >= rank and bucket_count > 0:
+            lower = buckets[index - 1] if index > 0 else 0.0
+            upper = buckets[index] if index < len(buckets) else maximum
+            return min(lower + (upper - lower) * (rank - cumulative) / bucket_count, maximum)
+        cumulative += bucket_count
+
+    return maximum
+
+
+class LatencyHistogram:
+    # Fixed buckets, so observing is a bisect and an increment and memory does not grow with the sample count.
+    # Quantiles are interpolated inside their bucket
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1) # Last one is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+
+    def get_buckets(self) -> tuple[float, ...]:
+        return self._buckets
+
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(self._buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += seconds
+            if seconds > self._max:
+                self._max = seconds
+
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self._buckets) + 1)
+            self._count = 0
+            self._sum = 0.0
+            self._max = 0.0
+
+
+    def quantile(self, q: float) -> Optional[float]:
+        counts, _, maximum = self.get_counts()
+        return interpolate_quantile(self._buckets, counts, q, maximum)
+
+
+    # Per-bucket counts, sum and max. The difference of two calls describes the samples observed in between
+    def get_counts(self) -> tuple[list[int], float, float]:
+        with self._lock:
+            return list(self._counts), self._sum, self._max
+
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            count = self._count
+            total = self._sum
+            maximum = self._max
+
+        stats = {'count': count, 'mean': total / count if count else None, 'max': maximum if count else None}
+        for q in QUANTILES:
+            stats[f'p{round(q * 100)}'] = self.quantile(q)
+        return stats
+
+
+    # Cumulative bucket counts as Prometheus expects them, sum and count
+    def get_snapshot(self) -> tuple[list[tuple[float, int]], float, int]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+
+        cumulative_buckets = []
+        cumulative = 0
+        for upper_bound, bucket_count in zip(self._buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            cumulative_buckets.append((upper_bound, cumulative))
+        return cumulative_buckets, total, count
+
+
+class PipelineMetrics:
+    # One latency histogram per pipeline stage, shared by every stream of an engine
+    def __init__(self) -> None:
+        self._histograms = {stage: LatencyHistogram() for stage in STAGES}
+
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self._histograms[stage].observe(seconds)
+
+
+    # Starts a new measurement window, e.g. after a warm-up
+    def reset(self) -> None:
+        for histogram in self._histograms.values():
+            histogram.reset()
+
+
+    def get_histogram(self, stage: str) -> LatencyHistogram:
+        return self._histograms[stage]
+
+
+    def get_stats(self) -> dict[str, dict]:
+        return {stage: histogram.get_stats() for stage, histogram in self._histograms.items()}
+
+
+def _format_labels(labels: dict) -> str:
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+def _format_bound(upper_bound: float) -> str:
+    return '+Inf' if upper_bound == float('inf') else repr(upper_bound)
+
+
+# Prometheus text exposition format 0.0.4
+def render_prometheus(metrics: PipelineMetrics, stream_stats: dict[int, dict]) -> str:
+    name = f'{METRICS_PREFIX}_stage_latency_seconds'
+    lines = [f'# HELP {name} Time spent per pipeline stage', f'# TYPE {name} histogram']
+    for stage in STAGES:
+        buckets, total, count = metrics.get_histogram(stage).get_snapshot()
+        for upper_bound, cumulative in buckets:
+            lines.append(f'{name}_bucket{_format_labels({"stage": stage, "le": _format_bound(upper_bound)})} '
+                         f'{cumulative}')
+        lines.append(f'{name}_sum{_format_labels({"stage": stage})} {total}')
+        lines.append(f'{name}_count{_format_labels({"stage": stage})} {count}')
+
+    for metric_type, stat_names in (('counter', STREAM_COUNTERS), ('gauge', STREAM_GAUGES)):
+        for stat_name in stat_names:
+            name = f'{METRICS_PREFIX}_{stat_name}' + ('_total' if metric_type == 'counter' else '')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for stream_id, stats in stream_stats.items():
+                lines.append(f'{name}{_format_labels({"stream": stream_id})} {stats.get(stat_name, 0)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    # Serves GET /metrics in Prometheus text format from a daemon thread. The page is rendered per scrape
+    def __init__(self, render: Callable[[], str], port: int = DEFAULT_METRICS_PORT, host: str = '0.0.0.0') -> None:
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+
+            def log_message(self, format: str, *args) -> None:
+                pass # Scrapes every few seconds would flood the console
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+
+    def get_port(self) -> int:
+        return self._server.server_address[1]
+
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
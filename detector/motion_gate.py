@@ -0,0 +1,73 @@
+import cv2 as cv
+
+from detector.frame import Frame, GRAY, conversion_code
+
+DEFAULT_REFRESH_INTERVAL = 2.0 # seconds, detector runs at least this often even on a static scene
+DEFAULT_THUMBNAIL_WIDTH = 160
+DEFAULT_PIXEL_THRESHOLD = 25 # Gray level difference counted as a changed pixel
+DEFAULT_MIN_CHANGED_FRACTION = 0.002 # Share of changed thumbnail pixels that counts as motion
+BLUR_KERNEL = (5, 5) # Suppresses sensor noise before differencing
+
+
+class MotionGate:
+    # Compares a small grayscale thumbnail against the one of the last frame that went through the detector,
+    # so slow changes accumulate until they trigger detection
+    def __init__(self, refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+                 thumbnail_width: int = DEFAULT_THUMBNAIL_WIDTH, pixel_threshold: int = DEFAULT_PIXEL_THRESHOLD,
+                 min_changed_fraction: float = DEFAULT_MIN_CHANGED_FRACTION) -> None:
+        self._refresh_interval = refresh_interval
+        self._thumbnail_width = thumbnail_width
+        self._pixel_threshold = pixel_threshold
+        self._min_changed_fraction = min_changed_fraction
+
+        # Reused buffers, reallocated by OpenCV only when the source resolution changes
+        self._small_frame = None
+        self._thumbnail = None
+        self._reference = None
+        self._difference = None
+        self._reference_time = None
+
+        self._frames_gated = 0
+        self._frames_passed = 0
+
+
+    # True when the frame has to go through the detector, it then becomes the new reference
+    def should_detect(self, frame: Frame) -> bool:
+        self._make_thumbnail(frame)
+
+        if (self._reference is None or self._reference.shape != self._thumbnail.shape
+                or frame.capture_time - self._reference_time >= self._refresh_interval
+                or self._changed_fraction() >= self._min_changed_fraction):
+            self._thumbnail, self._reference = self._reference, self._thumbnail
+            self._reference_time = frame.capture_time
+            self._frames_passed += 1
+            return True
+
+        self._frames_gated += 1
+        return False
+
+
+    def get_stats(self) -> dict:
+        return {
+            'frames_gated': self._frames_gated,
+            'frames_passed': self._frames_passed,
+        }
+
+
+    def _make_thumbnail(self, frame: Frame) -> None:
+        height, width = frame.data.shape[:2]
+        thumbnail_size = (self._thumbnail_width, max(1, round(height * self._thumbnail_width / width)))
+
+        self._small_frame = cv.resize(frame.data, thumbnail_size, dst=self._small_frame, interpolation=cv.INTER_AREA)
+        if frame.colorspace == GRAY:
+            self._thumbnail = cv.GaussianBlur(self._small_frame, BLUR_KERNEL, 0, dst=self._thumbnail)
+        else:
+            self._thumbnail = cv.cvtColor(self._small_frame, conversion_code(frame.colorspace, GRAY),
+                                          dst=self._thumbnail)
+            cv.GaussianBlur(self._thumbnail, BLUR_KERNEL, 0, dst=self._thumbnail)
+
+
+    def _changed_fraction(self) -> float:
+        self._difference = cv.absdiff(self._thumbnail, self._reference, dst=self._difference)
+        cv.threshold(self._difference, self._pixel_threshold, 255, cv.THRESH_BINARY, dst=self._difference)
+        return cv.countNonZero(self._difference) / self._difference.size
@@ -0,0 +1,456 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from detector.image_processor import ImageProcessor
+from detector.video_processing_engine import VideoProcessingEngine
+from detector.metrics import interpolate_quantile, PREPROCESS, INFERENCE, ANNOTATION, SINKS, PROCESSED
+
+CONTROL_INTERVAL = 2.0 # seconds per measurement window, at most one decision per window
+DEGRADE_LOAD = 0.9 # Share of the frame budget in use above which quality goes down
+UPGRADE_LOAD = 0.7 # Share the better level is predicted to use, below which quality goes up
+DEGRADE_WINDOWS = 2 # Consecutive windows over budget before stepping down
+UPGRADE_WINDOWS = 5 # Consecutive windows with headroom before stepping up
+MAX_UPGRADE_WINDOWS = 80 # Upgrade patience doubles whenever an upgrade is undone, up to this
+FLAP_WINDOWS = 15 # A step down this soon after a step up counts as flapping
+SETTLE_WINDOWS = 1 # Windows ignored after a change, their frames were partly processed at the old level
+MIN_WINDOW_FRAMES = 5 # A window with fewer processed frames is extended
+MAX_WINDOW_INTERVALS = 10 # Control intervals after which a window with too few frames is dropped
+LATENCY_QUANTILE = 0.95
+UPGRADE_LATENCY_SHARE = 0.7 # Latency quantile must be below this share of the latency target to step up
+DROPPED_FPS_SHARE = 0.95 # Frames dropped while processing below this share of the demanded rate is falling behind
+QUEUE_GROWTH_FRAMES = 2 # Frames the queues may grow by in a window before the pipeline counts as falling behind
+DECISION_HISTORY = 100
+MODEL_WAIT_INTERVAL = 0.5 # seconds between checks for stop while the model is loading
+
+INPUT_SIZES = (640, 512, 416, 320) # Tried from the configured input size down
+MAX_DETECTION_INTERVAL = 4 # Last resort, detection every N frames and tracking in between
+MODEL_SCALE_COSTS = {'n': 8.7, 's': 28.6, 'm': 78.9, 'l': 165.2, 'x': 257.8} # YOLOv8 GFLOPs at 640
+UNKNOWN_MODEL_COST_RATIO = 3.0 # Assumed cost of a model relative to the next one when its scale is unknown
+MODEL_SCALE_PATTERN = re.compile(r'^(yolo\w*?\d+)([nsmlx])(.*)$') # yolov8n.pt, yolo11s.onnx, ...
+STAGE_NAMES = (PREPROCESS, INFERENCE, ANNOTATION, SINKS, PROCESSED)
+
+DEGRADE = 'degrade'
+UPGRADE = 'upgrade'
+HOLD = 'hold' # Over budget at the cheapest level
+MODEL_SWITCHED = 'model switched'
+MODEL_SWITCH_FAILED = 'model switch failed'
+
+
+class QualityLevel:
+    __slots__ = ('model_path', 'input_size', 'detection_interval', 'cost')
+
+    def __init__(self, model_path: str, input_size: int, detection_interval: int, model_cost: float) -> None:
+        self.model_path = model_path
+        self.input_size = input_size
+        self.detection_interval = detection_interval
+        self.cost = model_cost * input_size ** 2 / detection_interval # Relative inference cost per frame
+
+
+    def label(self) -> str:
+        every = f'every {self.detection_interval} frames' if self.detection_interval > 1 else 'every frame'
+        return f'{os.path.basename(self.model_path)} at {self.input_size}, detection {every}'
+
+
+    def to_dict(self) -> dict:
+        return {'model_path': self.model_path, 'input_size': self.input_size,
+                'detection_interval': self.detection_interval}
+
+
+def get_model_scale(model_path: str) -> Optional[str]:
+    match = MODEL_SCALE_PATTERN.match(os.path.basename(model_path))
+    return match.group(2) if match is not None else None
+
+
+# Variants of the model in its directory that are no larger, e.g. yolov8s.pt -> [yolov8s.pt, yolov8n.pt]
+def find_model_variants(model_path: str) -> list[str]:
+    directory, name = os.path.split(model_path)
+    match = MODEL_SCALE_PATTERN.match(name)
+    if match is None or match.group(2) not in MODEL_SCALE_COSTS:
+        return [model_path]
+
+    scales = list(MODEL_SCALE_COSTS)
+    variants = [model_path]
+    for scale in reversed(scales[:scales.index(match.group(2))]):
+        path = os.path.join(directory, f'{match.group(1)}{scale}{match.group(3)}')
+        if os.path.exists(path):
+            variants.append(path)
+    return variants
+
+
+# Relative cost of every model, model_paths from the most to the least expensive
+def get_model_costs(model_paths: list[str]) -> list[float]:
+    scales = [get_model_scale(model_path) for model_path in model_paths]
+    if all(scale in MODEL_SCALE_COSTS for scale in scales):
+        return [MODEL_SCALE_COSTS[scale] for scale in scales]
+    return [UNKNOWN_MODEL_COST_RATIO ** (len(model_paths) - 1 - index) for index in range(len(model_paths))]
+
+
+# Best level first, every step changes one setting: the model, then the input size, then the detection interval
+def build_quality_ladder(model_paths: list[str], input_sizes: list[int],
+                         detection_intervals: list[int]) -> list[QualityLevel]:
+    costs = get_model_costs(model_paths)
+    ladder = [QualityLevel(model_path, input_sizes[0], detection_intervals[0], cost)
+              for model_path, cost in zip(model_paths, costs)]
+    ladder += [QualityLevel(model_paths[-1], input_size, detection_intervals[0], costs[-1])
+               for input_size in input_sizes[1:]]
+    ladder += [QualityLevel(model_paths[-1], input_sizes[-1], detection_interval, costs[-1])
+               for detection_interval in detection_intervals[1:]]
+    return ladder
+
+
+class QualityController:
+    # Holds a target FPS per stream and/or a target capture-to-processed latency by moving along a ladder of
+    # quality levels, from the configured settings (the best level) down to a smaller model, smaller input sizes
+    # and finally detection every few frames with tracking in between.
+    # Every window the busy time of the stages is divided by the frames processed and multiplied by the frame
+    # rate the streams demand, which is the share of the processing budget in use. A level is left when that share
+    # or the latency stays over budget, the frame queues keep growing, or frames are dropped while falling behind.
+    # A better level is only taken when it is predicted to fit with headroom for longer and the queues do not grow,
+    # and that patience doubles when upgrades flap.
+    # Every decision is printed and, with log_path, appended to a JSONL file
+    def __init__(self, engine: VideoProcessingEngine, image_processor: ImageProcessor,
+                 target_fps: Optional[float] = None, target_latency: Optional[float] = None,
+                 model_paths: Optional[list[str]] = None, input_sizes: tuple[int, ...] = INPUT_SIZES,
+                 max_detection_interval: int = MAX_DETECTION_INTERVAL, log_path: Optional[str] = None,
+                 control_interval: float = CONTROL_INTERVAL) -> None:
+        if target_fps is None and target_latency is None:
+            raise ValueError('A target FPS or a target latency is required')
+
+        self._engine = engine
+        self._image_processor = image_processor
+        self._target_fps = target_fps
+        self._target_latency = target_latency
+        self._control_interval = control_interval
+        self._log_path = log_path
+
+        # Models from the most to the least expensive, the loaded one is where the controller starts.
+        # Workers load their model once at start, only the settings they get with every batch can change
+        model_path = image_processor.get_model_path()
+        if engine.get_num_inference_workers() > 0:
+            if model_paths:
+                print('Adaptive quality: models are not switched with inference workers')
+            model_paths = [model_path]
+        elif model_paths is None:
+            model_paths = find_model_variants(model_path)
+        elif model_path not in model_paths:
+            model_paths = [model_path] + model_paths
+        self._model_paths = list(model_paths)
+
+        input_size = image_processor.get_input_size()
+        self._input_sizes = [input_size] + [size for size in input_sizes if size < input_size]
+        detection_interval, self._tracking = engine.get_detection_cadence()
+        self._detection_intervals = list(range(detection_interval,
+                                               max(detection_interval, max_detection_interval) + 1))
+
+        self._ladder = build_quality_ladder(self._model_paths, self._input_sizes, self._detection_intervals)
+        self._level_index = self._model_paths.index(model_path)
+
+        self._over_windows = 0
+        self._under_windows = 0
+        self._settle_windows = 0
+        self._upgrade_windows = UPGRADE_WINDOWS
+        self._windows = 0 # Evaluated so far
+        self._last_upgrade_window: Optional[int] = None
+        self._is_holding = False # A HOLD is logged once per episode over budget at the cheapest level
+        self._pending_model: Optional[str] = None # Being loaded, no decisions until it is in use or failed
+        self._last_window: Optional[dict] = None
+
+        self._decisions: deque = deque(maxlen=DECISION_HISTORY)
+        self._lock = threading.Lock() # Guards the level and the decisions, models finish loading on their thread
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._control, daemon=True)
+
+
+    def start(self) -> None:
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+    def get_level(self) -> QualityLevel:
+        with self._lock:
+            return self._ladder[self._level_index]
+
+
+    def get_ladder(self) -> list[QualityLevel]:
+        with self._lock:
+            return list(self._ladder)
+
+
+    def get_decisions(self) -> list[dict]:
+        with self._lock:
+            return list(self._decisions)
+
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            level = self._ladder[self._level_index]
+            window = self._last_window or {}
+            return {
+                'level': self._level_index,
+                'levels': len(self._ladder),
+                **level.to_dict(),
+                'load': window.get('load'),
+                'latency_p95': window.get('latency_p95'),
+                'processed_fps': window.get('processed_fps'),
+                'demand_fps': window.get('demand_fps'),
+                'decisions': len(self._decisions),
+            }
+
+
+    def _control(self) -> None:
+        while not self._image_processor.wait_until_ready(MODEL_WAIT_INTERVAL):
+            if self._stop_event.is_set():
+                return
+
+        print(f'Adaptive quality: {len(self._ladder)} levels from {self._ladder[0].label()} '
+              f'to {self._ladder[-1].label()}, starting at level {self._level_index}')
+        # A window is extended until enough frames were processed, so heavy overload is measured as well
+        previous_snapshot = self._take_snapshot()
+        while not self._stop_event.wait(self._control_interval):
+            snapshot = self._take_snapshot()
+            window = self._measure(previous_snapshot, snapshot)
+            if window is not None:
+                self._evaluate(window)
+            if window is not None or snapshot['time'] - previous_snapshot['time'] >= \
+                    MAX_WINDOW_INTERVALS * self._control_interval:
+                previous_snapshot = snapshot
+
+
+    def _take_snapshot(self) -> dict:
+        metrics = self._engine.get_pipeline_metrics()
+        return {
+            'time': time.monotonic(),
+            'stages': {stage: metrics.get_histogram(stage).get_counts() for stage in STAGE_NAMES},
+            'streams': self._engine.get_stats(),
+        }
+
+
+    # Rates, loads and latency of the frames processed between two snapshots, None if too few to tell
+    def _measure(self, previous: dict, current: dict) -> Optional[dict]:
+        duration = current['time'] - previous['time']
+        frames_processed = 0
+        frames_dropped = 0
+        queued_frames = 0
+        queue_growth = 0
+        demand_fps = 0.0
+        for stream_id, stats in current['streams'].items():
+            previous_stats = previous['streams'].get(stream_id)
+            if previous_stats is None or not stats['is_capture_on']:
+                continue
+            frames_processed += stats['frames_processed'] - previous_stats['frames_processed']
+            frames_dropped += stats['frames_dropped'] - previous_stats['frames_dropped']
+            queued_frames += stats['queued_frames']
+            queue_growth += stats['queued_frames'] - previous_stats['queued_frames']
+            offered_frames = (stats['frames_captured'] + stats['frames_skipped']
+                              - previous_stats['frames_captured'] - previous_stats['frames_skipped'])
+            demand_fps += self._get_demand_fps(stats['source_fps'], offered_frames / duration)
+
+        stage_deltas = {}
+        for stage in STAGE_NAMES:
+            previous_counts, previous_sum, _ = previous['stages'][stage]
+            counts, total, maximum = current['stages'][stage]
+            count_deltas = [count - previous_count for count, previous_count in zip(counts, previous_counts)]
+            if min(count_deltas) < 0:
+                return None # Histograms were reset in between
+            stage_deltas[stage] = (count_deltas, total - previous_sum, maximum)
+
+        if frames_processed < MIN_WINDOW_FRAMES or demand_fps == 0.0:
+            return None
+
+        # Seconds of work per processed frame times frames per second demanded. Inference in worker processes
+        # runs in parallel to annotation and sinks on the processing thread, the busier side is the bottleneck
+        inference_time = stage_deltas[PREPROCESS][1] + stage_deltas[INFERENCE][1]
+        output_time = stage_deltas[ANNOTATION][1] + stage_deltas[SINKS][1]
+        inference_load = inference_time / frames_processed * demand_fps
+        output_load = output_time / frames_processed * demand_fps
+
+        count_deltas, _, maximum = stage_deltas[PROCESSED]
+        latency = interpolate_quantile(self._engine.get_pipeline_metrics().get_histogram(PROCESSED).get_buckets(),
+                                       count_deltas, LATENCY_QUANTILE, maximum)
+
+        return {
+            'duration': duration,
+            'processed_fps': frames_processed / duration,
+            'demand_fps': demand_fps,
+            'frames_dropped': frames_dropped,
+            'queued_frames': queued_frames,
+            'queue_growth': queue_growth,
+            'inference_load': inference_load,
+            'output_load': output_load,
+            'load': self._combine_loads(inference_load, output_load),
+            'latency_p95': latency,
+        }
+
+
+    # Frames per second a stream has to be processed at: the target, but no more than the source delivers.
+    # The nominal rate is preferred over the measured one, files are read only as fast as they are processed
+    def _get_demand_fps(self, source_fps: float, offered_fps: float) -> float:
+        source_fps = source_fps if source_fps > 0 else offered_fps
+        if self._target_fps is None:
+            return source_fps
+        return min(self._target_fps, source_fps) if source_fps > 0 else self._target_fps
+
+
+    def _combine_loads(self, inference_load: float, output_load: float) -> float:
+        num_workers = self._engine.get_num_inference_workers()
+        if num_workers == 0:
+            return inference_load + output_load
+        return max(inference_load / num_workers, output_load)
+
+
+    def _evaluate(self, window: dict) -> None:
+        with self._lock:
+            self._last_window = window
+            if self._pending_model is not None:
+                return
+            self._windows += 1
+            if self._settle_windows > 0:
+                self._settle_windows -= 1
+                return
+
+            if self._last_upgrade_window is not None and self._windows - self._last_upgrade_window > FLAP_WINDOWS:
+                self._last_upgrade_window = None
+                self._upgrade_windows = UPGRADE_WINDOWS # The last upgrade held
+
+            reasons = self._get_degrade_reasons(window)
+            if reasons:
+                self._under_windows = 0
+                self._over_windows += 1
+                if self._over_windows < DEGRADE_WINDOWS:
+                    return
+                if self._level_index + 1 < len(self._ladder):
+                    if self._last_upgrade_window is not None:
+                        self._upgrade_windows = min(2 * self._upgrade_windows, MAX_UPGRADE_WINDOWS)
+                        self._last_upgrade_window = None
+                    self._change_level(self._level_index + 1, DEGRADE, ', '.join(reasons), window)
+                elif not self._is_holding:
+                    self._is_holding = True
+                    self._log_decision(HOLD, 'already at the cheapest level, ' + ', '.join(reasons), window,
+                                       self._ladder[self._level_index], self._ladder[self._level_index])
+                return
+
+            self._over_windows = 0
+            self._is_holding = False
+            upgrade_reason = self._get_upgrade_reason(window)
+            if upgrade_reason is None:
+                self._under_windows = 0
+                return
+
+            self._under_windows += 1
+            if self._under_windows >= self._upgrade_windows:
+                self._last_upgrade_window = self._windows
+                self._change_level(self._level_index - 1, UPGRADE, upgrade_reason, window)
+
+
+    def _get_degrade_reasons(self, window: dict) -> list[str]:
+        reasons = []
+        if window['load'] > DEGRADE_LOAD:
+            reasons.append(f'load {window["load"]:.2f} > {DEGRADE_LOAD:.2f}')
+        if self._target_latency is not None and window['latency_p95'] is not None \
+                and window['latency_p95'] > self._target_latency:
+            reasons.append(f'p95 latency {window["latency_p95"] * 1000:.0f} ms '
+                           f'> {self._target_latency * 1000:.0f} ms')
+        if window['queue_growth'] >= QUEUE_GROWTH_FRAMES:
+            reasons.append(f'queues grew by {window["queue_growth"]} to {window["queued_frames"]} frames')
+        if window['frames_dropped'] > 0 and window['processed_fps'] < DROPPED_FPS_SHARE * window['demand_fps']:
+            reasons.append(f'{window["frames_dropped"]} frames dropped at {window["processed_fps"]:.1f} of '
+                           f'{window["demand_fps"]:.1f} FPS')
+        return reasons
+
+
+    # Why the next better level fits, None if it does not or there is none
+    def _get_upgrade_reason(self, window: dict) -> Optional[str]:
+        if self._level_index == 0 or window['queue_growth'] > 0:
+            return None
+        if self._target_latency is not None:
+            latency = window['latency_p95']
+            if latency is None or latency > UPGRADE_LATENCY_SHARE * self._target_latency:
+                return None
+
+        # Inference scales with the level cost, annotation and sinks do not
+        cost_ratio = self._ladder[self._level_index - 1].cost / self._ladder[self._level_index].cost
+        predicted_load = self._combine_loads(window['inference_load'] * cost_ratio, window['output_load'])
+        if predicted_load >= UPGRADE_LOAD:
+            return None
+        return (f'load {window["load"]:.2f}, predicted {predicted_load:.2f} < {UPGRADE_LOAD:.2f} '
+                f'for {self._under_windows + 1} windows')
+
+
+    # Under the lock
+    def _change_level(self, level_index: int, action: str, reason: str, window: dict) -> None:
+        previous_level = self._ladder[self._level_index]
+        level = self._ladder[level_index]
+        self._level_index = level_index
+        self._over_windows = 0
+        self._under_windows = 0
+        self._settle_windows = SETTLE_WINDOWS
+        self._log_decision(action, reason, window, previous_level, level)
+
+        if level.input_size != self._image_processor.get_input_size():
+            self._image_processor.set_input_size(level.input_size)
+        if level.detection_interval != self._engine.get_detection_cadence()[0]:
+            self._engine.set_detection_cadence(level.detection_interval, self._tracking)
+        if level.model_path != self._image_processor.get_model_path():
+            # Detection goes on with the current model until the new one is warmed up
+            self._pending_model = level.model_path
+            self._image_processor.switch_model(level.model_path, self._on_model_switched)
+
+
+    def _on_model_switched(self, model_path: str, error: Optional[str]) -> None:
+        with self._lock:
+            self._pending_model = None
+            self._settle_windows = SETTLE_WINDOWS
+            level = self._ladder[self._level_index]
+            if error is None:
+                self._log_decision(MODEL_SWITCHED, f'{model_path} in use', self._last_window, level, level)
+                return
+
+            # Levels of a model that cannot be loaded are dropped, the level in use is the one of the current model
+            self._model_paths.remove(model_path)
+            self._ladder = build_quality_ladder(self._model_paths, self._input_sizes, self._detection_intervals)
+            self._level_index = self._model_paths.index(self._image_processor.get_model_path())
+            self._log_decision(MODEL_SWITCH_FAILED, error, self._last_window, level, self._ladder[self._level_index])
+
+
+    # Under the lock
+    def _log_decision(self, action: str, reason: str, window: Optional[dict], previous_level: QualityLevel,
+                      level: QualityLevel) -> None:
+        window = window or {}
+        decision = {
+            'timestamp': time.time(),
+            'action': action,
+            'reason': reason,
+            'from': previous_level.to_dict(),
+            'to': level.to_dict(),
+            'load': window.get('load'),
+            'latency_p95': window.get('latency_p95'),
+            'processed_fps': window.get('processed_fps'),
+            'demand_fps': window.get('demand_fps'),
+            'frames_dropped': window.get('frames_dropped'),
+            'queued_frames': window.get('queued_frames'),
+            'queue_growth': window.get('queue_growth'),
+        }
+        self._decisions.append(decision)
+
+        if previous_level is level:
+            print(f'Adaptive quality: {action}, {reason}')
+        else:
+            print(f'Adaptive quality: {action} from {previous_level.label()} to {level.label()} ({reason})')
+
+        if self._log_path is not None:
+            try:
+                with open(self._log_path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(decision) + '\n')
+            except OSError as e:
+                print(f'Could not write adaptive quality log {self._log_path}: {e}')
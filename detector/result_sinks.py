@@ -0,0 +1,122 @@
+import json
+import os
+import cv2 as cv
+from cv2.typing import MatLike
+from typing import Callable, Optional
+
+from detector.frame import Frame, BGR
+from detector.detections import Detections
+
+STREAM_ID_PLACEHOLDER = '{stream_id}'
+DEFAULT_VIDEO_FPS = 30.0
+DEFAULT_VIDEO_CODEC = 'mp4v'
+
+
+class ResultSink:
+    # Engine only annotates / fits frames into the screen if at least one consumer asks for it
+    needs_annotated_frame = False
+    needs_display_frame = False
+
+    # Frame buffer is recycled after consume returns, copy or retain (and later release) it to keep the pixels.
+    # Detections are in source frame coordinates, the frame itself is display-sized if needs_display_frame is set
+    def consume(self, frame: Frame, detections: Detections) -> None:
+        raise NotImplementedError
+
+
+    def close(self) -> None:
+        pass
+
+
+class CallbackSink(ResultSink):
+    # Frame is annotated whenever any registered sink requests annotation
+    def __init__(self, callback: Callable[[Frame, Detections], None],
+                 needs_annotated_frame: bool = False, needs_display_frame: bool = False) -> None:
+        self._callback = callback
+        self.needs_annotated_frame = needs_annotated_frame
+        self.needs_display_frame = needs_display_frame
+
+
+    def consume(self, frame: Frame, detections: Detections) -> None:
+        self._callback(frame, detections)
+
+
+class JsonlDetectionSink(ResultSink):
+    def __init__(self, path: str, class_names: list[str], write_empty: bool = False) -> None:
+        self._file = open(path, 'a', encoding='utf-8')
+        self._class_names = class_names
+        self._write_empty = write_empty
+
+
+    def consume(self, frame: Frame, detections: Detections) -> None:
+        if len(detections) == 0 and not self._write_empty:
+            return
+
+        # One conversion per column instead of one per box
+        xyxy = detections.xyxy.tolist()
+        confidences = detections.confidence.tolist()
+        class_ids = detections.class_id.tolist()
+        track_ids = detections.track_id.tolist() if detections.is_tracked else [None] * len(xyxy)
+
+        record = {
+            'timestamp': detections.timestamp,
+            'stream_id': detections.stream_id,
+            'sequence': detections.sequence,
+            'detections': [
+                {
+                    'class_id': class_id,
+                    'class_name': self._class_names[class_id],
+                    'confidence': round(confidence, 4),
+                    'xyxy': [round(coordinate, 1) for coordinate in box],
+                    'track_id': track_id,
+                }
+                for box, confidence, class_id, track_id in zip(xyxy, confidences, class_ids, track_ids)
+            ]
+        }
+        self._file.write(json.dumps(record) + '\n')
+
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class VideoFileSink(ResultSink):
+    needs_annotated_frame = True
+
+    def __init__(self, path: str, fps: float = DEFAULT_VIDEO_FPS, codec: str = DEFAULT_VIDEO_CODEC) -> None:
+        # Every stream gets its own file
+        if STREAM_ID_PLACEHOLDER not in path:
+            root, extension = os.path.splitext(path)
+            path = f'{root}_{STREAM_ID_PLACEHOLDER}{extension}'
+
+        self._path = path
+        self._fps = fps
+        self._fourcc = cv.VideoWriter_fourcc(*codec)
+        self._writers: dict[int, cv.VideoWriter] = {}
+        self._bgr_frames: dict[int, MatLike] = {} # Conversion targets reused across frames
+
+
+    def consume(self, frame: Frame, detections: Detections) -> None:
+        stream_id = frame.stream_id
+        writer = self._get_writer(stream_id, frame.data)
+        bgr_frame = frame.as_colorspace(BGR, dst=self._bgr_frames.get(stream_id))
+        if bgr_frame is not frame.data:
+            self._bgr_frames[stream_id] = bgr_frame
+        writer.write(bgr_frame)
+
+
+    def _get_writer(self, stream_id: int, frame: MatLike) -> cv.VideoWriter:
+        writer: Optional[cv.VideoWriter] = self._writers.get(stream_id)
+        if writer is None:
+            height, width = frame.shape[:2]
+            path = self._path.format(stream_id=stream_id)
+            writer = cv.VideoWriter(path, self._fourcc, self._fps, (width, height))
+            self._writers[stream_id] = writer
+
+        return writer
+
+
+    def close(self) -> None:
+        for writer in self._writers.values():
+            writer.release()
+        self._writers.clear()
+        self._bgr_frames.clear()
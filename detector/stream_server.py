@@ -0,0 +1,335 @@
+import base64
+import hashlib
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2 as cv
+from typing import Optional, Tuple
+
+from detector.result_sinks import ResultSink
+from detector.detections import Detections
+from detector.frame import Frame, BGR
+
+DEFAULT_STREAM_PORT = 8080
+DEFAULT_STREAM_JPEG_QUALITY = 80
+DEFAULT_ENCODER_THREADS = 2
+CLIENT_TIMEOUT = 10.0 # seconds a blocked send may take before the client is dropped
+FRAME_WAIT_TIMEOUT = 1.0 # seconds between checks for shutdown while a client waits for a frame
+MJPEG_BOUNDARY = 'frame'
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11' # RFC 6455
+WEBSOCKET_BINARY_FRAME = 0x82 # FIN and binary opcode
+
+MJPEG_PATH = re.compile(r'^/stream/(\d+)\.mjpg$')
+WEBSOCKET_PATH = re.compile(r'^/ws/(\d+)$')
+SNAPSHOT_PATH = re.compile(r'^/snapshot/(\d+)\.jpg$')
+
+
+class StreamChannel:
+    # Latest JPEG of one stream. Clients wait for a newer one than they sent last instead of queueing, so a slow
+    # client skips frames and never holds back the encoder or the other clients
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._jpeg: Optional[bytes] = None
+        self._sequence = 0 # Incremented per published frame
+        self._viewers = 0
+        self._is_closed = False
+
+        # Encoder side: one frame in the pool at a time, the newest one waits behind it
+        self._is_encoding = False
+        self._pending_frame: Optional[Frame] = None
+
+        self.frames_encoded = 0
+        self.frames_replaced = 0 # Never encoded, a newer frame arrived while the encoder was busy
+        self.frames_skipped = 0 # Encoded frames a client never received because it was still sending
+
+
+    def get_viewers(self) -> int:
+        return self._viewers
+
+
+    def add_viewer(self) -> None:
+        with self._condition:
+            self._viewers += 1
+
+
+    def remove_viewer(self) -> None:
+        with self._condition:
+            self._viewers -= 1
+
+
+    # True when the frame is to be encoded now, otherwise it waits, in place of an older one, for the encoder
+    def queue_frame(self, frame: Frame) -> bool:
+        with self._condition:
+            if not self._is_encoding:
+                self._is_encoding = True
+                return True
+            previous_frame, self._pending_frame = self._pending_frame, frame
+
+        if previous_frame is not None:
+            previous_frame.release()
+            self.frames_replaced += 1
+        return False
+
+
+    # Next frame for the encoder, None ends its turn
+    def take_pending_frame(self) -> Optional[Frame]:
+        with self._condition:
+            frame, self._pending_frame = self._pending_frame, None
+            if frame is None:
+                self._is_encoding = False
+            return frame
+
+
+    def publish(self, jpeg: bytes) -> None:
+        with self._condition:
+            self._jpeg = jpeg
+            self._sequence += 1
+            self.frames_encoded += 1
+            self._condition.notify_all()
+
+
+    # (jpeg, sequence) newer than last_sequence, (None, last_sequence) on timeout or once the channel is closed
+    def wait_for_frame(self, last_sequence: int, timeout: float) -> Tuple[Optional[bytes], int]:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._sequence > last_sequence or self._is_closed, timeout):
+                return None, last_sequence
+            if self._is_closed:
+                return None, last_sequence
+
+            if last_sequence > 0:
+                self.frames_skipped += self._sequence - last_sequence - 1
+            return self._jpeg, self._sequence
+
+
+    def get_latest(self) -> Optional[bytes]:
+        with self._condition:
+            return self._jpeg
+
+
+    def is_closed(self) -> bool:
+        return self._is_closed
+
+
+    def close(self) -> None:
+        with self._condition:
+            self._is_closed = True
+            self._condition.notify_all()
+            pending_frame, self._pending_frame = self._pending_frame, None
+
+        if pending_frame is not None:
+            pending_frame.release()
+
+
+def websocket_accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+
+def websocket_frame_header(payload_length: int) -> bytes:
+    # Server frames are not masked
+    if payload_length < 126:
+        return struct.pack('!BB', WEBSOCKET_BINARY_FRAME, payload_length)
+    if payload_length < 1 << 16:
+        return struct.pack('!BBH', WEBSOCKET_BINARY_FRAME, 126, payload_length)
+    return struct.pack('!BBQ', WEBSOCKET_BINARY_FRAME, 127, payload_length)
+
+
+class StreamingServer(ResultSink):
+    # Serves the annotated frames of every stream over HTTP: /stream/<id>.mjpg as MJPEG, /ws/<id> as WebSocket
+    # (one binary JPEG message per frame), /snapshot/<id>.jpg and an index page on /.
+    # A frame is encoded once in the encoder pool whatever the number of viewers, and only for streams somebody
+    # watches. Without viewers the engine does not even annotate for this sink
+    def __init__(self, port: int = DEFAULT_STREAM_PORT, host: str = '0.0.0.0',
+                 jpeg_quality: int = DEFAULT_STREAM_JPEG_QUALITY,
+                 encoder_threads: int = DEFAULT_ENCODER_THREADS) -> None:
+        self._encode_parameters = [cv.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self._channels: dict[int, StreamChannel] = {}
+        self._channels_lock = threading.Lock()
+        self._is_closed = False
+
+        self._encoder = ThreadPoolExecutor(max_workers=encoder_threads)
+
+        self._server = ThreadingHTTPServer((host, port), self._create_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+
+    @property
+    def needs_annotated_frame(self) -> bool:
+        return self._count_viewers() > 0
+
+
+    def get_port(self) -> int:
+        return self._server.server_address[1]
+
+
+    def consume(self, frame: Frame, detections: Detections) -> None:
+        channel = self._get_channel(frame.stream_id)
+        if channel.get_viewers() == 0 or self._is_closed:
+            return
+
+        frame.retain() # Released by the encoder, the pixels are not copied here
+        if channel.queue_frame(frame):
+            self._encoder.submit(self._encode, channel, frame)
+
+
+    def close(self) -> None:
+        self._is_closed = True
+        with self._channels_lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            channel.close()
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._encoder.shutdown(wait=True)
+
+
+    def get_stats(self) -> dict[int, dict]:
+        with self._channels_lock:
+            channels = dict(self._channels)
+        return {
+            stream_id: {
+                'viewers': channel.get_viewers(),
+                'frames_encoded': channel.frames_encoded,
+                'frames_replaced': channel.frames_replaced,
+                'frames_skipped': channel.frames_skipped,
+            }
+            for stream_id, channel in channels.items()
+        }
+
+
+    def _get_channel(self, stream_id: int) -> StreamChannel:
+        with self._channels_lock:
+            channel = self._channels.get(stream_id)
+            if channel is None:
+                channel = self._channels[stream_id] = StreamChannel()
+                if self._is_closed:
+                    channel.close()
+            return channel
+
+
+    def _count_viewers(self) -> int:
+        with self._channels_lock:
+            return sum(channel.get_viewers() for channel in self._channels.values())
+
+
+    # Encoder pool, encodes the frame and then whatever frame arrived meanwhile
+    def _encode(self, channel: StreamChannel, frame: Frame) -> None:
+        while frame is not None:
+            try:
+                is_encoded, jpeg = cv.imencode('.jpg', frame.as_colorspace(BGR), self._encode_parameters)
+            finally:
+                frame.release()
+            if is_encoded:
+                channel.publish(jpeg.tobytes())
+            frame = channel.take_pending_frame()
+
+
+    def _create_handler(self) -> type:
+        server = self
+
+        class StreamHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # WebSocket upgrades need it
+
+            def do_GET(self) -> None:
+                path = self.path.split('?')[0]
+                if path == '/':
+                    self._send_index()
+                elif match := MJPEG_PATH.match(path):
+                    self._watch(server._get_channel(int(match.group(1))), self._send_mjpeg)
+                elif match := WEBSOCKET_PATH.match(path):
+                    self._watch(server._get_channel(int(match.group(1))), self._send_websocket)
+                elif match := SNAPSHOT_PATH.match(path):
+                    self._send_snapshot(server._get_channel(int(match.group(1))))
+                else:
+                    self.send_error(404)
+
+
+            def _watch(self, channel: StreamChannel, send) -> None:
+                self.close_connection = True
+                self.connection.settimeout(CLIENT_TIMEOUT)
+                channel.add_viewer()
+                try:
+                    send(channel)
+                except OSError:
+                    pass # Client went away or stopped reading
+                finally:
+                    channel.remove_viewer()
+
+
+            def _frames(self, channel: StreamChannel):
+                sequence = 0
+                while not channel.is_closed():
+                    jpeg, sequence = channel.wait_for_frame(sequence, FRAME_WAIT_TIMEOUT)
+                    if jpeg is not None:
+                        yield jpeg
+
+
+            def _send_mjpeg(self, channel: StreamChannel) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}')
+                self.send_header('Cache-Control', 'no-cache, private')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+
+                for jpeg in self._frames(channel):
+                    self.wfile.write(f'--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                     f'Content-Length: {len(jpeg)}\r\n\r\n'.encode('ascii'))
+                    self.wfile.write(jpeg)
+                    self.wfile.write(b'\r\n')
+                    self.wfile.flush()
+
+
+            def _send_websocket(self, channel: StreamChannel) -> None:
+                key = self.headers.get('Sec-WebSocket-Key')
+                if key is None or self.headers.get('Upgrade', '').lower() != 'websocket':
+                    self.send_error(400, 'Expected a WebSocket upgrade')
+                    return
+
+                self.send_response(101, 'Switching Protocols')
+                self.send_header('Upgrade', 'websocket')
+                self.send_header('Connection', 'Upgrade')
+                self.send_header('Sec-WebSocket-Accept', websocket_accept_key(key))
+                self.end_headers()
+
+                # Send only, messages from the client are not read
+                for jpeg in self._frames(channel):
+                    self.wfile.write(websocket_frame_header(len(jpeg)))
+                    self.wfile.write(jpeg)
+                    self.wfile.flush()
+
+
+            def _send_snapshot(self, channel: StreamChannel) -> None:
+                jpeg = channel.get_latest()
+                if jpeg is None:
+                    self.send_error(404, 'No frame encoded yet, snapshots are taken while the stream is watched')
+                    return
+                self._send_body(jpeg, 'image/jpeg')
+
+
+            def _send_index(self) -> None:
+                with server._channels_lock:
+                    stream_ids = sorted(server._channels)
+                streams = ''.join(f'<h2>Stream {stream_id}</h2><img src="/stream/{stream_id}.mjpg">'
+                                  for stream_id in stream_ids)
+                self._send_body(f'<!DOCTYPE html><html><head><title>Object detection</title></head>'
+                                f'<body>{streams or "No streams yet"}</body></html>'.encode('utf-8'),
+                                'text/html; charset=utf-8')
+
+
+            def _send_body(self, body: bytes, content_type: str) -> None:
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+                self.wfile.write(body)
+
+
+            def log_message(self, format: str, *args) -> None:
+                pass # A request per viewer, the console stays for the pipeline
+
+        return StreamHandler
@@ -0,0 +1,164 @@
+import time
+from urllib.parse import urlsplit, parse_qs
+import cv2 as cv
+import numpy as np
+from typing import Tuple, Optional
+
+SYNTHETIC_SCHEME = 'synthetic'
+DEFAULT_SYNTHETIC_WIDTH = 1280
+DEFAULT_SYNTHETIC_HEIGHT = 720
+DEFAULT_SYNTHETIC_FPS = 30.0 # 0 delivers frames as fast as they are read, like a video file
+ENCODED_FRAME_COUNT = 60 # Distinct JPEG frames cycled through when decoding is simulated
+MOVING_OBJECTS = 4
+OBJECT_SIZE = 0.15 # of the frame height
+
+# Encoded frames shared by every capture with the same size and seed
+_encoded_frames_cache: dict[tuple, list[np.ndarray]] = {}
+
+
+def is_synthetic_source(source: int|str) -> bool:
+    return isinstance(source, str) and source.startswith(f'{SYNTHETIC_SCHEME}://')
+
+
+# Constructor arguments of SyntheticCapture from synthetic://WIDTHxHEIGHT?fps=30&frames=300&seed=0&decode=1
+def parse_synthetic_url(url: str) -> dict:
+    parts = urlsplit(url)
+    width, height = DEFAULT_SYNTHETIC_WIDTH, DEFAULT_SYNTHETIC_HEIGHT
+    if parts.netloc:
+        width, height = (int(value) for value in parts.netloc.lower().split('x'))
+
+    query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+    return {
+        'width': width,
+        'height': height,
+        'fps': float(query.get('fps', DEFAULT_SYNTHETIC_FPS)),
+        'num_frames': int(query['frames']) if 'frames' in query else None,
+        'seed': int(query.get('seed', 0)),
+        'decode': query.get('decode', '0') not in ('0', 'false'),
+    }
+
+
+class SyntheticCapture:
+    # Deterministic test pattern with moving rectangles, read like cv.VideoCapture, for benchmarks without a camera.
+    # With decode every frame is decoded from JPEG, so capture costs about what a real source costs
+    def __init__(self, width: int = DEFAULT_SYNTHETIC_WIDTH, height: int = DEFAULT_SYNTHETIC_HEIGHT,
+                 fps: float = DEFAULT_SYNTHETIC_FPS, num_frames: Optional[int] = None, seed: int = 0,
+                 decode: bool = False) -> None:
+        self._width = width
+        self._height = height
+        self._fps = fps
+        self._num_frames = num_frames
+        self._seed = seed
+        self._decode = decode
+
+        random_generator = np.random.default_rng(seed)
+        self._background = random_generator.integers(0, 64, (height, width, 3), dtype=np.uint8)
+        self._background[:] += np.linspace(0, 128, width, dtype=np.uint8)[None, :, None]
+        self._object_speeds = random_generator.uniform(-0.02, 0.02, (MOVING_OBJECTS, 2))
+        self._object_offsets = random_generator.uniform(0.0, 1.0, (MOVING_OBJECTS, 2))
+        self._object_colors = random_generator.integers(0, 256, (MOVING_OBJECTS, 3)).tolist()
+
+        self._encoded_frames = self._encode_frames() if decode else None
+        self._frame_index = 0
+        self._start_time = None
+        self._is_opened = True
+
+
+    @classmethod
+    def from_url(cls, url: str) -> 'SyntheticCapture':
+        return cls(**parse_synthetic_url(url))
+
+
+    def get_fps(self) -> float:
+        return self._fps
+
+
+    # Same contract as cv.VideoCapture.get for the properties a synthetic source has, 0 for the others
+    def get(self, property_id: int) -> float:
+        if property_id == cv.CAP_PROP_FPS:
+            return self._fps
+        if property_id == cv.CAP_PROP_FRAME_WIDTH:
+            return float(self._width)
+        if property_id == cv.CAP_PROP_FRAME_HEIGHT:
+            return float(self._height)
+        return 0.0
+
+
+    def isOpened(self) -> bool:
+        return self._is_opened
+
+
+    def release(self) -> None:
+        self._is_opened = False
+
+
+    # Same contract as cv.VideoCapture.grab: waits for the next frame without producing its pixels
+    def grab(self) -> bool:
+        if not self._is_opened or (self._num_frames is not None and self._frame_index >= self._num_frames):
+            return False
+
+        self._wait_for_frame()
+        self._frame_index += 1
+        return True
+
+
+    # Same contract as cv.VideoCapture.retrieve: decodes the grabbed frame into image when it has the frame shape
+    def retrieve(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        if self._frame_index == 0:
+            return False, None
+
+        if image is None or image.shape != self._background.shape:
+            image = np.empty_like(self._background)
+
+        frame_index = self._frame_index - 1
+        if self._decode:
+            encoded_frame = self._encoded_frames[frame_index % len(self._encoded_frames)]
+            np.copyto(image, cv.imdecode(encoded_frame, cv.IMREAD_COLOR))
+        else:
+            self._render(frame_index, image)
+
+        return True, image
+
+
+    def read(self, image: Optional[np.ndarray] = None) -> Tuple[bool, Optional[np.ndarray]]:
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+
+    # Paces like a live camera, frame n is not available before start + n / fps
+    def _wait_for_frame(self) -> None:
+        if self._fps <= 0:
+            return
+
+        now = time.monotonic()
+        if self._start_time is None:
+            self._start_time = now
+
+        delay = self._start_time + self._frame_index / self._fps - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+    def _render(self, frame_index: int, image: np.ndarray) -> None:
+        np.copyto(image, self._background)
+
+        size = int(self._height * OBJECT_SIZE)
+        positions = np.abs((self._object_offsets + frame_index * self._object_speeds) % 2.0 - 1.0) # Bounce
+        for (x, y), color in zip(positions, self._object_colors):
+            x1 = int(x * (self._width - size))
+            y1 = int(y * (self._height - size))
+            cv.rectangle(image, (x1, y1), (x1 + size, y1 + size), color, cv.FILLED)
+
+
+    def _encode_frames(self) -> list[np.ndarray]:
+        key = (self._width, self._height, self._seed)
+        if key not in _encoded_frames_cache:
+            image = np.empty_like(self._background)
+            encoded_frames = []
+            for frame_index in range(ENCODED_FRAME_COUNT):
+                self._render(frame_index, image)
+                encoded_frames.append(cv.imencode('.jpg', image)[1])
+            _encoded_frames_cache[key] = encoded_frames
+
+        return _encoded_frames_cache[key]
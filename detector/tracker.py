@@ -0,0 +1,190 @@
+import numpy as np
+
+DEFAULT_IOU_THRESHOLD = 0.3
+DEFAULT_MAX_AGE = 30 # frames a track survives without a matching detection
+DEFAULT_CONFIDENCE_DECAY = 0.95 # per frame without a detection
+
+# Noise relative to box size, so small and large objects are tracked alike
+POSITION_STD = 1 / 20
+VELOCITY_STD = 1 / 160
+
+STATE_SIZE = 8 # cx, cy, w, h and their velocities
+MEASUREMENT_SIZE = 4
+
+_TRANSITION = np.eye(STATE_SIZE)
+_TRANSITION[:MEASUREMENT_SIZE, MEASUREMENT_SIZE:] = np.eye(MEASUREMENT_SIZE)
+
+
+def xyxy_to_cxcywh(boxes: np.ndarray) -> np.ndarray:
+    return np.concatenate(((boxes[:, :2] + boxes[:, 2:4]) / 2, boxes[:, 2:4] - boxes[:, :2]), axis=1)
+
+
+def cxcywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+    return np.concatenate((boxes[:, :2] - boxes[:, 2:4] / 2, boxes[:, :2] + boxes[:, 2:4] / 2), axis=1)
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:4], boxes_b[None, :, 2:4])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(boxes_a[:, 2:4] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:4] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+
+class ObjectTracker:
+    # Constant velocity Kalman filter per track, all tracks are predicted and corrected in one batched operation.
+    # Detections are (N, 6) arrays of x1, y1, x2, y2, confidence, class. Tracks are returned in the ultralytics
+    # tracked layout (N, 7): x1, y1, x2, y2, track id, confidence, class
+    def __init__(self, iou_threshold: float = DEFAULT_IOU_THRESHOLD, max_age: int = DEFAULT_MAX_AGE,
+                 confidence_decay: float = DEFAULT_CONFIDENCE_DECAY) -> None:
+        self._iou_threshold = iou_threshold
+        self._max_age = max_age
+        self._confidence_decay = confidence_decay
+
+        self._states = np.zeros((0, STATE_SIZE))
+        self._covariances = np.zeros((0, STATE_SIZE, STATE_SIZE))
+        self._track_ids = np.zeros(0, dtype=np.int64)
+        self._confidences = np.zeros(0)
+        self._classes = np.zeros(0)
+        self._frames_since_update = np.zeros(0, dtype=np.int64)
+
+        self._next_track_id = 1
+
+
+    def __len__(self) -> int:
+        return len(self._track_ids)
+
+
+    # Lowest certainty among live tracks, 1.0 right after a detection and decaying with every tracked-only frame
+    def min_track_confidence(self) -> float:
+        if len(self) == 0:
+            return 1.0
+        return float(self._confidence_decay ** self._frames_since_update.max())
+
+
+    def predict(self) -> np.ndarray:
+        self._advance()
+        return self._tracks()
+
+
+    def update(self, detections: np.ndarray) -> np.ndarray:
+        self._advance()
+
+        matched_tracks, matched_detections = self._associate(detections)
+        if len(matched_tracks) > 0:
+            self._correct(matched_tracks, detections[matched_detections])
+
+        unmatched = np.ones(len(detections), dtype=bool)
+        unmatched[matched_detections] = False
+        self._start_tracks(detections[unmatched])
+
+        return self._tracks()
+
+
+    def _advance(self) -> None:
+        if len(self) == 0:
+            return
+
+        sizes = np.concatenate((self._states[:, 2:4], self._states[:, 2:4]), axis=1)
+        noise = np.concatenate((POSITION_STD * sizes, VELOCITY_STD * sizes), axis=1) ** 2
+
+        self._states = self._states @ _TRANSITION.T
+        self._covariances = _TRANSITION @ self._covariances @ _TRANSITION.T
+        self._covariances[:, np.arange(STATE_SIZE), np.arange(STATE_SIZE)] += noise
+        self._frames_since_update += 1
+
+        # Tracks without detections for too long, or collapsed by the velocity model, are dropped
+        alive = (self._frames_since_update <= self._max_age) & np.all(self._states[:, 2:4] > 1, axis=1)
+        if not alive.all():
+            self._keep(alive)
+
+
+    def _associate(self, detections: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if len(self) == 0 or len(detections) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        ious = iou_matrix(cxcywh_to_xyxy(self._states[:, :4]), detections[:, :4])
+        ious[self._classes[:, None] != detections[None, :, 5]] = 0
+
+        # Greedy matching from the best overlap down, one detection per track
+        track_indices, detection_indices = np.nonzero(ious >= self._iou_threshold)
+        order = np.argsort(-ious[track_indices, detection_indices])
+
+        matched_tracks, matched_detections = [], []
+        used_tracks, used_detections = set(), set()
+        for track, detection in zip(track_indices[order].tolist(), detection_indices[order].tolist()):
+            if track in used_tracks or detection in used_detections:
+                continue
+            used_tracks.add(track)
+            used_detections.add(detection)
+            matched_tracks.append(track)
+            matched_detections.append(detection)
+
+        return np.array(matched_tracks, dtype=np.int64), np.array(matched_detections, dtype=np.int64)
+
+
+    def _correct(self, tracks: np.ndarray, detections: np.ndarray) -> None:
+        measurements = xyxy_to_cxcywh(detections[:, :4])
+        states = self._states[tracks]
+        covariances = self._covariances[tracks]
+
+        sizes = np.concatenate((states[:, 2:4], states[:, 2:4]), axis=1)
+        measurement_noise = (POSITION_STD * sizes) ** 2
+
+        innovation_covariances = covariances[:, :MEASUREMENT_SIZE, :MEASUREMENT_SIZE].copy()
+        innovation_covariances[:, np.arange(MEASUREMENT_SIZE), np.arange(MEASUREMENT_SIZE)] += measurement_noise
+        gains = covariances[:, :, :MEASUREMENT_SIZE] @ np.linalg.inv(innovation_covariances)
+
+        innovations = measurements - states[:, :MEASUREMENT_SIZE]
+        self._states[tracks] = states + (gains @ innovations[:, :, None])[:, :, 0]
+        self._covariances[tracks] = covariances - gains @ covariances[:, :MEASUREMENT_SIZE, :]
+
+        self._confidences[tracks] = detections[:, 4]
+        self._classes[tracks] = detections[:, 5]
+        self._frames_since_update[tracks] = 0
+
+
+    def _start_tracks(self, detections: np.ndarray) -> None:
+        count = len(detections)
+        if count == 0:
+            return
+
+        states = np.zeros((count, STATE_SIZE))
+        states[:, :MEASUREMENT_SIZE] = xyxy_to_cxcywh(detections[:, :4])
+
+        sizes = np.concatenate((states[:, 2:4], states[:, 2:4]), axis=1)
+        variances = np.concatenate((2 * POSITION_STD * sizes, 10 * VELOCITY_STD * sizes), axis=1) ** 2
+        covariances = np.zeros((count, STATE_SIZE, STATE_SIZE))
+        covariances[:, np.arange(STATE_SIZE), np.arange(STATE_SIZE)] = variances
+
+        track_ids = np.arange(self._next_track_id, self._next_track_id + count)
+        self._next_track_id += count
+
+        self._states = np.concatenate((self._states, states))
+        self._covariances = np.concatenate((self._covariances, covariances))
+        self._track_ids = np.concatenate((self._track_ids, track_ids))
+        self._confidences = np.concatenate((self._confidences, detections[:, 4]))
+        self._classes = np.concatenate((self._classes, detections[:, 5]))
+        self._frames_since_update = np.concatenate((self._frames_since_update, np.zeros(count, dtype=np.int64)))
+
+
+    def _keep(self, mask: np.ndarray) -> None:
+        self._states = self._states[mask]
+        self._covariances = self._covariances[mask]
+        self._track_ids = self._track_ids[mask]
+        self._confidences = self._confidences[mask]
+        self._classes = self._classes[mask]
+        self._frames_since_update = self._frames_since_update[mask]
+
+
+    def _tracks(self) -> np.ndarray:
+        return np.column_stack((
+            cxcywh_to_xyxy(self._states[:, :4]),
+            self._track_ids,
+            self._confidences,
+            self._classes
+        )).astype(np.float32)
@@ -1,191 +1,540 @@
 import threading
-from cv2.typing import MatLike
+import time
+from collections import deque
+import numpy as np
 from typing import Tuple, Optional
 
 from detector.image_processor import ImageProcessor
-from detector.video_capture import VideoCapture
-from detector.app import App
+from detector.video_stream import VideoStream, FramePlan, DEFAULT_FIFO_SIZE, DETECT, TRACK
+from detector.tracker import ObjectTracker
+from detector.motion_gate import MotionGate, DEFAULT_REFRESH_INTERVAL
+from detector.inference_regions import InferenceRegions
+from detector.inference_workers import InferenceWorkerPool
+from detector.result_sinks import ResultSink
+from detector.frame_pool import FramePool
+from detector.frame import Frame
+from detector.detections import Detections
+from detector.alerts import AlertEngine
+from detector.metrics import PipelineMetrics, render_prometheus, QUEUE, PREPROCESS, INFERENCE, ANNOTATION, SINKS
+
+DEFAULT_STREAM_ID = 0
+DEFAULT_MAX_BATCH_SIZE = 16
+DEFAULT_MAX_BATCH_WAIT = 0.005 # seconds
+SHUTDOWN_TIMEOUT = 5.0 # seconds
+MODEL_WAIT_INTERVAL = 0.1 # seconds between checks for shutdown while the model is loading
 
 
 class VideoProcessingEngine:
-    def __init__(self, video_capture: VideoCapture, image_processor: ImageProcessor, audio_alarm: App) -> None:
-        self._video_capture = video_capture
+    def __init__(self, image_processor: ImageProcessor, alert_engine: Optional[AlertEngine] = None,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_batch_wait: float = DEFAULT_MAX_BATCH_WAIT,
+                 display: bool = True, motion_gating: bool = False,
+                 motion_refresh_interval: float = DEFAULT_REFRESH_INTERVAL, detection_interval: int = 1,
+                 tracking: bool = False, inference_regions: Optional[InferenceRegions] = None,
+                 inference_workers: int = 0, worker_threads: Optional[int] = None) -> None:
         self._image_processor = image_processor
-        self._audio_alarm = audio_alarm
+        self._alert_engine = alert_engine # Evaluated on every processed frame, closed on shutdown
 
-        self._max_frame_width = 1920 # Default assumed width
-        self._max_frame_height = 1080 # Default assumed height
+        # Default for new streams: skip the detector while the scene does not change
+        self._motion_gating = motion_gating
+        self._motion_refresh_interval = motion_refresh_interval
 
-        self._frame_buffer = None
-        self._processed_frame_buffer = None
-        self._is_capture_on = False
+        # Default for new streams: full detection every detection_interval frames, tracker in between.
+        # Tracking is implied by an interval above 1 and gives boxes stable ids
+        self._detection_interval = detection_interval
+        self._tracking = tracking
 
-        self._frame_set_lock = threading.Lock()
-        self._video_capture_lock = threading.Lock()
-        self._buffer_lock = threading.Lock()
-        self._buffer_not_empty = threading.Condition(self._buffer_lock)
-        self._capture_event = threading.Event()
-        self._process_event = threading.Event()
+        # Default for new streams: regions of interest and tiles inferred instead of the whole frame
+        self._inference_regions = inference_regions
 
-        self._continue_thread_loop = True
+        # Display keeps the latest annotated, screen-fitted frame of every stream for get_processed_frame.
+        # Inference always sees the full source frame, letterboxed once to the configured input size
+        self._display = display
+        self._sinks: list[ResultSink] = []
 
-        self._processing_thread = threading.Thread(target=self._process_frames, daemon=True)
-        self._capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
+        self._max_frame_width = 1920 # Default assumed width
+        self._max_frame_height = 1080 # Default assumed height
 
-        self._capture_event.clear()
-        self._process_event.clear()
-    
+        self._max_batch_size = max_batch_size
+        self._max_batch_wait = max_batch_wait
 
-    def _is_buffer_empty(self) -> bool:
-        return self._frame_buffer is None 
-    
-    
-    def _set_buffer(self, frame: MatLike) -> None:
-        self._frame_buffer = frame
+        # Detection in worker processes instead of the processing thread, so inference does not share the GIL
+        # with capture, annotation and Tk. Batches are then pipelined, up to two per worker in flight
+        self._inference_pool = None
+        if inference_workers > 0:
+            self._inference_pool = InferenceWorkerPool(image_processor, inference_workers, worker_threads)
+        self._max_pending_batches = 2 * inference_workers
+        self._pending_batches: deque = deque() # (batch, plans, detected frames, future), in submission order
+        self._pending_ready = threading.Condition()
 
-    
-    def _fetch_buffer(self) -> MatLike|None:
-        frame = self._frame_buffer
-        self._frame_buffer = None
-        return frame
-    
+        # Frames travel capture -> inference -> display in recycled buffers, so memory stays flat.
+        # For worker processes the buffers are shared memory, capture decodes straight into what workers read
+        self._frame_pool = FramePool(shared_memory=self._inference_pool is not None)
 
-    def _set_processed_frame_buffer(self, frame: MatLike) -> None:
-        self._processed_frame_buffer = frame
+        # Latency histograms of every stage, cheap enough to stay on
+        self._metrics = PipelineMetrics()
 
+        self._streams: dict[int, VideoStream] = {}
+        self._next_stream_id = DEFAULT_STREAM_ID
+        self._batch_offset = 0 # Round-robin start, so no stream starves when streams > batch size
 
-    def _fetch_processed_frame_buffer(self) -> MatLike:
-        frame = self._processed_frame_buffer
-        self._processed_frame_buffer = None
+        # Guards _streams and every stream's frame buffer
+        self._frame_ready = threading.Condition()
 
-        return frame
+        self._continue_thread_loop = True
+
+        self._processing_thread = threading.Thread(target=self._process_frames, daemon=True)
+        self._completion_thread = threading.Thread(target=self._complete_batches, daemon=True)
 
 
     def run(self) -> None:
         self._processing_thread.start()
-        self._capture_thread.start()
+        if self._inference_pool is not None:
+            self._completion_thread.start()
 
 
     def set_max_frame_dimension(self, max_width: int, max_height: int) -> None:
         self._max_frame_width = max_width
         self._max_frame_height = max_height
 
-    
+
+    def add_result_sink(self, sink: ResultSink) -> None:
+        with self._frame_ready:
+            self._sinks.append(sink)
+
+
+    def _needs_display_frame(self) -> bool:
+        return self._display or any(sink.needs_display_frame for sink in self._sinks)
+
+
+    def _needs_annotated_frame(self) -> bool:
+        return self._display or any(sink.needs_annotated_frame for sink in self._sinks)
+
+
+    def has_active_streams(self) -> bool:
+        with self._frame_ready:
+            return any(stream.is_capture_on() or stream.has_frame() for stream in self._streams.values())
+
+
+    # Applies to streams added afterwards
+    def set_motion_gating(self, motion_gating: bool, refresh_interval: float = DEFAULT_REFRESH_INTERVAL) -> None:
+        self._motion_gating = motion_gating
+        self._motion_refresh_interval = refresh_interval
+
+
+    # Applies to running streams from their next frame on and to streams added afterwards
+    def set_detection_cadence(self, detection_interval: int, tracking: bool = False) -> None:
+        self._detection_interval = max(1, detection_interval)
+        self._tracking = tracking
+        with self._frame_ready:
+            streams = list(self._streams.values())
+        for stream in streams:
+            stream.set_detection_cadence(self._detection_interval, tracking)
+
+
+    def get_detection_cadence(self) -> Tuple[int, bool]:
+        return self._detection_interval, self._tracking
+
+
+    def set_inference_regions(self, inference_regions: Optional[InferenceRegions]) -> None:
+        self._inference_regions = inference_regions
+
+
+    def set_batching(self, max_batch_size: int, max_batch_wait: float) -> None:
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_batch_wait = max(0.0, max_batch_wait)
+
+
     def shutdown(self) -> None:
         print('Begin shutdown of video processing engine')
         self._continue_thread_loop = False
-        self._capture_event.clear()
-        self._process_event.clear()
-
-        with self._buffer_lock:
-            self._buffer_not_empty.notify_all()
-        
-        self.remove_video_source()
 
         print('Cleanup variables')
-        self.remove_video_source()
+        for stream_id in self.get_stream_ids():
+            self.remove_video_source(stream_id)
+
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+            sinks = list(self._sinks)
+
+        with self._pending_ready:
+            self._pending_ready.notify_all()
+
+        # Let the batches in flight reach the sinks before they get closed
+        if self._processing_thread.is_alive():
+            self._processing_thread.join(SHUTDOWN_TIMEOUT)
+        if self._completion_thread.is_alive():
+            self._completion_thread.join(SHUTDOWN_TIMEOUT)
+
+        if self._inference_pool is not None:
+            self._inference_pool.shutdown()
+
+        for sink in sinks:
+            sink.close()
+        if self._alert_engine is not None:
+            self._alert_engine.close()
+
+        self._frame_pool.close()
 
         print('End of cleanup, waiting for main thread to shut down deamon threads')
 
-    
-    def _start_processing(self) -> None:
-        self._stop_processing()
-        self._process_event.set()
 
+    def get_stream_ids(self) -> list[int]:
+        with self._frame_ready:
+            return list(self._streams.keys())
 
-    def _stop_processing(self) -> None:
-        self._process_event.clear()
-        with self._buffer_lock:
-            self._buffer_not_empty.notify_all()
 
+    def add_video_source(self, source: int|str, queue_policy: Optional[str] = None,
+                         fifo_size: int = DEFAULT_FIFO_SIZE, motion_gating: Optional[bool] = None,
+                         inference_regions: Optional[InferenceRegions] = None) -> int:
+        with self._frame_ready:
+            stream_id = self._next_stream_id
+            self._next_stream_id += 1
 
-    def remove_video_source(self) -> None:
-        self._is_capture_on = False
-        self._stop_processing()
+        self.set_video_source(source, stream_id, queue_policy, fifo_size, motion_gating, inference_regions)
+        return stream_id
 
-        with self._video_capture_lock:
-            self._end_capture()
-            self._video_capture.end_capture()
 
+    def remove_video_source(self, stream_id: int = DEFAULT_STREAM_ID) -> None:
+        with self._frame_ready:
+            stream = self._streams.pop(stream_id, None)
 
-    def set_video_source(self, source: int|str) -> None:
-        self.remove_video_source()
+        if stream is not None:
+            stream.stop()
 
-        self._video_capture.start_capture(source)
-        self._is_capture_on = True
 
-        self._start_capture()
-        self._start_processing()
+    # Queue policy defaults to bounded FIFO for video files and latest-only for live sources
+    def set_video_source(self, source: int|str, stream_id: int = DEFAULT_STREAM_ID,
+                         queue_policy: Optional[str] = None, fifo_size: int = DEFAULT_FIFO_SIZE,
+                         motion_gating: Optional[bool] = None,
+                         inference_regions: Optional[InferenceRegions] = None) -> None:
+        self.remove_video_source(stream_id)
 
+        if motion_gating is None:
+            motion_gating = self._motion_gating
+        motion_gate = MotionGate(self._motion_refresh_interval) if motion_gating else None
+        tracker = ObjectTracker() if self._tracking or self._detection_interval > 1 else None
+        if inference_regions is None:
+            inference_regions = self._inference_regions
 
-    def _start_capture(self) -> None:
-        self._capture_event.set()
+        stream = VideoStream(stream_id, source, self._frame_pool, self._frame_ready, queue_policy, fifo_size,
+                             motion_gate, self._detection_interval, tracker, inference_regions, self._metrics)
+        stream.start()
 
+        with self._frame_ready:
+            self._streams[stream_id] = stream
+            self._next_stream_id = max(self._next_stream_id, stream_id + 1)
 
-    def _end_capture(self) -> None:
-        self._capture_event.clear()
 
-        with self._buffer_lock:
-            self._frame_buffer = None
-            self._buffer_not_empty.notify_all()
+    def _count_ready_streams(self) -> int:
+        return sum(1 for stream in self._streams.values() if stream.has_frame())
 
 
-    def _capture_frames(self) -> None:
-        while self._continue_thread_loop:
-            if not self._capture_event.is_set():
-                self._capture_event.wait()
-                # In case shutdown happened: end thread
-                if not self._continue_thread_loop:
-                    return
+    def _count_ready_frames(self) -> int:
+        return sum(stream.count_frames() for stream in self._streams.values())
 
-            with self._video_capture_lock:
-                is_capture_on, frame = self._video_capture.get_frame()
 
-            if not is_capture_on:
-                self.remove_video_source()
-                continue
+    def _gather_batch(self) -> list[Tuple[VideoStream, Frame]]:
+        with self._frame_ready:
+            while self._continue_thread_loop and self._count_ready_streams() == 0:
+                self._frame_ready.wait()
 
-            if frame is None:
-                continue
+            # In case shutdown happened: end thread
+            if not self._continue_thread_loop:
+                return []
+
+            # Give the remaining streams a short moment to deliver, trading latency for batch size
+            deadline = time.monotonic() + self._max_batch_wait
+            while (self._count_ready_frames() < self._max_batch_size
+                   and self._count_ready_streams() < len(self._streams)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._frame_ready.wait(remaining)
+
+            streams = list(self._streams.values())
+            offset = self._batch_offset % max(len(streams), 1)
+            streams = streams[offset:] + streams[:offset]
+
+            batch = []
+            for stream in streams:
+                if len(batch) == self._max_batch_size:
+                    break
+                if stream.has_frame():
+                    batch.append((stream, stream.fetch_frame()))
+
+            self._batch_offset += len(batch)
 
-            frame = self._image_processor.fit_frame_into_screen(frame, 
-                                                                self._max_frame_width, self._max_frame_height)
-            
-            with self._buffer_lock:
-                self._set_buffer(frame)
-                self._buffer_not_empty.notify()
+            # Lossless streams fill the remaining room with their backlog, frames of a stream stay in order
+            for stream in streams:
+                while len(batch) < self._max_batch_size and stream.is_lossless() and stream.has_frame():
+                    batch.append((stream, stream.fetch_frame()))
+
+            # Wake up capture threads waiting for room in their queue
+            self._frame_ready.notify_all()
+
+        return batch
 
 
     def _process_frames(self) -> None:
+        # Frames wait in their streams until the model is loaded and warmed up, by their queue policy
+        while self._continue_thread_loop and not self._image_processor.wait_until_ready(MODEL_WAIT_INTERVAL):
+            pass
+
         while self._continue_thread_loop:
-            if not self._process_event.is_set():
-                self._process_event.wait()
-                # In case shutdown happened: end thread
-                if not self._continue_thread_loop:
+            batch = self._gather_batch()
+            if not batch:
+                continue
+
+            now = time.monotonic()
+            for _, frame in batch:
+                self._metrics.observe(QUEUE, now - frame.capture_time)
+
+            plans = [stream.plan_frame(frame) for stream, frame in batch]
+            detect_batch = [(stream, frame) for (stream, frame), plan in zip(batch, plans) if plan.action == DETECT]
+
+            if self._inference_pool is not None:
+                self._dispatch_batch(batch, plans, detect_batch)
+                continue
+
+            # Frames stay BGR from decode on, which is what YOLO expects for numpy input
+            detected = self._image_processor.detect_objects_batch(
+                [frame.data for _, frame in detect_batch],
+                [stream.get_inference_regions() for stream, _ in detect_batch])
+            if detect_batch:
+                self._observe_inference(self._image_processor.get_last_batch_timings())
+
+            self._output_batch(batch, self._resolve_detections(batch, plans, detected))
+
+
+    # Hands the frames planned for detection to the workers, waits while enough batches are in flight
+    def _dispatch_batch(self, batch: list[Tuple[VideoStream, Frame]], plans: list[FramePlan],
+                        detect_batch: list[Tuple[VideoStream, Frame]]) -> None:
+        detected_frames = [self._in_shared_memory(frame) for _, frame in detect_batch]
+        future = None
+        if detected_frames:
+            future = self._inference_pool.submit(detected_frames,
+                                                 [stream.get_inference_regions() for stream, _ in detect_batch])
+
+        with self._pending_ready:
+            while self._continue_thread_loop and len(self._pending_batches) >= self._max_pending_batches:
+                self._pending_ready.wait()
+
+            self._pending_batches.append((batch, plans, detected_frames, future))
+            self._pending_ready.notify_all()
+
+
+    # Adopted frames (e.g. after a resolution change) are not shared yet and get copied once
+    def _in_shared_memory(self, frame: Frame) -> Frame:
+        if frame.buffer.get_shared_memory_name() is not None:
+            return frame.retain()
+
+        shared_buffer = self._frame_pool.acquire(frame.data.shape, frame.data.dtype)
+        np.copyto(shared_buffer.data, frame.data)
+        return frame.with_buffer(shared_buffer)
+
+
+    # Finishes batches strictly in submission order, so every stream gets its results in capture order
+    def _complete_batches(self) -> None:
+        while True:
+            with self._pending_ready:
+                while self._continue_thread_loop and not self._pending_batches:
+                    self._pending_ready.wait()
+
+                if not self._pending_batches:
                     return
 
-            with self._buffer_not_empty:
-                while self._is_buffer_empty():
-                    self._buffer_not_empty.wait()
-                    # In case shutdown happened: end thread
-                    if not self._continue_thread_loop:  
-                        return
-
-                frame = self._fetch_buffer() 
-
-            detections, are_there_objects = self._image_processor.detect_objects(frame)
-            frame = self._image_processor.visualize_objects_presence(frame, detections)
-
-            if are_there_objects:
-                self._audio_alarm.play_audio_alert()
-       
-            with self._frame_set_lock:
-                self._set_processed_frame_buffer(frame)
-    
-    
-    def get_processed_frame(self) -> Tuple[bool, Optional[MatLike]]:
-        with self._frame_set_lock:
-            is_capture_on = self._is_capture_on
-            frame = self._fetch_processed_frame_buffer()
-
-        return is_capture_on, frame
+                batch, plans, detected_frames, future = self._pending_batches.popleft()
+                self._pending_ready.notify_all()
+
+            detected = [(Detections.empty(), False)] * len(detected_frames)
+            if future is not None:
+                try:
+                    batch_detections, timings = future.result()
+                    detected = [(detections, len(detections) > 0) for detections in batch_detections]
+                    self._observe_inference(timings)
+                except Exception as e:
+                    print(f'Inference worker failed: {e}')
+
+            for frame in detected_frames:
+                frame.release()
+
+            # A failing batch must not end this thread, dispatching would wait for it forever
+            try:
+                batch_detections = self._resolve_detections(batch, plans, detected)
+            except Exception as e:
+                print(f'Failed to resolve detections of a batch: {e}')
+                for _, frame in batch:
+                    frame.release()
+                continue
+
+            try:
+                self._output_batch(batch, batch_detections)
+            except Exception as e:
+                print(f'Failed to output a batch: {e}')
+
+
+    def _observe_inference(self, timings: Tuple[float, float]) -> None:
+        preprocess_time, inference_time = timings
+        self._metrics.observe(PREPROCESS, preprocess_time)
+        self._metrics.observe(INFERENCE, inference_time)
+
+
+    def _output_batch(self, batch: list[Tuple[VideoStream, Frame]],
+                      batch_detections: list[Tuple[Detections, bool]]) -> None:
+        with self._frame_ready:
+            sinks = list(self._sinks)
+            needs_display_frame = self._needs_display_frame()
+            needs_annotated_frame = self._needs_annotated_frame()
+
+        remaining = iter(zip(batch, batch_detections))
+        try:
+            for (stream, frame), (detections, _) in remaining:
+                try:
+                    self._output_frame(stream, frame, detections, sinks, needs_display_frame,
+                                       needs_annotated_frame)
+                finally:
+                    frame.release()
+        finally:
+            for (_, frame), _ in remaining: # Left over when a frame raised
+                frame.release()
+
+
+    def _output_frame(self, stream: VideoStream, frame: Frame, detections: Detections, sinks: list[ResultSink],
+                      needs_display_frame: bool, needs_annotated_frame: bool) -> None:
+        annotation_start_time = time.monotonic()
+        output_frame = self._prepare_output_frame(frame, detections, needs_display_frame, needs_annotated_frame)
+        try:
+            sinks_start_time = time.monotonic()
+            self._metrics.observe(ANNOTATION, sinks_start_time - annotation_start_time)
+
+            if self._alert_engine is not None:
+                self._alert_engine.evaluate(detections)
+            for sink in sinks:
+                sink.consume(output_frame, detections)
+            self._metrics.observe(SINKS, time.monotonic() - sinks_start_time)
+
+            if self._display:
+                stream.set_processed_frame(output_frame)
+
+            stream.mark_frame_processed(frame)
+        finally:
+            output_frame.release()
+
+
+    # Detected frames get their detector boxes, the others are tracked or reuse the last boxes
+    def _resolve_detections(self, batch: list[Tuple[VideoStream, Frame]], plans: list[FramePlan],
+                            detected: list[Tuple[Detections, bool]]) -> list[Tuple[Detections, bool]]:
+        detected = iter(detected)
+
+        # In batch order, so consecutive frames of one stream update its tracker in sequence
+        batch_detections = []
+        for (stream, frame), plan in zip(batch, plans):
+            if plan.action == DETECT:
+                detections, _ = next(detected)
+                if plan.tracker is not None:
+                    detections = Detections.from_array(plan.tracker.update(detections.to_array()))
+            elif plan.action == TRACK:
+                detections = Detections.from_array(plan.tracker.predict())
+            else:
+                # Previous boxes attached to this newer frame, without running the detector. REUSE is only planned
+                # once a frame of the stream was resolved, and frames are resolved in capture order
+                detections = stream.get_last_detections()
+
+            detections = detections.for_frame(frame)
+            stream.set_last_detections(detections)
+            batch_detections.append((detections, len(detections) > 0))
+
+        return batch_detections
+
+
+    # Display scaling and annotation run after inference and only when somebody looks at the pixels
+    def _prepare_output_frame(self, frame: Frame, detections: Detections,
+                              needs_display_frame: bool, needs_annotated_frame: bool) -> Frame:
+        output_frame = frame.retain()
+        if needs_display_frame:
+            output_frame = self._image_processor.fit_pooled_frame_into_screen(output_frame, self._max_frame_width,
+                                                                              self._max_frame_height, self._frame_pool)
+
+        if needs_annotated_frame:
+            scale = output_frame.data.shape[1] / frame.data.shape[1]
+            self._image_processor.visualize_objects_presence(output_frame.data, detections, scale)
+
+        return output_frame
+
+
+    def get_stream_stats(self, stream_id: int = DEFAULT_STREAM_ID) -> Optional[dict]:
+        with self._frame_ready:
+            stream = self._streams.get(stream_id)
+
+        if stream is None:
+            return None
+
+        return stream.get_stats()
+
+
+    def get_stats(self) -> dict[int, dict]:
+        with self._frame_ready:
+            streams = list(self._streams.values())
+
+        return {stream.get_stream_id(): stream.get_stats() for stream in streams}
+
+
+    def get_frame_pool_stats(self) -> dict:
+        return self._frame_pool.get_stats()
+
+
+    # Per-stage latency percentiles and the stream counters
+    def get_metrics(self) -> dict:
+        return {'stages': self._metrics.get_stats(), 'streams': self.get_stats()}
+
+
+    # Live histograms, e.g. for controllers that compare two snapshots of a stage
+    def get_pipeline_metrics(self) -> PipelineMetrics:
+        return self._metrics
+
+
+    # 0 when detection runs on the processing thread
+    def get_num_inference_workers(self) -> int:
+        return self._inference_pool.get_num_workers() if self._inference_pool is not None else 0
+
+
+    # Clears the latency histograms, stream counters keep counting
+    def reset_metrics(self) -> None:
+        self._metrics.reset()
+
+
+    # Everything of get_metrics in Prometheus text format, see MetricsServer
+    def render_metrics(self) -> str:
+        return render_prometheus(self._metrics, self.get_stats())
+
+
+    # Called by the display once frame (from get_processed_frame) is on screen
+    # display_time is how long drawing the frame took, it is counted as displayed by its stream
+    def record_frame_displayed(self, frame: Frame, display_time: float) -> None:
+        with self._frame_ready:
+            stream = self._streams.get(frame.stream_id)
+
+        if stream is not None:
+            stream.record_frame_displayed(frame, display_time)
+
+
+    # Without locking the frame: True when get_processed_frame has a frame, or the stream ended or is gone
+    def has_display_update(self, stream_id: int = DEFAULT_STREAM_ID) -> bool:
+        stream = self._streams.get(stream_id)
+        return stream is None or stream.has_display_update()
+
+
+    def get_source_fps(self, stream_id: int = DEFAULT_STREAM_ID) -> float:
+        stream = self._streams.get(stream_id)
+        return stream.get_source_fps() if stream is not None else 0.0
+
+
+    # Caller owns the returned frame and releases it once displayed
+    def get_processed_frame(self, stream_id: int = DEFAULT_STREAM_ID) -> Tuple[bool, Optional[Frame]]:
+        with self._frame_ready:
+            stream = self._streams.get(stream_id)
+
+        if stream is None:
+            return False, None
+
+        return stream.get_processed_frame()
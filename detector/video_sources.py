@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+import cv2 as cv
+from typing import Tuple, Optional
+
+from detector.frame_pool import FramePool, FrameBuffer
+from detector.synthetic_capture import SyntheticCapture, is_synthetic_source, parse_synthetic_url
+
+NETWORK_SCHEMES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+NETWORK_TIMEOUT = 5000 # milliseconds for opening a network stream and for every read from it
+INITIAL_RECONNECT_DELAY = 0.5 # seconds, doubled after every failed attempt
+MAX_RECONNECT_DELAY = 30.0 # seconds
+
+
+class VideoSource:
+    # Frames are grabbed (the source advances, nothing is decoded) and only the grabbed frames somebody needs are
+    # retrieved into pooled buffers. Used by the capture thread only, except for interrupt
+    is_live = False # Frames keep coming whether they are read or not, so a slow reader skips them
+
+    def __init__(self, source: int|str) -> None:
+        self._source = source
+        self._interrupted = threading.Event()
+        self._fps = 0.0 # Reported by the source, 0 when unknown
+
+        self._timestamp = 0.0
+        self._capture_time = 0.0
+
+
+    def get_source(self) -> int|str:
+        return self._source
+
+
+    def open(self) -> bool:
+        raise NotImplementedError
+
+
+    def get_fps(self) -> float:
+        return self._fps
+
+
+    # Advances to the next frame, False once the source has ended
+    def grab(self) -> bool:
+        raise NotImplementedError
+
+
+    # Decodes the last grabbed frame, in BGR
+    def retrieve(self, frame_pool: FramePool) -> Optional[FrameBuffer]:
+        raise NotImplementedError
+
+
+    def read(self, frame_pool: FramePool) -> Tuple[bool, Optional[FrameBuffer]]:
+        if not self.grab():
+            return False, None
+        return True, self.retrieve(frame_pool)
+
+
+    # Wall clock and monotonic time at which the last grabbed frame arrived
+    def get_timestamps(self) -> Tuple[float, float]:
+        return self._timestamp, self._capture_time
+
+
+    # Thread safe, makes a waiting source give up so the capture thread can close it
+    def interrupt(self) -> None:
+        self._interrupted.set()
+
+
+    def close(self) -> None:
+        pass
+
+
+    def _mark_grabbed(self) -> None:
+        self._timestamp = time.time()
+        self._capture_time = time.monotonic()
+
+
+class OpenCvSource(VideoSource):
+    def __init__(self, source: int|str) -> None:
+        super().__init__(source)
+        self._capture = None
+        self._frame_shape = None # Known after the first retrieve, later ones decode straight into pooled buffers
+
+
+    def open(self) -> bool:
+        self.close()
+        self._capture = self._create_capture()
+        if not self._capture.isOpened():
+            return False
+
+        self._fps = self._capture.get(cv.CAP_PROP_FPS)
+        return True
+
+
+    def _create_capture(self):
+        return cv.VideoCapture(self._source)
+
+
+    def grab(self) -> bool:
+        if self._capture is None or not self._capture.grab():
+            return False
+
+        self._mark_grabbed()
+        return True
+
+
+    def retrieve(self, frame_pool: FramePool) -> Optional[FrameBuffer]:
+        buffer = frame_pool.acquire(self._frame_shape) if self._frame_shape is not None else None
+        is_retrieved, image = self._capture.retrieve(buffer.data if buffer is not None else None)
+
+        if not is_retrieved or image is None or image.size == 0:
+            if buffer is not None:
+                buffer.release()
+            return None
+
+        if buffer is None or image is not buffer.data:
+            # First frame or resolution change: OpenCV allocated a new array, the pool takes it over
+            if buffer is not None:
+                buffer.release()
+            buffer = frame_pool.adopt(image)
+            self._frame_shape = image.shape
+
+        return buffer
+
+
+    def close(self) -> None:
+        if self._capture is None:
+            return
+        self._capture.release()
+        self._capture = None
+        self._frame_shape = None
+
+
+class CameraSource(OpenCvSource):
+    is_live = True
+
+
+class FileSource(OpenCvSource):
+    # Position of the last grabbed frame in the file, in seconds
+    def get_position(self) -> float:
+        return self._capture.get(cv.CAP_PROP_POS_MSEC) / 1000 if self._capture is not None else 0.0
+
+
+class NetworkStreamSource(OpenCvSource):
+    # RTSP, RTMP or HTTP stream. A dropped or unreachable stream is reopened with exponential backoff until it is
+    # interrupted, so a camera rebooting or a flaky link only pauses the stream
+    is_live = True
+
+    def __init__(self, url: str) -> None:
+        super().__init__(url)
+        self._reconnect_delay = INITIAL_RECONNECT_DELAY
+        self._reconnects = 0
+
+
+    def get_reconnects(self) -> int:
+        return self._reconnects
+
+
+    def open(self) -> bool:
+        super().open()
+        return True # Not reachable yet is handled like a dropped stream
+
+
+    def _create_capture(self):
+        return cv.VideoCapture(self._source, cv.CAP_ANY, [cv.CAP_PROP_OPEN_TIMEOUT_MSEC, NETWORK_TIMEOUT,
+                                                          cv.CAP_PROP_READ_TIMEOUT_MSEC, NETWORK_TIMEOUT])
+
+
+    def grab(self) -> bool:
+        while not self._interrupted.is_set():
+            if super().grab():
+                self._reconnect_delay = INITIAL_RECONNECT_DELAY
+                return True
+
+            print(f'Stream {self._source} unavailable, reconnecting in {self._reconnect_delay:.1f} s')
+            self.close()
+            if self._interrupted.wait(self._reconnect_delay):
+                break
+            self._reconnect_delay = min(2 * self._reconnect_delay, MAX_RECONNECT_DELAY)
+
+            if super().open():
+                self._reconnects += 1
+
+        return False
+
+
+class SyntheticSource(OpenCvSource):
+    def __init__(self, url: str) -> None:
+        super().__init__(url)
+        self.is_live = parse_synthetic_url(url)['fps'] > 0 # Paced like a camera, otherwise like a file
+
+
+    def _create_capture(self):
+        return SyntheticCapture.from_url(self._source)
+
+
+class ImageDirectorySource(VideoSource):
+    # Images of a directory in name order, as fast as they are read or paced at fps like a camera
+    def __init__(self, directory: str, fps: float = 0.0) -> None:
+        super().__init__(directory)
+        self._fps = fps
+        self.is_live = fps > 0
+        self._paths = []
+        self._index = -1
+        self._start_time = None
+
+
+    def open(self) -> bool:
+        self._paths = sorted(os.path.join(self._source, name) for name in os.listdir(self._source)
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        self._index = -1
+        self._start_time = None
+        return len(self._paths) > 0
+
+
+    def grab(self) -> bool:
+        if self._index + 1 >= len(self._paths):
+            return False
+
+        self._index += 1
+        if self._fps > 0:
+            now = time.monotonic()
+            if self._start_time is None:
+                self._start_time = now
+            if self._interrupted.wait(max(0.0, self._start_time + self._index / self._fps - now)):
+                return False
+
+        self._mark_grabbed()
+        return True
+
+
+    def retrieve(self, frame_pool: FramePool) -> Optional[FrameBuffer]:
+        image = cv.imread(self._paths[self._index], cv.IMREAD_COLOR)
+        if image is None:
+            print(f'Skipping unreadable image {self._paths[self._index]}')
+            return None
+
+        # imread always allocates, the pool takes the array over instead of copying it
+        return frame_pool.adopt(image)
+
+
+def is_network_source(source: int|str) -> bool:
+    return isinstance(source, str) and source.lower().startswith(NETWORK_SCHEMES)
+
+
+# Camera index, synthetic:// test pattern, network stream URL, directory of images or video file
+def create_video_source(source: int|str) -> VideoSource:
+    if isinstance(source, int):
+        return CameraSource(source)
+    if is_synthetic_source(source):
+        return SyntheticSource(source)
+    if is_network_source(source):
+        return NetworkStreamSource(source)
+    if os.path.isdir(source):
+        return ImageDirectorySource(source)
+    return FileSource(source)
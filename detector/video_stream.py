@@ -0,0 +1,452 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+from typing import Tuple, Optional
+
+from detector.video_sources import VideoSource, create_video_source
+from detector.frame_pool import FramePool
+from detector.frame import Frame, BGR
+from detector.detections import Detections
+from detector.motion_gate import MotionGate
+from detector.tracker import ObjectTracker
+from detector.inference_regions import InferenceRegions
+from detector.metrics import PipelineMetrics, DECODE, PROCESSED, HANDOFF, DISPLAY, DISPLAYED
+
+LATEST_ONLY = 'latest-only' # Live sources: keep only the newest frame, older ones are dropped
+BOUNDED_FIFO = 'bounded-fifo' # Recorded sources: keep every frame, capture waits when the queue is full
+QUEUE_POLICIES = (LATEST_ONLY, BOUNDED_FIFO)
+
+DEFAULT_FIFO_SIZE = 32
+DEFAULT_TRACK_CONFIDENCE_REFRESH = 0.5 # Detector runs early once the least certain track decays below this
+
+# What happens to a frame in the processing thread
+DETECT = 'detect' # Through the detector
+TRACK = 'track' # Boxes propagated by the tracker
+REUSE = 'reuse' # Static scene, previous boxes kept as they are
+FPS_WINDOW = 1.0 # seconds
+LATENCY_SMOOTHING = 0.1 # Weight of the newest sample in the capture-to-processed latency average
+INTERVAL_SMOOTHING = 0.2 # Weight of the newest sample in the grab, decode and fetch interval averages
+SOURCE_CLOSE_TIMEOUT = 2.0 # seconds stop waits for the capture thread to release the source
+
+
+def default_queue_policy(video_source: VideoSource) -> str:
+    return LATEST_ONLY if video_source.is_live else BOUNDED_FIFO
+
+
+def smooth(average: float, sample: float) -> float:
+    return sample if average == 0.0 else average + INTERVAL_SMOOTHING * (sample - average)
+
+
+class FramePlan:
+    # What happens to one frame, with the tracker that was current when it was planned (None without tracking)
+    __slots__ = ('action', 'tracker')
+
+    def __init__(self, action: str, tracker: Optional[ObjectTracker]) -> None:
+        self.action = action
+        self.tracker = tracker
+
+
+class VideoStream:
+    def __init__(self, stream_id: int, source: int|str, frame_pool: FramePool, frame_ready: threading.Condition,
+                 queue_policy: Optional[str] = None, fifo_size: int = DEFAULT_FIFO_SIZE,
+                 motion_gate: Optional[MotionGate] = None, detection_interval: int = 1,
+                 tracker: Optional[ObjectTracker] = None, inference_regions: Optional[InferenceRegions] = None,
+                 metrics: Optional[PipelineMetrics] = None) -> None:
+        self._stream_id = stream_id
+        self._source = source
+        self._frame_pool = frame_pool
+        self._metrics = metrics if metrics is not None else PipelineMetrics()
+
+        # Planning state, only touched by the processing thread. With inference workers frames are resolved later on
+        # the completion thread, so each plan carries the tracker it was planned with
+        self._motion_gate = motion_gate
+        self._tracker = tracker
+        self._has_tracked_detection = False # A detection was planned with the current tracker
+        self._inference_regions = inference_regions
+        self._detection_interval = max(1, detection_interval)
+        self._frames_since_detection = 0
+
+        # Resolving state, touched by whichever thread resolves the plans (processing or completion thread).
+        # Set once the first frame is resolved and never cleared, planning only checks it for None
+        self._last_detections = None
+
+        # (interval, tracking) set from any thread, applied by the processing thread before planning a frame
+        self._requested_cadence = (self._detection_interval, tracker is not None)
+        self._cadence = self._requested_cadence
+
+        self._video_source = create_video_source(source)
+
+        if queue_policy is None:
+            queue_policy = default_queue_policy(self._video_source)
+        if queue_policy not in QUEUE_POLICIES:
+            raise ValueError(f'Unknown queue policy: {queue_policy}')
+        self._queue_policy = queue_policy
+        queue_size = max(1, fifo_size) if queue_policy == BOUNDED_FIFO else 1
+
+        # Shared with the engine, guards _frame_queue and wakes up both the batching and the capture thread
+        self._frame_ready = frame_ready
+        self._frame_queue: deque = deque(maxlen=queue_size)
+
+        self._processed_frame_buffer = None
+        self._processed_frame_time = 0.0 # Monotonic, when _processed_frame_buffer was set
+        self._processed_frame_lock = threading.Lock()
+        # Set while a processed frame waits for the display or once capture has ended, so the display only takes
+        # the lock when there is something to do
+        self._display_update = threading.Event()
+
+        self._frames_captured = 0
+        self._frames_skipped = 0 # Grabbed from a live source but never decoded
+        self._frames_dropped = 0
+        self._frames_overwritten = 0 # Processed frames replaced before the display picked them up
+        self._frames_processed = 0
+        self._frames_tracked = 0
+        self._processed_timestamps: deque = deque()
+        self._mean_latency = None
+        self._frames_displayed = 0
+        self._displayed_timestamps: deque = deque()
+        self._mean_display_latency = None # Capture to screen, smoothed like mean_latency
+        self._sequence = 0
+
+        # Live latest-only sources decode a grabbed frame only when the processing thread is about to take one.
+        # Averages in seconds, grab and decode ones owned by the capture thread, fetch ones guarded by frame_ready
+        self._grab_interval = 0.0
+        self._decode_time = 0.0
+        self._fetch_interval = 0.0
+        self._fetch_jitter = 0.0 # Mean deviation of the fetch interval, fetches come this much earlier at times
+        self._last_fetch_time = 0.0
+
+        self._is_capture_on = False
+
+        self._capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
+
+
+    def get_stream_id(self) -> int:
+        return self._stream_id
+
+
+    def get_source(self) -> int|str:
+        return self._source
+
+
+    def get_queue_policy(self) -> str:
+        return self._queue_policy
+
+
+    # None means the whole frame goes through the detector at once
+    def get_inference_regions(self) -> Optional[InferenceRegions]:
+        return self._inference_regions
+
+
+    def is_lossless(self) -> bool:
+        return self._queue_policy == BOUNDED_FIFO
+
+
+    def is_capture_on(self) -> bool:
+        return self._is_capture_on
+
+
+    # The source is opened by the capture thread, so a slow network stream does not block the caller
+    def start(self) -> None:
+        self._is_capture_on = True
+        self._capture_thread.start()
+
+
+    def stop(self) -> None:
+        self._is_capture_on = False
+        self._signal_capture_ended()
+        self._video_source.interrupt()
+
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+
+        # The source is released by its own thread, wait for it so e.g. the same camera can be opened again
+        if self._capture_thread.is_alive() and threading.current_thread() is not self._capture_thread:
+            self._capture_thread.join(SOURCE_CLOSE_TIMEOUT)
+
+        with self._frame_ready:
+            while self._frame_queue:
+                self._frame_queue.popleft().release()
+            self._frame_ready.notify_all()
+
+        with self._processed_frame_lock:
+            if self._processed_frame_buffer is not None:
+                self._processed_frame_buffer.release()
+                self._processed_frame_buffer = None
+
+
+    # Must be called while holding frame_ready
+    def has_frame(self) -> bool:
+        return len(self._frame_queue) > 0
+
+
+    # Must be called while holding frame_ready
+    def count_frames(self) -> int:
+        return len(self._frame_queue)
+
+
+    # Must be called while holding frame_ready, the caller notifies so a waiting capture thread resumes
+    def fetch_frame(self) -> Frame|None:
+        if not self._frame_queue:
+            return None
+
+        now = time.monotonic()
+        if self._last_fetch_time > 0.0:
+            fetch_interval = now - self._last_fetch_time
+            if self._fetch_interval > 0.0:
+                self._fetch_jitter = smooth(self._fetch_jitter, abs(fetch_interval - self._fetch_interval))
+            self._fetch_interval = smooth(self._fetch_interval, fetch_interval)
+        self._last_fetch_time = now
+
+        return self._frame_queue.popleft()
+
+
+    # Takes effect with the next planned frame. Tracking is implied by an interval above 1
+    def set_detection_cadence(self, detection_interval: int, tracking: bool = False) -> None:
+        detection_interval = max(1, detection_interval)
+        self._requested_cadence = (detection_interval, tracking or detection_interval > 1)
+
+
+    # Without tracking and motion gating, every frame goes through the detector
+    def plan_frame(self, frame: Frame) -> FramePlan:
+        if self._requested_cadence != self._cadence:
+            self._apply_cadence()
+
+        if self._tracker is not None and self._has_tracked_detection and not self._is_detection_due():
+            action = TRACK
+        elif self._motion_gate is not None and not self._motion_gate.should_detect(frame) \
+                and self._last_detections is not None:
+            action = REUSE
+        else:
+            action = DETECT
+
+        self._frames_since_detection = 0 if action == DETECT else self._frames_since_detection + 1
+        if action == DETECT and self._tracker is not None:
+            self._has_tracked_detection = True
+        if action == TRACK:
+            self._frames_tracked += 1
+        return FramePlan(action, self._tracker)
+
+
+    # Frames planned before keep the tracker they were planned with, a new tracker starts with the next detection
+    def _apply_cadence(self) -> None:
+        self._cadence = self._requested_cadence
+        self._detection_interval, tracking = self._cadence
+        if not tracking:
+            self._tracker = None
+        elif self._tracker is None:
+            self._tracker = ObjectTracker()
+            self._has_tracked_detection = False
+            self._frames_since_detection = 0
+
+
+    def _is_detection_due(self) -> bool:
+        return (self._frames_since_detection + 1 >= self._detection_interval
+                or self._tracker.min_track_confidence() < DEFAULT_TRACK_CONFIDENCE_REFRESH)
+
+
+    def set_last_detections(self, detections: Detections) -> None:
+        self._last_detections = detections
+
+
+    def get_last_detections(self) -> Optional[Detections]:
+        return self._last_detections
+
+
+    def set_processed_frame(self, frame: Frame) -> None:
+        frame.retain()
+        with self._processed_frame_lock:
+            previous_frame = self._processed_frame_buffer
+            self._processed_frame_buffer = frame
+            self._processed_frame_time = time.monotonic()
+            if previous_frame is not None:
+                self._frames_overwritten += 1
+            self._display_update.set()
+
+        # Display never picked it up
+        if previous_frame is not None:
+            previous_frame.release()
+
+
+    def mark_frame_processed(self, frame: Frame) -> None:
+        now = time.monotonic()
+        latency = now - frame.capture_time
+        self._metrics.observe(PROCESSED, latency)
+
+        with self._processed_frame_lock:
+            self._frames_processed += 1
+            self._processed_timestamps.append(now)
+            self._trim_timestamps(self._processed_timestamps, now)
+
+            if self._mean_latency is None:
+                self._mean_latency = latency
+            else:
+                self._mean_latency += LATENCY_SMOOTHING * (latency - self._mean_latency)
+
+
+    def record_frame_displayed(self, frame: Frame, display_time: float) -> None:
+        now = time.monotonic()
+        latency = now - frame.capture_time
+        self._metrics.observe(DISPLAY, display_time)
+        self._metrics.observe(DISPLAYED, latency)
+
+        with self._processed_frame_lock:
+            self._frames_displayed += 1
+            self._displayed_timestamps.append(now)
+            self._trim_timestamps(self._displayed_timestamps, now)
+
+            if self._mean_display_latency is None:
+                self._mean_display_latency = latency
+            else:
+                self._mean_display_latency += LATENCY_SMOOTHING * (latency - self._mean_display_latency)
+
+
+    def _trim_timestamps(self, timestamps: deque, now: float) -> None:
+        while timestamps and now - timestamps[0] > FPS_WINDOW:
+            timestamps.popleft()
+
+
+    def get_stats(self) -> dict:
+        with self._processed_frame_lock:
+            self._trim_timestamps(self._processed_timestamps, time.monotonic())
+            processed_fps = len(self._processed_timestamps) / FPS_WINDOW
+            frames_processed = self._frames_processed
+            frames_overwritten = self._frames_overwritten
+            mean_latency = self._mean_latency
+            self._trim_timestamps(self._displayed_timestamps, time.monotonic())
+            displayed_fps = len(self._displayed_timestamps) / FPS_WINDOW
+            frames_displayed = self._frames_displayed
+            mean_display_latency = self._mean_display_latency
+
+        with self._frame_ready:
+            queued_frames = len(self._frame_queue)
+
+        motion_stats = self._motion_gate.get_stats() if self._motion_gate is not None else {}
+
+        return {
+            'source': self._source,
+            'queue_policy': self._queue_policy,
+            'is_capture_on': self._is_capture_on,
+            'frames_captured': self._frames_captured,
+            'frames_skipped': self._frames_skipped,
+            'frames_processed': frames_processed,
+            'frames_dropped': self._frames_dropped,
+            'frames_overwritten': frames_overwritten,
+            'frames_gated': motion_stats.get('frames_gated', 0),
+            'frames_tracked': self._frames_tracked,
+            'frames_displayed': frames_displayed,
+            'queued_frames': queued_frames,
+            'processed_fps': processed_fps,
+            'displayed_fps': displayed_fps,
+            'source_fps': self._video_source.get_fps(),
+            'mean_latency': mean_latency,
+            'mean_display_latency': mean_display_latency,
+        }
+
+
+    # Under the lock, so get_processed_frame cannot clear the signal after it saw capture still on
+    def _signal_capture_ended(self) -> None:
+        with self._processed_frame_lock:
+            self._display_update.set()
+
+
+    # Frame rate the source reports, 0 when unknown or before it is opened
+    def get_source_fps(self) -> float:
+        return self._video_source.get_fps()
+
+
+    # Without taking a lock: True when get_processed_frame has a frame or capture has ended
+    def has_display_update(self) -> bool:
+        return self._display_update.is_set()
+
+
+    # Caller owns the returned frame and releases it once displayed
+    def get_processed_frame(self) -> Tuple[bool, Optional[Frame]]:
+        with self._processed_frame_lock:
+            is_capture_on = self._is_capture_on
+            frame = self._processed_frame_buffer
+            self._processed_frame_buffer = None
+            processed_frame_time = self._processed_frame_time
+            if is_capture_on:
+                self._display_update.clear()
+
+        if frame is not None:
+            self._metrics.observe(HANDOFF, time.monotonic() - processed_frame_time)
+        return is_capture_on, frame
+
+
+    def _capture_frames(self) -> None:
+        if not self._video_source.open():
+            print(f'Could not open video source {self._source}')
+
+        last_grab_time = None
+        while self._is_capture_on:
+            if not self._video_source.grab():
+                break
+
+            now = time.monotonic()
+            if last_grab_time is not None:
+                self._grab_interval = smooth(self._grab_interval, now - last_grab_time)
+            last_grab_time = now
+
+            if not self._should_decode(now):
+                self._frames_skipped += 1
+                continue
+
+            buffer = self._video_source.retrieve(self._frame_pool)
+            decode_time = time.monotonic() - now
+            if buffer is None:
+                continue
+
+            self._decode_time = smooth(self._decode_time, decode_time)
+            self._metrics.observe(DECODE, decode_time)
+
+            timestamp, capture_time = self._video_source.get_timestamps()
+            frame = Frame(buffer, BGR, self._stream_id, self._sequence, timestamp, capture_time)
+            self._sequence += 1
+            self._frames_captured += 1
+
+            if not self._enqueue_frame(frame):
+                break
+
+        self._video_source.close()
+        self._is_capture_on = False
+        self._signal_capture_ended()
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+
+
+    # Every frame of a lossless queue is processed. A live latest-only source keeps its queued frame and skips the
+    # decode, unless the slot is empty or the processing thread is expected to fetch before the next grab
+    def _should_decode(self, now: float) -> bool:
+        if not self._video_source.is_live or self.is_lossless():
+            return True
+
+        with self._frame_ready:
+            if not self._frame_queue or self._fetch_interval == 0.0:
+                return True
+            expected_fetch_time = self._last_fetch_time + self._fetch_interval - 2 * self._fetch_jitter
+
+        return now + self._grab_interval + self._decode_time >= expected_fetch_time
+
+
+    def _enqueue_frame(self, frame: Frame) -> bool:
+        with self._frame_ready:
+            if self.is_lossless():
+                # Backpressure: decoding pauses until inference catches up
+                while self._is_capture_on and len(self._frame_queue) == self._frame_queue.maxlen:
+                    self._frame_ready.wait()
+
+            # Stream was stopped meanwhile, its queue is already drained
+            if not self._is_capture_on:
+                frame.release()
+                return False
+
+            if len(self._frame_queue) == self._frame_queue.maxlen:
+                self._frames_dropped += 1 # Oldest frame is overwritten
+                self._frame_queue.popleft().release()
+
+            self._frame_queue.append(frame)
+            self._frame_ready.notify_all()
+
+        return True
@@ -1,9 +1,10 @@
 class YoloInferenceConfig:
     def __init__(self) -> None:
         self._confidence_threshold = 0.5
-        self._device = 'cuda'
+        self._device = None # Detected on model load: cuda, mps or cpu
         self._classes = [0] # people by default
         self._max_det = 50
+        self._input_size = 640 # Square model input, independent of display resolution
         self._verbose = False
 
         self._all_classes = None
@@ -21,4 +22,23 @@ class YoloInferenceConfig:
     def get_confidence_threshold(self) -> float:
         return self._confidence_threshold
     def set_confidence_threshold(self, confidence_threshold: float) -> None:
-        self._confidence_threshold = confidence_threshold
\ No newline at end of file
+        self._confidence_threshold = confidence_threshold
+
+    def get_input_size(self) -> int:
+        return self._input_size
+    def set_input_size(self, input_size: int) -> None:
+        self._input_size = max(32, input_size // 32 * 32) # YOLO strides need a multiple of 32
+
+    # Snapshot of everything that changes detection output, for detectors running in other processes
+    def get_inference_settings(self) -> dict:
+        return {
+            'confidence_threshold': self._confidence_threshold,
+            'classes': list(self._classes),
+            'max_det': self._max_det,
+            'input_size': self._input_size,
+        }
+    def apply_inference_settings(self, settings: dict) -> None:
+        self._confidence_threshold = settings['confidence_threshold']
+        self._classes = list(settings['classes'])
+        self._max_det = settings['max_det']
+        self._input_size = settings['input_size']
@@ -0,0 +1,269 @@
+import argparse
+import time
+from typing import Optional
+
+from detector.image_processor import ImageProcessor
+from detector.video_processing_engine import VideoProcessingEngine, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_BATCH_WAIT
+from detector.result_sinks import JsonlDetectionSink, VideoFileSink, DEFAULT_VIDEO_FPS
+from detector.detection_store import DetectionStoreSink
+from detector.clip_recorder import ClipRecorderSink, DEFAULT_PRE_ROLL, DEFAULT_POST_ROLL
+from detector.alerts import AlertEngine, AlertRule, LogAlertSink, WebhookAlertSink, SoundAlertSink, DEFAULT_COOLDOWN
+from detector.video_stream import QUEUE_POLICIES, DEFAULT_FIFO_SIZE
+from detector.motion_gate import DEFAULT_REFRESH_INTERVAL
+from detector.inference_backends import BACKENDS, AUTO_BACKEND, DEFAULT_MODEL_PATH
+from detector.inference_regions import InferenceRegions, DEFAULT_TILE_OVERLAP
+from detector.metrics import MetricsServer, STAGES
+from detector.camera_discovery import CameraDiscovery
+from detector.stream_server import StreamingServer, DEFAULT_STREAM_JPEG_QUALITY
+from detector.quality_controller import QualityController
+
+POLL_INTERVAL = 0.5 # seconds
+
+
+def parse_source(source: str) -> int|str:
+    return int(source) if source.isdigit() else source
+
+
+def parse_region(region: str) -> tuple[float, float, float, float]:
+    x1, y1, x2, y2 = (float(value) for value in region.split(','))
+    return x1, y1, x2, y2
+
+
+def parse_tiles(tiles: str) -> tuple[int, int]:
+    columns, rows = (int(value) for value in tiles.lower().split('x'))
+    return columns, rows
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Run object detection without the control panel')
+    parser.add_argument('--source', action='append',
+                        help='Camera index, video file or stream URL. Repeat for multiple streams')
+    parser.add_argument('--list-cameras', action='store_true',
+                        help='Print the connected cameras with their resolutions and exit')
+    parser.add_argument('--jsonl', help='Append detections of every stream to this JSONL file')
+    parser.add_argument('--store', help='Record detections into this SQLite file, see query_detections.py')
+    parser.add_argument('--video', help='Write annotated video per stream, {stream_id} is replaced in the path')
+    parser.add_argument('--video-fps', type=float, default=DEFAULT_VIDEO_FPS)
+    parser.add_argument('--serve-port', type=int,
+                        help='Serve annotated streams over HTTP, MJPEG on /stream/<id>.mjpg, WebSocket on /ws/<id>')
+    parser.add_argument('--serve-quality', type=int, default=DEFAULT_STREAM_JPEG_QUALITY,
+                        help='JPEG quality of the served streams')
+    parser.add_argument('--clips', help='Save a clip around every detection event into this directory')
+    parser.add_argument('--pre-roll', type=float, default=DEFAULT_PRE_ROLL, help='Seconds of a clip before the event')
+    parser.add_argument('--post-roll', type=float, default=DEFAULT_POST_ROLL,
+                        help='Seconds of a clip after the last event')
+    parser.add_argument('--alert-classes', help='Comma separated class names that raise alerts, all detected by default')
+    parser.add_argument('--alert-min-confidence', type=float, default=0.0)
+    parser.add_argument('--alert-dwell-frames', type=int, default=1,
+                        help='Consecutive processed frames an object has to be present before an alert')
+    parser.add_argument('--alert-zone', action='append', type=parse_region,
+                        help='Alert only for boxes centered in x1,y1,x2,y2 (frame fractions), repeatable')
+    parser.add_argument('--alert-cooldown', type=float, default=DEFAULT_COOLDOWN,
+                        help='Seconds between two alerts of one stream')
+    parser.add_argument('--alert-log', nargs='?', const='-',
+                        help='Log alerts as JSON lines into this file, or print them without a file')
+    parser.add_argument('--alert-webhook', help='POST every alert as JSON to this URL')
+    parser.add_argument('--alert-sound', action='store_true', help='Play the alert sound')
+    parser.add_argument('--show-confidence', action='store_true', help='Print the confidence next to every label')
+    parser.add_argument('--class-colors', action='store_true', help='Draw every class in its own color')
+    parser.add_argument('--input-size', type=int, help='Square model input size, a multiple of 32')
+    parser.add_argument('--backend', choices=BACKENDS, default=AUTO_BACKEND,
+                        help='Inference runtime, auto prefers OpenVINO / ONNX Runtime on CPU and PyTorch on GPU')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--no-model-cache', action='store_true',
+                        help='Do not reuse compiled (OpenVINO) or optimized (ONNX Runtime) models from earlier runs')
+    parser.add_argument('--num-threads', type=int, help='Intra-op threads of the inference runtime')
+    parser.add_argument('--inference-workers', type=int, default=0,
+                        help='Run detection in this many worker processes, frames are shared without copying')
+    parser.add_argument('--worker-threads', type=int, help='Intra-op threads of every inference worker')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument('--max-batch-wait', type=float, default=DEFAULT_MAX_BATCH_WAIT,
+                        help='Seconds to wait for more streams before running a partial batch')
+    parser.add_argument('--queue-policy', choices=QUEUE_POLICIES,
+                        help='Frame queue of every stream, by default bounded-fifo for files and latest-only otherwise')
+    parser.add_argument('--fifo-size', type=int, default=DEFAULT_FIFO_SIZE)
+    parser.add_argument('--motion-gating', action='store_true',
+                        help='Skip the detector on frames without motion and reuse the previous detections')
+    parser.add_argument('--motion-refresh-interval', type=float, default=DEFAULT_REFRESH_INTERVAL,
+                        help='Seconds after which a motion gated stream runs the detector anyway')
+    parser.add_argument('--detection-interval', type=int, default=1,
+                        help='Run the detector every N frames and track boxes in between')
+    parser.add_argument('--tracking', action='store_true', help='Give boxes stable track ids')
+    parser.add_argument('--roi', action='append', type=parse_region,
+                        help='Region of interest x1,y1,x2,y2 in frame fractions, the rest is never inferred. '
+                             'Repeat for multiple regions')
+    parser.add_argument('--tiles', type=parse_tiles, default=(1, 1),
+                        help='Split every region into COLUMNSxROWS overlapping tiles, e.g. 2x2 for 4K cameras')
+    parser.add_argument('--tile-overlap', type=float, default=DEFAULT_TILE_OVERLAP)
+    parser.add_argument('--full-view', action='store_true',
+                        help='Infer the untiled region as well, for objects larger than a tile')
+    parser.add_argument('--target-fps', type=float,
+                        help='Lower model size, input size and detection cadence as needed to process every stream '
+                             'at this frame rate, and raise them again when there is headroom')
+    parser.add_argument('--target-latency', type=float,
+                        help='Same for the 95th percentile of capture-to-processed latency, in seconds')
+    parser.add_argument('--adaptive-models',
+                        help='Comma separated models from the most to the least expensive for --target-fps and '
+                             '--target-latency, by default the smaller variants next to --model')
+    parser.add_argument('--adaptive-log', help='Append every adaptive quality decision to this JSONL file')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve per-stage latency histograms and stream counters for Prometheus on /metrics')
+    parser.add_argument('--stats-interval', type=float, default=0.0,
+                        help='Print per-stream statistics every given number of seconds, 0 prints them only at exit')
+    return parser
+
+
+def parse_args(parser: argparse.ArgumentParser) -> argparse.Namespace:
+    args = parser.parse_args()
+    if not args.source and not args.list_cameras:
+        parser.error('the following arguments are required: --source')
+    return args
+
+
+def list_cameras() -> None:
+    cameras = CameraDiscovery().scan()
+    if not cameras:
+        print('No cameras found')
+    for camera in cameras:
+        resolutions = ', '.join(f'{width}x{height}' for width, height in camera.resolutions)
+        print(f'{camera.label()}, supports {resolutions}')
+
+
+# Class names are known once the model is loaded, so they are checked after parsing
+def parse_alert_classes(parser: argparse.ArgumentParser, alert_classes: Optional[str],
+                        class_names: list[str]) -> Optional[list[int]]:
+    if not alert_classes:
+        return None
+
+    class_ids = []
+    for class_name in alert_classes.split(','):
+        class_name = class_name.strip()
+        if class_name not in class_names:
+            parser.error(f'argument --alert-classes: unknown class {class_name!r}, '
+                         f'choose from {", ".join(class_names)}')
+        class_ids.append(class_names.index(class_name))
+    return class_ids
+
+
+def create_alert_engine(args: argparse.Namespace, class_ids: Optional[list[int]]) -> Optional[AlertEngine]:
+    sinks = []
+    if args.alert_log:
+        sinks.append(LogAlertSink(None if args.alert_log == '-' else args.alert_log))
+    if args.alert_webhook:
+        sinks.append(WebhookAlertSink(args.alert_webhook))
+    if args.alert_sound:
+        sinks.append(SoundAlertSink())
+    if not sinks:
+        return None
+
+    rule = AlertRule('headless', class_ids, args.alert_min_confidence, args.alert_dwell_frames, args.alert_zone,
+                     args.alert_cooldown)
+    return AlertEngine([rule], sinks)
+
+
+def print_stats(engine: VideoProcessingEngine) -> None:
+    for stream_id, stats in engine.get_stats().items():
+        latency_ms = (stats['mean_latency'] or 0.0) * 1000
+        print(f'Stream {stream_id} ({stats["source"]}, {stats["queue_policy"]}): '
+              f'{stats["processed_fps"]:.1f} FPS, latency {latency_ms:.0f} ms, '
+              f'captured {stats["frames_captured"]}, skipped {stats["frames_skipped"]}, processed {stats["frames_processed"]}, '
+              f'dropped {stats["frames_dropped"]}, gated {stats["frames_gated"]}, '
+              f'tracked {stats["frames_tracked"]}, queued {stats["queued_frames"]}')
+
+    stage_stats = engine.get_metrics()['stages']
+    for stage in STAGES:
+        stats = stage_stats[stage]
+        if stats['count'] == 0:
+            continue
+        print(f'  {stage}: p50 {stats["p50"] * 1000:.1f} ms, p95 {stats["p95"] * 1000:.1f} ms, '
+              f'p99 {stats["p99"] * 1000:.1f} ms ({stats["count"]} samples)')
+
+
+def main() -> None:
+    parser = create_parser()
+    args = parse_args(parser)
+    if args.list_cameras:
+        list_cameras()
+        return
+
+    inference_regions = None
+    if args.roi or args.tiles != (1, 1):
+        columns, rows = args.tiles
+        inference_regions = InferenceRegions(args.roi, columns, rows, args.tile_overlap, args.full_view)
+
+    image_processor = ImageProcessor(args.backend, args.model, args.num_threads, load=False,
+                                     model_cache=not args.no_model_cache)
+    if args.input_size:
+        image_processor.set_input_size(args.input_size)
+    image_processor.load_model() # Warmed up at the input size that is used
+    renderer = image_processor.get_annotation_renderer()
+    renderer.set_show_confidence(args.show_confidence)
+    renderer.set_class_colors(args.class_colors)
+    alert_class_ids = parse_alert_classes(parser, args.alert_classes, image_processor.get_available_classes())
+    engine = VideoProcessingEngine(image_processor,
+                                   alert_engine=create_alert_engine(args, alert_class_ids),
+                                   max_batch_size=args.max_batch_size,
+                                   max_batch_wait=args.max_batch_wait,
+                                   display=False,
+                                   motion_gating=args.motion_gating,
+                                   motion_refresh_interval=args.motion_refresh_interval,
+                                   detection_interval=args.detection_interval,
+                                   tracking=args.tracking,
+                                   inference_regions=inference_regions,
+                                   inference_workers=args.inference_workers,
+                                   worker_threads=args.worker_threads)
+
+    if args.jsonl:
+        engine.add_result_sink(JsonlDetectionSink(args.jsonl, image_processor.get_available_classes()))
+    if args.store:
+        engine.add_result_sink(DetectionStoreSink(args.store, image_processor.get_available_classes()))
+    if args.clips:
+        engine.add_result_sink(ClipRecorderSink(args.clips, args.pre_roll, args.post_roll,
+                                                get_source_fps=engine.get_source_fps))
+    if args.video:
+        engine.add_result_sink(VideoFileSink(args.video, fps=args.video_fps))
+    if args.serve_port is not None:
+        streaming_server = StreamingServer(args.serve_port, jpeg_quality=args.serve_quality)
+        engine.add_result_sink(streaming_server)
+        print(f'Streams on http://localhost:{streaming_server.get_port()}/')
+
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(engine.render_metrics, args.metrics_port)
+        print(f'Metrics on http://localhost:{metrics_server.get_port()}/metrics')
+
+    quality_controller = None
+    if args.target_fps is not None or args.target_latency is not None:
+        model_paths = [model_path.strip() for model_path in args.adaptive_models.split(',')] \
+            if args.adaptive_models else None
+        quality_controller = QualityController(engine, image_processor, args.target_fps, args.target_latency,
+                                               model_paths, log_path=args.adaptive_log)
+
+    engine.run()
+    for source in args.source:
+        engine.add_video_source(parse_source(source), args.queue_policy, args.fifo_size)
+    if quality_controller is not None:
+        quality_controller.start()
+
+    last_stats_time = time.monotonic()
+    try:
+        while engine.has_active_streams():
+            time.sleep(POLL_INTERVAL)
+
+            if args.stats_interval > 0 and time.monotonic() - last_stats_time >= args.stats_interval:
+                print_stats(engine)
+                last_stats_time = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print_stats(engine)
+        if quality_controller is not None:
+            quality_controller.stop()
+            print(f'Adaptive quality: {quality_controller.get_level().label()}')
+        if metrics_server is not None:
+            metrics_server.close()
+        engine.shutdown()
+
+
+if __name__ == '__main__':
+    main()
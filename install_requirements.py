@@ -8,6 +8,13 @@ default_packages = [
     'pillow==10.4.0',
 ]
 
+# Optional CPU inference runtimes, installed with --cpu-backends
+cpu_backend_packages = [
+    'onnx',
+    'onnxruntime',
+    'openvino',
+]
+
 extended_packages = [
     ('torch==2.4.1', 'https://download.pytorch.org/whl/cu118'),
     ('torchaudio==2.4.1', 'https://download.pytorch.org/whl/cu118'),
@@ -35,6 +42,10 @@ def main():
     for package in default_packages:
         install_package(package)
 
+    if '--cpu-backends' in sys.argv:
+        for package in cpu_backend_packages:
+            install_package(package)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from detector.detection_store import DetectionStore
+
+
+def parse_time(value: str) -> float:
+    # ISO 8601 in local time unless an offset is given, or a unix timestamp
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Query detections recorded by headless.py --store')
+    parser.add_argument('store', help='SQLite file written by the detection store')
+    parser.add_argument('--stream', type=int, action='append', help='Stream (camera) id, repeatable')
+    parser.add_argument('--class', dest='class_names', action='append', help='Class name, repeatable')
+    parser.add_argument('--from', dest='start_time', type=parse_time,
+                        help='Start time, e.g. 2024-05-01T02:00, inclusive')
+    parser.add_argument('--to', dest='end_time', type=parse_time, help='End time, exclusive')
+    parser.add_argument('--min-confidence', type=float)
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--count', action='store_true', help='Print only the number of matching detections')
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    store = DetectionStore(args.store)
+
+    class_ids = None
+    if args.class_names:
+        class_ids = [store.get_class_id(class_name) for class_name in args.class_names]
+        unknown = [name for name, class_id in zip(args.class_names, class_ids) if class_id is None]
+        if unknown:
+            sys.exit(f'Unknown classes: {", ".join(unknown)}')
+
+    filters = dict(stream_ids=args.stream, class_ids=class_ids, start_time=args.start_time,
+                   end_time=args.end_time, min_confidence=args.min_confidence)
+
+    if args.count:
+        print(store.count(**filters))
+    else:
+        # One JSON object per line, ready for jq or another JSONL consumer
+        for row in store.query(limit=args.limit, **filters):
+            row['time'] = datetime.fromtimestamp(row['timestamp']).isoformat(timespec='milliseconds')
+            print(json.dumps(row))
+
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
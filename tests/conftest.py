@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the detector package the way the entry points do, from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+from detector.alerts import AlertEngine, AlertRule, AlertSink, SinkDelivery, WebhookAlertSink
+from detector.detections import Detections
+
+PERSON = 0
+CAR = 2
+
+
+class WebhookStub:
+    def __init__(self, delay=0.0):
+        self.alerts = []
+        self.delay = delay
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if stub.delay:
+                    time.sleep(stub.delay)
+                stub.alerts.append(json.loads(body))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}/alerts'
+
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def webhook():
+    stub = WebhookStub()
+    yield stub
+    stub.close()
+
+
+def frame(sequence, boxes, stream_id=0):
+    # boxes: (x1, y1, x2, y2, confidence, class) on a 100x100 frame, one frame per second
+    array = np.array(boxes, dtype=np.float32).reshape(-1, 6)
+    detections = Detections.from_array(array, 100, 100)
+    detections.stream_id = stream_id
+    detections.sequence = sequence
+    detections.capture_time = float(sequence)
+    detections.timestamp = 1700000000.0 + sequence
+    return detections
+
+
+def evaluate(engine, frames):
+    for detections in frames:
+        engine.evaluate(detections)
+
+    # close drops what is still queued
+    deadline = time.monotonic() + 5.0
+    while time.monotonic() < deadline:
+        stats = engine.get_stats()
+        if all(sink['delivered'] + sink['failed'] == stats['alerts_raised'] for sink in stats['sinks'].values()):
+            break
+        time.sleep(0.01)
+    engine.close()
+
+
+def test_alert_waits_for_the_dwell_frames_and_is_posted(webhook):
+    engine = AlertEngine([AlertRule('person', [PERSON], min_dwell_frames=3)], [WebhookAlertSink(webhook.url)])
+    person = (10, 10, 20, 20, 0.9, PERSON)
+    evaluate(engine, [frame(0, person), frame(1, person), frame(2, []), frame(3, person), frame(4, person),
+                      frame(5, person)])
+
+    assert [alert['sequence'] for alert in webhook.alerts] == [5]
+    assert webhook.alerts[0]['class_ids'] == [PERSON]
+    assert webhook.alerts[0]['max_confidence'] == pytest.approx(0.9)
+    assert engine.get_stats()['sinks']['WebhookAlertSink']['delivered'] == 1
+
+
+def test_cooldown_is_kept_per_rule_and_stream(webhook):
+    engine = AlertEngine([AlertRule('any', cooldown=10.0)], [WebhookAlertSink(webhook.url)])
+    box = (10, 10, 20, 20, 0.5, CAR)
+    evaluate(engine, [frame(0, box), frame(5, box), frame(6, box, stream_id=1), frame(10, box)])
+
+    assert [(alert['stream_id'], alert['sequence']) for alert in webhook.alerts] == [(0, 0), (1, 6), (0, 10)]
+
+
+def test_only_boxes_of_the_classes_in_the_zone_count(webhook):
+    rule = AlertRule('car in zone', [CAR], min_confidence=0.5, zones=[(0.5, 0.5, 1.0, 1.0)], cooldown=0.0)
+    engine = AlertEngine([rule], [WebhookAlertSink(webhook.url)])
+    evaluate(engine, [
+        frame(0, (10, 10, 20, 20, 0.9, CAR)), # Outside the zone
+        frame(1, (60, 60, 80, 80, 0.9, PERSON)), # Other class
+        frame(2, (60, 60, 80, 80, 0.3, CAR)), # Low confidence
+        frame(3, [(60, 60, 80, 80, 0.9, CAR), (70, 70, 90, 90, 0.7, CAR), (10, 10, 20, 20, 0.95, CAR)]),
+    ])
+
+    assert [alert['sequence'] for alert in webhook.alerts] == [3]
+    assert webhook.alerts[0]['count'] == 2
+    assert webhook.alerts[0]['max_confidence'] == pytest.approx(0.9)
+
+
+def test_webhook_timeout_counts_as_failed_delivery():
+    stub = WebhookStub(delay=1.0)
+    try:
+        engine = AlertEngine([AlertRule('any')], [WebhookAlertSink(stub.url, timeout=0.1)])
+        evaluate(engine, [frame(0, (10, 10, 20, 20, 0.5, CAR))])
+
+        stats = engine.get_stats()['sinks']['WebhookAlertSink']
+        assert stats['delivered'] == 0
+        assert stats['failed'] == 1
+    finally:
+        stub.close()
+
+
+class BlockingSink(AlertSink):
+    max_queued_alerts = 2
+
+    def __init__(self):
+        self.deliveries = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def deliver(self, alert):
+        self.deliveries += 1
+        self.started.set()
+        self.release.wait(5.0)
+
+
+def test_close_does_not_wait_behind_a_full_queue():
+    sink = BlockingSink()
+    delivery = SinkDelivery(sink)
+    alert = AlertEngine([AlertRule('any')]).evaluate(frame(0, (10, 10, 20, 20, 0.5, CAR)))[0]
+    delivery.offer(alert)
+    assert sink.started.wait(5.0)
+    for _ in range(3):
+        delivery.offer(alert)
+
+    closer = threading.Thread(target=delivery.close)
+    closer.start()
+    sink.release.set()
+    closer.join(5.0)
+
+    assert not closer.is_alive()
+    assert sink.deliveries == 1
+    assert delivery.alerts_dropped == 3
@@ -0,0 +1,41 @@
+import json
+
+from detector import camera_discovery
+from detector.camera_discovery import CameraDiscovery, CameraInfo
+
+
+def test_failed_probes_are_not_saved_and_are_retried_on_device_changes(tmp_path, monkeypatch):
+    devices = {0: '/dev/video0:Webcam', 1: '/dev/video1:Webcam'}
+    opened = {0: False, 1: False} # video0 starts busy in another program, video1 is a metadata node
+    probes = []
+
+    def probe_camera(index):
+        probes.append(index)
+        return CameraInfo(index, 'Webcam', 640, 480, 30.0, [(640, 480)]) if opened[index] else None
+
+    monkeypatch.setattr(camera_discovery, 'list_video_devices', lambda: dict(devices))
+    monkeypatch.setattr(camera_discovery, 'probe_camera', probe_camera)
+    cache_path = tmp_path / 'cameras.json'
+
+    discovery = CameraDiscovery(str(cache_path))
+    assert discovery.scan() == []
+    assert json.loads(cache_path.read_text()) == {}
+
+    # Unchanged device list, nothing is opened again
+    discovery._refresh(full_scan=False)
+    assert sorted(probes) == [0, 1]
+
+    opened[0] = True
+    devices[2] = '/dev/video2:Capture card'
+    opened[2] = False
+    discovery._refresh(full_scan=False)
+
+    assert [camera.index for camera in discovery.get_cameras()] == [0]
+    assert sorted(probes) == [0, 0, 1, 1, 2]
+    assert list(json.loads(cache_path.read_text())) == ['/dev/video0:Webcam']
+
+    # Cached cameras are not opened again, by this or the next run
+    del devices[2]
+    discovery._refresh(full_scan=False)
+    assert sorted(probes) == [0, 0, 1, 1, 1, 2]
+    assert [camera.index for camera in CameraDiscovery(str(cache_path)).scan()] == [0]
@@ -0,0 +1,62 @@
+import os
+
+import cv2 as cv
+import numpy as np
+
+from detector.clip_recorder import ClipRecorderSink, EncodedFrame, MAX_CLIP_FPS
+
+
+def encoded_frames(count, spacing):
+    _, jpeg = cv.imencode('.jpg', np.zeros((48, 64, 3), dtype=np.uint8))
+    return [EncodedFrame(index * spacing, 1700000000.0 + index * spacing, jpeg) for index in range(count)]
+
+
+def written_fps(directory):
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    assert len(paths) == 1
+    capture = cv.VideoCapture(paths[0])
+    try:
+        return capture.get(cv.CAP_PROP_FPS)
+    finally:
+        capture.release()
+
+
+def test_clip_of_a_file_decoded_faster_than_real_time_is_written(tmp_path):
+    sink = ClipRecorderSink(str(tmp_path))
+    sink._write_clip(0, encoded_frames(30, 1 / 145.659), source_fps=0.0)
+    sink.close()
+
+    assert sink.get_stats()['clips_written'] == 1
+    assert sink.get_stats()['clips_failed'] == 0
+    assert written_fps(tmp_path) == MAX_CLIP_FPS
+
+
+def test_clip_plays_at_the_source_fps(tmp_path):
+    sink = ClipRecorderSink(str(tmp_path), get_source_fps=lambda stream_id: 25.0)
+    sink._finish_clip(0, type('Recording', (), {'clip': encoded_frames(10, 0.001)})())
+    sink.close()
+
+    assert sink.get_stats()['clips_written'] == 1
+    assert written_fps(tmp_path) == 25.0
+
+
+def test_undecodable_frames_are_skipped_and_counted(tmp_path):
+    clip = encoded_frames(10, 0.04)
+    clip[3] = EncodedFrame(clip[3].capture_time, clip[3].timestamp, np.zeros(16, dtype=np.uint8))
+    sink = ClipRecorderSink(str(tmp_path))
+    sink._write_clip(0, clip, source_fps=25.0)
+    sink.close()
+
+    assert sink.get_stats()['clips_written'] == 1
+    assert sink.get_stats()['frames_undecodable'] == 1
+
+
+def test_clip_without_a_decodable_frame_fails(tmp_path):
+    broken = np.zeros(16, dtype=np.uint8)
+    sink = ClipRecorderSink(str(tmp_path))
+    sink._write_clip(0, [EncodedFrame(index * 0.04, 1700000000.0, broken) for index in range(3)], source_fps=25.0)
+    sink.close()
+
+    assert sink.get_stats()['clips_failed'] == 1
+    assert sink.get_stats()['frames_undecodable'] == 3
+    assert os.listdir(tmp_path) == []
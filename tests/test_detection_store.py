@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from detector.detection_store import DetectionStoreSink, DetectionStore
+from detector.detections import Detections
+
+CLASS_NAMES = ['person', 'bicycle', 'car']
+START = 1700000000.0
+
+
+def frame_detections(stream_id, second, rows):
+    detections = Detections.from_array(np.array(rows, dtype=np.float32), 640, 480)
+    detections.stream_id = stream_id
+    detections.sequence = second
+    detections.timestamp = START + second
+    return detections
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'detections.db')
+    sink = DetectionStoreSink(path, CLASS_NAMES, flush_interval=0.05)
+    sink.consume(None, frame_detections(0, 0, [[0, 0, 10, 10, 0.9, 0], [20, 20, 40, 40, 0.4, 2]]))
+    sink.consume(None, frame_detections(0, 10, [[0, 0, 10, 10, 0.8, 0]]))
+    sink.consume(None, frame_detections(1, 5, [[5, 5, 15, 15, 7, 0.7, 2]]))
+    sink.consume(None, frame_detections(1, 6, np.zeros((0, 6)))) # Nothing to store
+    sink.close()
+    assert sink.get_stats()['rows_written'] == 4
+
+    store = DetectionStore(path)
+    yield store
+    store.close()
+
+
+def test_rows_come_back_oldest_first_with_class_names(store):
+    rows = store.query()
+
+    assert [(row['stream_id'], row['sequence'], row['class_name']) for row in rows] == \
+           [(0, 0, 'person'), (0, 0, 'car'), (1, 5, 'car'), (0, 10, 'person')]
+    assert rows[2]['track_id'] == 7
+    assert rows[0]['track_id'] is None
+    assert (rows[1]['x1'], rows[1]['y2']) == (20, 40)
+
+
+def test_filters_combine(store):
+    car = store.get_class_id('car')
+
+    assert store.count(stream_ids=[0]) == 3
+    assert store.count(class_ids=[car]) == 2
+    assert store.count(stream_ids=[0], class_ids=[car]) == 1
+    assert store.count(min_confidence=0.75) == 2
+    assert store.count(start_time=START + 5, end_time=START + 10) == 1 # End is exclusive
+    assert [row['sequence'] for row in store.query(limit=2)] == [0, 0]
+
+
+def test_class_names_are_stored_with_the_detections(store):
+    assert store.get_class_names() == dict(enumerate(CLASS_NAMES))
+    assert store.get_class_id('dog') is None
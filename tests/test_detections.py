@@ -0,0 +1,53 @@
+import time
+
+import numpy as np
+import pytest
+
+from detector.detections import Detections, NO_TRACK_ID
+from detector.frame import Frame, BGR
+from detector.frame_pool import FramePool
+
+DETECTED = np.array([[10, 20, 30, 40, 0.9, 0], [50, 60, 70, 80, 0.5, 2]], dtype=np.float32)
+TRACKED = np.array([[10, 20, 30, 40, 7, 0.9, 0]], dtype=np.float32)
+
+
+def test_detector_output_round_trips_through_arrays():
+    detections = Detections.from_array(DETECTED, 640, 480)
+
+    assert not detections.is_tracked
+    assert detections.track_id.tolist() == [NO_TRACK_ID, NO_TRACK_ID]
+    assert detections.class_id.tolist() == [0, 2]
+    np.testing.assert_array_equal(detections.to_array(), DETECTED)
+
+
+def test_tracker_output_keeps_its_track_ids():
+    detections = Detections.from_array(TRACKED)
+
+    assert detections.is_tracked
+    assert detections.track_id.tolist() == [7]
+    np.testing.assert_array_equal(detections.to_array(), TRACKED)
+
+
+@pytest.mark.parametrize('array', [DETECTED, TRACKED, np.zeros((0, 6), dtype=np.float32)])
+def test_bytes_keep_boxes_and_metadata(array):
+    detections = Detections.from_array(array, 640, 480)
+    detections.stream_id, detections.sequence = 3, 12345678901
+    detections.timestamp, detections.capture_time = 1700000000.125, 42.5
+
+    decoded = Detections.from_bytes(detections.to_bytes())
+
+    for name in ('stream_id', 'sequence', 'timestamp', 'capture_time', 'frame_width', 'frame_height',
+                 'is_tracked'):
+        assert getattr(decoded, name) == getattr(detections, name), name
+    np.testing.assert_array_equal(decoded.boxes, detections.boxes)
+    assert not decoded.boxes.flags.writeable
+
+
+def test_for_frame_takes_the_frame_metadata_and_shares_the_boxes():
+    detections = Detections.from_array(DETECTED)
+    frame = Frame(FramePool().acquire((480, 640, 3)), BGR, 2, 9, time.time(), time.monotonic())
+
+    attached = detections.for_frame(frame)
+
+    assert (attached.stream_id, attached.sequence, attached.frame_width, attached.frame_height) == (2, 9, 640, 480)
+    assert attached.boxes is detections.boxes
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+from detector.frame_pool import FramePool
+
+
+def shared_memory_exists(name):
+    return os.path.exists(f'/dev/shm/{name.lstrip("/")}')
+
+
+def test_buffer_is_reused_only_after_the_last_release():
+    pool = FramePool()
+    buffer = pool.acquire((4, 4, 3))
+    buffer.retain()
+
+    buffer.release()
+    assert pool.acquire((4, 4, 3)) is not buffer
+
+    buffer.release()
+    assert pool.acquire((4, 4, 3)) is buffer
+    assert pool.get_stats() == {'allocations': 2, 'reuses': 1, 'free_buffers': 0}
+
+
+def test_buffers_are_pooled_per_shape_and_dtype():
+    pool = FramePool()
+    buffer = pool.acquire((4, 4, 3))
+    buffer.release()
+
+    assert pool.acquire((4, 4, 3), np.float32) is not buffer
+    assert pool.acquire((8, 4, 3)) is not buffer
+    assert pool.acquire((4, 4, 3)) is buffer
+
+
+def test_recycled_buffer_cannot_be_retained_or_released_again():
+    buffer = FramePool().acquire((4, 4, 3))
+    buffer.release()
+
+    with pytest.raises(RuntimeError):
+        buffer.retain()
+    with pytest.raises(RuntimeError):
+        buffer.release()
+
+
+def test_other_shapes_are_evicted_before_the_pool_grows_past_its_limit():
+    pool = FramePool(max_free_buffers=2)
+    old_shape = [pool.acquire((4, 4, 3)) for _ in range(2)]
+    new_shape = pool.acquire((8, 8, 3))
+    for buffer in old_shape + [new_shape]:
+        buffer.release()
+
+    assert pool.get_stats()['free_buffers'] == 2
+    assert pool.acquire((8, 8, 3)) is new_shape
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='shared memory is not listed in /dev/shm')
+def test_buffers_released_after_close_are_unlinked():
+    pool = FramePool(shared_memory=True)
+    idle = pool.acquire((4, 4, 3))
+    in_use = pool.acquire((4, 4, 3))
+    idle_name, in_use_name = idle.get_shared_memory_name(), in_use.get_shared_memory_name()
+    idle.release()
+
+    pool.close()
+    assert not shared_memory_exists(idle_name)
+    assert shared_memory_exists(in_use_name)
+
+    in_use.release()
+    assert not shared_memory_exists(in_use_name)
+    assert pool.get_stats()['free_buffers'] == 0
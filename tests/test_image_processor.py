@@ -0,0 +1,72 @@
+import sys
+
+import numpy as np
+
+from detector.image_processor import ImageProcessor, letterbox, LETTERBOX_COLOR
+from detector.inference_regions import InferenceRegions
+
+
+class RecordingDetector:
+    def __init__(self) -> None:
+        self.batches = []
+
+
+    def predict(self, images, input_size, confidence_threshold, classes, max_det):
+        self.batches.append(len(images))
+        return []
+
+
+def test_regions_that_vanish_on_a_tiny_frame_give_empty_detections():
+    image_processor = ImageProcessor(load=False)
+    detector = RecordingDetector()
+    image_processor._detector = detector
+    tiny_frame = np.zeros((2, 2, 3), dtype=np.uint8)
+    regions = InferenceRegions([(0.0, 0.0, 0.2, 0.2)]) # Rounds to a 0x0 rectangle on a 2x2 frame
+
+    assert len(regions.regions_for(2, 2)) == 0
+    [(detections, has_detections)] = image_processor.detect_objects_batch([tiny_frame], [regions])
+
+    assert len(detections) == 0
+    assert not has_detections
+    assert detector.batches == [] # Nothing left to infer, the detector is not called
+
+
+def test_stub_backend_detects_without_pytorch():
+    image_processor = ImageProcessor('stub', load=False)
+    image_processor.set_input_size(320)
+    image_processor.load_model()
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+
+    [(detections, has_detections)] = image_processor.detect_objects_batch([frame])
+
+    assert has_detections
+    assert 'torch' not in sys.modules
+    assert image_processor.get_device() == 'cpu'
+    # First stub box (0.1, 0.2, 0.3, 0.8) of the 320 input, letterboxed from 640x480 with 40 px of padding on top
+    np.testing.assert_allclose(detections.xyxy[0], [64, 48, 192, 432], atol=1e-3)
+    assert detections.class_id.tolist() == [0, 0] # Only persons are detected by default
+
+
+def test_letterbox_pads_the_short_side_evenly():
+    frame = np.full((60, 160, 3), 200, dtype=np.uint8)
+    dst = np.zeros((32, 32, 3), dtype=np.uint8)
+
+    scale, pad_x, pad_y = letterbox(frame, dst)
+
+    assert (scale, pad_x, pad_y) == (0.2, 0, 10)
+    assert (dst[:10] == LETTERBOX_COLOR).all() and (dst[22:] == LETTERBOX_COLOR).all()
+    assert (dst[10:22] == 200).all()
+
+
+def test_boxes_are_mapped_back_from_a_letterboxed_crop():
+    image_processor = ImageProcessor(load=False)
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    # Crop of 200x100 at (300, 50), letterboxed into 320: scale 1.6, 80 px of padding on top
+    crop_box = [[0, 80, 320, 240, 0.9, 0]]
+
+    mapped = image_processor._map_to_frame(np.array(crop_box, dtype=np.float32), frame, 300, 50, (1.6, 0, 80))
+    np.testing.assert_allclose(mapped[0, :4], [300, 50, 500, 150])
+
+    # Same crop at the bottom right corner, the box is clamped to the frame
+    mapped = image_processor._map_to_frame(np.array(crop_box, dtype=np.float32), frame, 500, 400, (1.6, 0, 80))
+    np.testing.assert_allclose(mapped[0, :4], [500, 400, 640, 480])
@@ -0,0 +1,38 @@
+import numpy as np
+
+from detector.inference_regions import InferenceRegions, merge_region_detections
+
+
+def boxes(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+def test_object_cut_by_a_tile_border_is_merged_into_the_higher_scored_box():
+    whole = (100, 100, 200, 300, 0.9, 0)
+    clipped = (100, 100, 150, 300, 0.6, 0) # Left half of the same person, seen by the left tile only
+    other_class = (100, 100, 200, 300, 0.5, 2)
+
+    merged = merge_region_detections(boxes(clipped, whole, other_class))
+
+    np.testing.assert_array_equal(merged, boxes(whole, other_class))
+
+
+def test_box_suppressed_itself_does_not_suppress_the_next_one():
+    a = (0, 0, 100, 100, 0.9, 0)
+    b = (30, 0, 130, 100, 0.8, 0) # Overlaps a and c
+    c = (60, 0, 160, 100, 0.7, 0) # Overlaps b only, 40% of a
+
+    merged = merge_region_detections(boxes(c, b, a), threshold=0.5)
+
+    np.testing.assert_array_equal(merged, boxes(a, c))
+
+
+def test_tiles_overlap_and_cover_the_region():
+    regions = InferenceRegions([(0.5, 0.0, 1.0, 1.0)], tile_columns=2, tile_rows=1, tile_overlap=0.2)
+
+    rectangles = regions.regions_for(1000, 500)
+
+    assert rectangles[0][0] == 500
+    assert rectangles[-1][2] == 1000
+    assert (rectangles[:, 1] == 0).all() and (rectangles[:, 3] == 500).all()
+    assert rectangles[0][2] > rectangles[1][0] # Neighbours share a seam
@@ -0,0 +1,47 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Engine side of worker mode without a model: frames in a shared FramePool, mapped by spawned workers, then the
+# pool is closed as on engine shutdown
+WORKER_MODE_SCRIPT = textwrap.dedent('''
+    import multiprocessing
+    import sys
+    from concurrent.futures import ProcessPoolExecutor
+    sys.path.insert(0, {repo_root!r})
+
+    from detector.frame_pool import FramePool
+    from detector.inference_workers import _map_buffer
+
+
+    def read_first_byte(name):
+        return bytes(_map_buffer(name).buf[:1])
+
+
+    if __name__ == '__main__':
+        pool = FramePool(shared_memory=True)
+        buffers = [pool.acquire((48, 64, 3)) for _ in range(4)]
+        for index, buffer in enumerate(buffers):
+            buffer.data[:] = index
+
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('spawn')) as executor:
+            names = [buffer.get_shared_memory_name() for buffer in buffers]
+            assert list(executor.map(read_first_byte, names)) == [bytes([index]) for index in range(4)]
+
+        for buffer in buffers:
+            buffer.release()
+        pool.close()
+''')
+
+
+def test_worker_mode_shutdown_leaves_stderr_clean(tmp_path):
+    script = tmp_path / 'worker_mode.py'
+    script.write_text(WORKER_MODE_SCRIPT.format(repo_root=str(REPO_ROOT)))
+
+    completed = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, timeout=60)
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stderr == ''
@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+
+from detector.detections import Detections, DETECTION_DTYPE
+from detector.frame import Frame, BGR
+from detector.image_processor import ImageProcessor
+from detector.quality_controller import QualityController, DEGRADE, UPGRADE
+from detector.video_processing_engine import VideoProcessingEngine
+from detector.video_stream import VideoStream, DETECT, TRACK, REUSE
+
+
+class SwitchableMotionGate:
+    def __init__(self) -> None:
+        self.is_moving = False
+
+
+    def should_detect(self, frame: Frame) -> bool:
+        return self.is_moving
+
+
+def create_frame(engine: VideoProcessingEngine, sequence: int) -> Frame:
+    buffer = engine._frame_pool.acquire((48, 64, 3))
+    return Frame(buffer, BGR, 0, sequence, time.time(), time.monotonic())
+
+
+def one_box() -> Detections:
+    boxes = np.zeros(1, dtype=DETECTION_DTYPE)
+    boxes['xyxy'] = (10, 10, 30, 30)
+    boxes['confidence'] = 0.9
+    return Detections(boxes)
+
+
+def test_level_changes_while_tracked_and_reused_frames_are_in_flight():
+    engine = VideoProcessingEngine(ImageProcessor(load=False), display=False)
+    motion_gate = SwitchableMotionGate()
+    stream = VideoStream(0, 'synthetic://64x48', engine._frame_pool, engine._frame_ready, motion_gate=motion_gate)
+    engine._streams[0] = stream
+    controller = QualityController(engine, engine._image_processor, target_fps=30)
+    ladder = controller.get_ladder()
+    cheapest = len(ladder) - 1
+    assert ladder[0].detection_interval == 1 and ladder[cheapest].detection_interval > 1
+
+    # Resolved as the completion thread would, in planning order but after later frames were planned
+    in_flight = []
+
+    def plan(sequence: int):
+        frame = create_frame(engine, sequence)
+        frame_plan = stream.plan_frame(frame)
+        in_flight.append((frame, frame_plan))
+        return frame_plan.action
+
+    assert plan(0) == DETECT
+    assert engine._resolve_detections([(stream, in_flight[0][0])], [in_flight[0][1]], [(one_box(), True)])
+    assert plan(1) == REUSE
+
+    controller._change_level(cheapest, DEGRADE, 'test', {}) # Tracking on, detection every few frames
+    motion_gate.is_moving = True
+    assert plan(2) == DETECT
+    assert plan(3) == TRACK
+
+    controller._change_level(0, UPGRADE, 'test', {}) # Tracking off again, while the TRACK frame is in flight
+    assert plan(4) == DETECT
+
+    detections = []
+    for frame, frame_plan in in_flight[1:]:
+        detected = [(one_box(), True)] if frame_plan.action == DETECT else []
+        [(frame_detections, _)] = engine._resolve_detections([(stream, frame)], [frame_plan], detected)
+        detections.append(frame_detections)
+        frame.release()
+    in_flight[0][0].release()
+
+    assert [len(frame_detections) for frame_detections in detections] == [1, 1, 1, 1]
+    assert detections[2].is_tracked # The TRACK frame used the tracker it was planned with
+    assert not detections[3].is_tracked
+    engine.shutdown()
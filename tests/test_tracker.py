@@ -0,0 +1,51 @@
+import numpy as np
+
+from detector.tracker import ObjectTracker
+
+
+def detection(x, y, confidence=0.9, class_id=0):
+    return [x, y, x + 40, y + 80, confidence, class_id]
+
+
+def detections(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+
+def test_moving_objects_keep_their_track_ids():
+    tracker = ObjectTracker()
+    first = tracker.update(detections(detection(100, 100), detection(400, 100)))
+    for step in range(1, 6):
+        tracks = tracker.update(detections(detection(400 - 5 * step, 100), detection(100 + 5 * step, 100)))
+
+    assert first[:, 4].tolist() == [1, 2]
+    assert sorted(zip(tracks[:, 0].round().tolist(), tracks[:, 4].tolist())) == [(125, 1), (375, 2)]
+
+
+def test_tracks_follow_their_velocity_between_detections():
+    tracker = ObjectTracker()
+    for step in range(10):
+        tracker.update(detections(detection(100 + 10 * step, 100)))
+
+    predicted = tracker.predict()
+
+    assert predicted[0, 4] == 1
+    assert abs(predicted[0, 0] - 200) < 3 # Next step of 10 px
+    assert tracker.min_track_confidence() < 1.0
+
+
+def test_another_class_at_the_same_place_starts_a_new_track():
+    tracker = ObjectTracker()
+    tracker.update(detections(detection(100, 100, class_id=0)))
+
+    tracks = tracker.update(detections(detection(100, 100, class_id=2)))
+
+    assert sorted(tracks[:, 4].tolist()) == [1, 2]
+
+
+def test_tracks_without_detections_expire_after_max_age():
+    tracker = ObjectTracker(max_age=3)
+    tracker.update(detections(detection(100, 100)))
+
+    for _ in range(3):
+        assert len(tracker.predict()) == 1
+    assert len(tracker.predict()) == 0
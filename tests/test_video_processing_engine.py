@@ -0,0 +1,64 @@
+import threading
+import time
+
+import numpy as np
+
+from detector.detections import Detections, DETECTION_DTYPE
+from detector.frame import Frame, BGR
+from detector.image_processor import ImageProcessor
+from detector.tracker import ObjectTracker
+from detector.video_processing_engine import VideoProcessingEngine
+from detector.video_stream import VideoStream, FramePlan, DETECT, TRACK, REUSE
+
+
+class StaticScene:
+    def should_detect(self, frame: Frame) -> bool:
+        return False
+
+
+def create_engine() -> VideoProcessingEngine:
+    return VideoProcessingEngine(ImageProcessor(load=False), display=False)
+
+
+def create_stream(engine: VideoProcessingEngine, detection_interval: int = 1, tracking: bool = False) -> VideoStream:
+    tracker = ObjectTracker() if tracking or detection_interval > 1 else None
+    return VideoStream(0, 'synthetic://64x48', engine._frame_pool, engine._frame_ready,
+                       detection_interval=detection_interval, tracker=tracker)
+
+
+def create_frame(engine: VideoProcessingEngine, sequence: int) -> Frame:
+    buffer = engine._frame_pool.acquire((48, 64, 3))
+    buffer.data[:] = 0
+    return Frame(buffer, BGR, 0, sequence, time.time(), time.monotonic())
+
+
+def one_box() -> Detections:
+    boxes = np.zeros(1, dtype=DETECTION_DTYPE)
+    boxes['xyxy'] = (10, 10, 30, 30)
+    boxes['confidence'] = 0.9
+    return Detections(boxes)
+
+
+def test_completion_thread_survives_a_failing_batch():
+    engine = create_engine()
+    stream = create_stream(engine)
+    engine._max_pending_batches = 4
+    engine._completion_thread.start()
+
+    broken_frame = create_frame(engine, 0)
+    frame = create_frame(engine, 1)
+    with engine._pending_ready:
+        # A TRACK plan without a tracker cannot be resolved
+        engine._pending_batches.append(([(stream, broken_frame)], [FramePlan(TRACK, None)], [], None))
+        engine._pending_batches.append(([(stream, frame)], [FramePlan(DETECT, None)], [frame.retain()], None))
+        engine._pending_ready.notify_all()
+
+    deadline = time.monotonic() + 5.0
+    while stream.get_stats()['frames_processed'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert stream.get_stats()['frames_processed'] == 1
+    assert engine._completion_thread.is_alive()
+    assert broken_frame.buffer._ref_count == 0
+    assert frame.buffer._ref_count == 0
+    engine.shutdown()
@@ -0,0 +1,116 @@
+import threading
+import time
+
+from detector.frame import Frame, BGR
+from detector.frame_pool import FramePool
+from detector.detections import Detections
+from detector.tracker import ObjectTracker
+from detector.video_stream import VideoStream, LATEST_ONLY, BOUNDED_FIFO, DETECT, TRACK, REUSE
+
+
+def create_stream(queue_policy: str, fifo_size: int = 2, **kwargs) -> VideoStream:
+    stream = VideoStream(0, 'synthetic://64x48', FramePool(), threading.Condition(), queue_policy, fifo_size,
+                         **kwargs)
+    stream._is_capture_on = True # Frames are enqueued by the test instead of the capture thread
+    return stream
+
+
+def create_frame(stream: VideoStream, sequence: int) -> Frame:
+    return Frame(stream._frame_pool.acquire((48, 64, 3)), BGR, 0, sequence, time.time(), time.monotonic())
+
+
+def fetch(stream: VideoStream) -> Frame:
+    with stream._frame_ready:
+        frame = stream.fetch_frame()
+        stream._frame_ready.notify_all()
+    return frame
+
+
+def test_latest_only_keeps_the_newest_frame_and_releases_the_others():
+    stream = create_stream(LATEST_ONLY)
+    frames = [create_frame(stream, sequence) for sequence in range(3)]
+    for frame in frames:
+        assert stream._enqueue_frame(frame)
+
+    assert fetch(stream) is frames[2]
+    assert fetch(stream) is None
+    assert stream.get_stats()['frames_dropped'] == 2
+    assert [frame.buffer._ref_count for frame in frames[:2]] == [0, 0]
+
+
+def test_bounded_fifo_makes_capture_wait_instead_of_dropping():
+    stream = create_stream(BOUNDED_FIFO, fifo_size=2)
+    frames = [create_frame(stream, sequence) for sequence in range(3)]
+    assert stream._enqueue_frame(frames[0])
+    assert stream._enqueue_frame(frames[1])
+
+    blocked_enqueue = threading.Thread(target=stream._enqueue_frame, args=(frames[2],))
+    blocked_enqueue.start()
+    blocked_enqueue.join(0.2)
+    assert blocked_enqueue.is_alive()
+
+    assert fetch(stream) is frames[0]
+    blocked_enqueue.join(5.0)
+    assert not blocked_enqueue.is_alive()
+
+    assert [fetch(stream).sequence for _ in range(2)] == [1, 2]
+    assert stream.get_stats()['frames_dropped'] == 0
+
+
+def test_stop_releases_queued_frames_and_unblocks_capture():
+    stream = create_stream(BOUNDED_FIFO, fifo_size=1)
+    queued = create_frame(stream, 0)
+    waiting = create_frame(stream, 1)
+    assert stream._enqueue_frame(queued)
+
+    results = []
+    blocked_enqueue = threading.Thread(target=lambda: results.append(stream._enqueue_frame(waiting)))
+    blocked_enqueue.start()
+    blocked_enqueue.join(0.2)
+    stream.stop()
+    blocked_enqueue.join(5.0)
+
+    assert results == [False]
+    assert queued.buffer._ref_count == 0
+    assert waiting.buffer._ref_count == 0
+
+
+class StaticScene:
+    def should_detect(self, frame: Frame) -> bool:
+        return False
+
+
+def plan_actions(stream: VideoStream, count: int) -> list[str]:
+    return [stream.plan_frame(create_frame(stream, sequence)).action for sequence in range(count)]
+
+
+def test_detection_interval_tracks_the_frames_in_between():
+    stream = create_stream(LATEST_ONLY, detection_interval=3, tracker=ObjectTracker())
+
+    assert plan_actions(stream, 7) == [DETECT, TRACK, TRACK, DETECT, TRACK, TRACK, DETECT]
+    assert stream.get_stats()['frames_tracked'] == 4
+
+
+def test_static_scene_reuses_the_last_detections():
+    stream = create_stream(LATEST_ONLY, motion_gate=StaticScene())
+
+    assert plan_actions(stream, 1) == [DETECT] # Nothing to reuse yet
+    stream.set_last_detections(Detections.empty(64, 48))
+    assert plan_actions(stream, 2) == [REUSE, REUSE]
+
+
+def test_cadence_change_starts_a_new_tracker_with_a_detection():
+    stream = create_stream(LATEST_ONLY)
+    planned_before = stream.plan_frame(create_frame(stream, 0))
+
+    stream.set_detection_cadence(2)
+    plans = [stream.plan_frame(create_frame(stream, sequence)) for sequence in range(1, 4)]
+
+    assert planned_before.tracker is None
+    assert [plan.action for plan in plans] == [DETECT, TRACK, DETECT]
+    assert plans[0].tracker is not None and all(plan.tracker is plans[0].tracker for plan in plans)
+
+    stream.set_detection_cadence(1)
+    plan = stream.plan_frame(create_frame(stream, 4))
+    assert (plan.action, plan.tracker) == (DETECT, None)
+    assert plans[1].tracker is not None # Plans in flight keep their tracker
@@ -0,0 +1,324 @@
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import cv2 as cv
+import numpy as np
+from ultralytics import YOLO
+from ultralytics.data.utils import check_det_dataset, IMG_FORMATS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+
+from detector.image_processor import letterbox
+from detector.inference_backends import (create_backend, ULTRALYTICS_BACKEND, ONNX_RUNTIME_BACKEND,
+                                         OPENVINO_BACKEND)
+
+data_yaml = 'COCO_person_dataset.yaml'
+imgsz = 640
+calibration_images = 300
+calibration_split = 'train'
+latency_runs = 100
+warmup_runs = 10
+latency_image_count = 20
+accuracy_budget = 0.01 # Largest acceptable mAP50-95 drop against the original model
+seed = 0
+
+ONNX = 'onnx'
+OPENVINO = 'openvino'
+FORMATS = (ONNX, OPENVINO)
+
+FP32 = 'fp32'
+FP16 = 'fp16'
+INT8 = 'int8'
+PRECISIONS = (FP32, FP16, INT8)
+
+
+def sample_images(data: str, split: str, count: int) -> list[str]:
+    dataset = check_det_dataset(data)
+    split_paths = dataset[split] if isinstance(dataset[split], list) else [dataset[split]]
+
+    image_paths = []
+    for split_path in split_paths:
+        if os.path.isdir(split_path):
+            image_paths += [path for path in glob.glob(os.path.join(split_path, '**', '*.*'), recursive=True)
+                            if path.rsplit('.', 1)[-1].lower() in IMG_FORMATS]
+        else:
+            # Text file listing images relative to the dataset root
+            with open(split_path) as file:
+                image_paths += [os.path.join(dataset['path'], line.strip()) for line in file if line.strip()]
+
+    image_paths.sort()
+    return random.Random(seed).sample(image_paths, min(count, len(image_paths)))
+
+
+def load_letterboxed_images(image_paths: list[str], size: int) -> list[np.ndarray]:
+    images = []
+    for path in image_paths:
+        letterboxed_image = np.empty((size, size, 3), dtype=np.uint8)
+        letterbox(cv.imread(path), letterboxed_image)
+        images.append(letterboxed_image)
+    return images
+
+
+def to_blob(image: np.ndarray) -> np.ndarray:
+    return cv.dnn.blobFromImage(image, scalefactor=1 / 255.0, swapRB=True)
+
+
+def variant_path(model_path: str, export_format: str, precision: str) -> str:
+    root, _ = os.path.splitext(model_path)
+    if export_format == OPENVINO:
+        return f'{root}_{precision}_openvino_model'
+    return f'{root}_{precision}.onnx'
+
+
+# Exports a copy of the model, so the export cache of the detector next to the .pt file stays untouched
+def export_with_ultralytics(model_path: str, target_path: str, **export_args) -> str:
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_model_path = shutil.copy(model_path, work_dir)
+        exported_path = YOLO(work_model_path).export(imgsz=imgsz, dynamic=True, **export_args)
+
+        if os.path.isdir(target_path):
+            shutil.rmtree(target_path)
+        elif os.path.exists(target_path):
+            os.remove(target_path)
+        shutil.move(exported_path, target_path)
+
+    return target_path
+
+
+def export_onnx(model_path: str, precision: str, calibration: list[np.ndarray]) -> str:
+    import onnx
+
+    fp32_path = variant_path(model_path, ONNX, FP32)
+    if precision == FP32:
+        return export_with_ultralytics(model_path, fp32_path, format=ONNX)
+
+    if not os.path.exists(fp32_path):
+        export_onnx(model_path, FP32, calibration)
+    target_path = variant_path(model_path, ONNX, precision)
+
+    if precision == FP16:
+        from onnxconverter_common import float16
+
+        model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+        onnx.save(model, target_path)
+        return target_path
+
+    from onnxruntime.quantization import (quantize_static, CalibrationDataReader, QuantFormat, QuantType,
+                                          CalibrationMethod)
+
+    class LetterboxCalibrationReader(CalibrationDataReader):
+        def __init__(self, input_name: str) -> None:
+            self._inputs = iter([{input_name: to_blob(image)} for image in calibration])
+
+        def get_next(self) -> dict|None:
+            return next(self._inputs, None)
+
+    input_name = onnx.load(fp32_path, load_external_data=False).graph.input[0].name
+    quantize_static(
+        fp32_path,
+        target_path,
+        LetterboxCalibrationReader(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax
+    )
+
+    # Class names and stride live in the metadata, the quantizer does not carry them over
+    fp32_model = onnx.load(fp32_path)
+    int8_model = onnx.load(target_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, target_path)
+
+    return target_path
+
+
+def export_openvino(model_path: str, precision: str, calibration: list[np.ndarray]) -> str:
+    target_path = variant_path(model_path, OPENVINO, precision)
+    if precision in (FP32, FP16):
+        return export_with_ultralytics(model_path, target_path, format=OPENVINO, half=precision == FP16)
+
+    import nncf
+    import openvino as ov
+
+    fp32_path = variant_path(model_path, OPENVINO, FP32)
+    if not os.path.exists(fp32_path):
+        export_openvino(model_path, FP32, calibration)
+
+    model_name = next(name for name in os.listdir(fp32_path) if name.endswith('.xml'))
+    model = ov.Core().read_model(os.path.join(fp32_path, model_name))
+    quantized_model = nncf.quantize(
+        model,
+        nncf.Dataset(calibration, to_blob),
+        preset=nncf.QuantizationPreset.MIXED,
+        subset_size=len(calibration)
+    )
+
+    if os.path.isdir(target_path):
+        shutil.rmtree(target_path)
+    shutil.copytree(fp32_path, target_path) # Keeps metadata.yaml next to the model
+    ov.save_model(quantized_model, os.path.join(target_path, model_name))
+
+    return target_path
+
+
+def backend_for(path: str) -> str:
+    if os.path.isdir(path):
+        return OPENVINO_BACKEND
+    if path.endswith('.onnx'):
+        return ONNX_RUNTIME_BACKEND
+    return ULTRALYTICS_BACKEND
+
+
+def measure_latency(path: str, images: list[np.ndarray], num_threads: int|None) -> dict:
+    backend = create_backend(backend_for(path), path, 'cpu', num_threads, model_cache=False)
+
+    timings = []
+    for run in range(warmup_runs + latency_runs):
+        image = images[run % len(images)]
+        start = time.perf_counter()
+        backend.predict([image], imgsz, 0.25, None, 300)
+        if run >= warmup_runs:
+            timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'latency_p50_ms': float(np.percentile(timings, 50)),
+        'latency_p95_ms': float(np.percentile(timings, 95)),
+        'latency_mean_ms': float(np.mean(timings)),
+    }
+
+
+def measure_accuracy(path: str) -> dict:
+    metrics = YOLO(path, task='detect').val(data=data_yaml, imgsz=imgsz, batch=1, device='cpu',
+                                            plots=False, verbose=False)
+    return {
+        'map50_95': float(metrics.box.map),
+        'map50': float(metrics.box.map50),
+    }
+
+
+def size_mb(path: str) -> float:
+    if os.path.isdir(path):
+        total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    else:
+        total = os.path.getsize(path)
+    return total / 2**20
+
+
+def evaluate(name: str, path: str, images: list[np.ndarray], num_threads: int|None, skip_accuracy: bool) -> dict:
+    print(f'Evaluating {name}: {path}')
+    report = {'variant': name, 'path': path, 'size_mb': size_mb(path)}
+    report.update(measure_latency(path, images, num_threads))
+    if not skip_accuracy:
+        report.update(measure_accuracy(path))
+    return report
+
+
+def select_fastest(baseline: dict, variants: list[dict]) -> dict|None:
+    candidates = []
+    for variant in variants:
+        if 'latency_p50_ms' not in variant:
+            continue
+        if 'map50_95' in baseline:
+            variant['map50_95_drop'] = baseline['map50_95'] - variant['map50_95']
+            variant['within_budget'] = variant['map50_95_drop'] <= accuracy_budget
+            if not variant['within_budget']:
+                continue
+        candidates.append(variant)
+
+    return min(candidates, key=lambda variant: variant['latency_p50_ms'], default=None)
+
+
+def print_report(baseline: dict, variants: list[dict], fastest: dict|None) -> None:
+    print(f'\n{"variant":<16}{"size MB":>10}{"p50 ms":>10}{"p95 ms":>10}{"mAP50-95":>10}{"drop":>9}')
+    for entry in [baseline] + variants:
+        if 'error' in entry:
+            print(f'{entry["variant"]:<16} skipped: {entry["error"]}')
+            continue
+        accuracy = f'{entry["map50_95"]:>10.4f}' if 'map50_95' in entry else f'{"-":>10}'
+        drop = f'{entry["map50_95_drop"]:>9.4f}' if 'map50_95_drop' in entry else f'{"-":>9}'
+        print(f'{entry["variant"]:<16}{entry["size_mb"]:>10.1f}{entry["latency_p50_ms"]:>10.1f}'
+              f'{entry["latency_p95_ms"]:>10.1f}{accuracy}{drop}')
+
+    if fastest is not None:
+        print(f'\nFastest within budget ({accuracy_budget} mAP50-95): {fastest["variant"]} -> {fastest["path"]}')
+    else:
+        print('\nNo exported variant stays within the accuracy budget')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Export a trained model to ONNX / OpenVINO at FP32, FP16 and INT8 '
+                                                 'and compare speed and accuracy on CPU')
+    parser.add_argument('model', help='Trained model, e.g. yolo_models/yolov8n.pt')
+    parser.add_argument('--data', default=data_yaml, help='Dataset yaml used for calibration and validation')
+    parser.add_argument('--imgsz', type=int, default=imgsz)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--precisions', nargs='+', choices=PRECISIONS, default=list(PRECISIONS))
+    parser.add_argument('--calibration-images', type=int, default=calibration_images)
+    parser.add_argument('--calibration-split', default=calibration_split)
+    parser.add_argument('--latency-runs', type=int, default=latency_runs)
+    parser.add_argument('--num-threads', type=int, help='Intra-op threads used while measuring latency')
+    parser.add_argument('--accuracy-budget', type=float, default=accuracy_budget)
+    parser.add_argument('--skip-accuracy', action='store_true', help='Only measure latency')
+    parser.add_argument('--report', help='JSON report path, defaults to <model>_export_report.json')
+
+    return parser.parse_args()
+
+
+def main():
+    global data_yaml, imgsz, latency_runs, accuracy_budget
+    args = parse_args()
+    data_yaml = args.data
+    imgsz = args.imgsz
+    latency_runs = args.latency_runs
+    accuracy_budget = args.accuracy_budget
+
+    calibration = load_letterboxed_images(
+        sample_images(data_yaml, args.calibration_split, args.calibration_images), imgsz)
+    latency_images = load_letterboxed_images(sample_images(data_yaml, 'val', latency_image_count), imgsz)
+
+    baseline = evaluate('original', args.model, latency_images, args.num_threads, args.skip_accuracy)
+
+    exporters = {ONNX: export_onnx, OPENVINO: export_openvino}
+    variants = []
+    for export_format in args.formats:
+        for precision in args.precisions:
+            name = f'{export_format}-{precision}'
+            try:
+                path = exporters[export_format](args.model, precision, calibration)
+            except ImportError as e:
+                print(f'Skipping {name}, missing package: {e.name}')
+                variants.append({'variant': name, 'error': f'missing package {e.name}'})
+                continue
+
+            variants.append(evaluate(name, path, latency_images, args.num_threads, args.skip_accuracy))
+
+    fastest = select_fastest(baseline, variants)
+    print_report(baseline, variants, fastest)
+
+    report_path = args.report or f'{os.path.splitext(args.model)[0]}_export_report.json'
+    with open(report_path, 'w') as file:
+        json.dump({
+            'model': args.model,
+            'data': data_yaml,
+            'imgsz': imgsz,
+            'num_threads': args.num_threads,
+            'accuracy_budget': accuracy_budget,
+            'baseline': baseline,
+            'variants': variants,
+            'fastest_within_budget': fastest['variant'] if fastest is not None else None,
+        }, file, indent=2)
+    print(f'Report written to {report_path}')
+
+
+if __name__ == '__main__':
+    main()